@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Load test for /detail polling over real sockets.
+Starts the emulator's HTTP API in a child process, polls POST /detail on
+several keep-alive connections and reports requests per second and the
+server's CPU time per request, with and without the /detail fast path
+(HTTP_CONFIG['detail_fast_path']).
+
+    python benchmarks/detail_load.py [--requests N] [--connections N] [--mode AD5X]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Run from anywhere: the repository root holds config.py and the packages
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+
+def serve(port, mode, fast_path):
+    """Child process: run one emulator's HTTP API until killed"""
+    from emulator.printer import PrinterEmulator
+
+    config.HTTP_PORT = port
+    config.COMMAND_PORT = port + 1
+    config.HTTP_CONFIG['detail_fast_path'] = fast_path
+    emulator = PrinterEmulator(logger=lambda message: None)
+    emulator.config.update(discovery_enabled=False, printer_mode=mode, print_status='printing')
+    emulator.update_printer_mode(mode)
+    emulator.start_server()
+    emulator.start_simulation()
+    print(json.dumps({'serialNumber': emulator.config['serial_number'],
+                      'checkCode': emulator.config['check_code']}), flush=True)
+    time.sleep(3600)
+
+
+def process_cpu_seconds(pid):
+    """User plus system CPU time of a process (Linux)"""
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+async def poll(port, request, count):
+    """Send count /detail requests on one keep-alive connection, one at a time"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    for _ in range(count):
+        writer.write(request)
+        headers = await reader.readuntil(b'\r\n\r\n')
+        length = next(int(line.split(b':')[1]) for line in headers.split(b'\r\n')
+                      if line.lower().startswith(b'content-length:'))
+        await reader.readexactly(length)
+    writer.close()
+
+
+def run(args, fast_path):
+    """(requests per second, server CPU microseconds per request)"""
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', str(args.port),
+                               '--mode', args.mode] + ([] if fast_path else ['--no-fast-path']),
+                              stdout=subprocess.PIPE, text=True)
+    try:
+        body = server.stdout.readline().strip().encode('utf-8')
+        request = (b'POST /detail HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n'
+                   b'Content-Length: %d\r\n\r\n%s' % (len(body), body))
+        per_connection = args.requests // args.connections
+
+        async def load(count):
+            await asyncio.gather(*(poll(args.port, request, count) for _ in range(args.connections)))
+
+        asyncio.run(load(50))  # Warm up
+        cpu = process_cpu_seconds(server.pid)
+        start = time.perf_counter()
+        asyncio.run(load(per_connection))
+        elapsed = time.perf_counter() - start
+        total = per_connection * args.connections
+        return total / elapsed, (process_cpu_seconds(server.pid) - cpu) / total * 1e6
+    finally:
+        server.kill()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /detail polling over real sockets")
+    parser.add_argument('--requests', type=int, default=20000, help="Requests per run")
+    parser.add_argument('--connections', type=int, default=8, help="Concurrent keep-alive connections")
+    parser.add_argument('--port', type=int, default=28898, help="HTTP port for the emulator under test")
+    parser.add_argument('--mode', default=config.PrinterMode.AD5X,
+                        choices=[config.PrinterMode.STANDARD_5M, config.PrinterMode.PRO_5M, config.PrinterMode.AD5X],
+                        help="Printer mode (changes the /detail format)")
+    parser.add_argument('--serve', type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--no-fast-path', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve is not None:
+        serve(args.serve, args.mode, not args.no_fast_path)
+        return
+
+    print(f"{args.requests} /detail requests on {args.connections} connections, {args.mode} mode")
+    print(f"{'path':<10} {'req/s':>9} {'server us/req':>14}")
+    for name, fast_path in (('aiohttp', False), ('fast path', True)):
+        rate, cpu = run(args, fast_path)
+        print(f"{name:<10} {rate:>9.0f} {cpu:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark the HTTP API's JSON backends.
+Runs the /detail and /gcodeList handlers in-process (no sockets) with each
+installed JSON backend and reports the time each handler call takes, so
+the serializer's share of a request can be compared without network noise.
+
+    python benchmarks/json_backends.py [--requests N] [--mode AD5X]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+# Run from anywhere: the repository root holds config.py and the packages
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import streams
+from aiohttp.base_protocol import BaseProtocol
+from aiohttp.test_utils import make_mocked_request
+
+import config
+from emulator import json_codec
+from emulator.http_server_async import FlashForgeHTTPServerAsync
+from emulator.printer import PrinterEmulator
+
+
+def make_request(loop, path, body):
+    """Build an aiohttp request for path carrying a JSON body"""
+    payload = streams.StreamReader(BaseProtocol(loop), 2 ** 16, loop=loop)
+    payload.feed_data(body)
+    payload.feed_eof()
+    return make_mocked_request('POST', path, headers={'Content-Type': 'application/json'}, payload=payload)
+
+
+async def time_handler(loop, handler, path, body, requests, between=None):
+    """Microseconds per call of handler (request construction excluded)"""
+    total = 0.0
+    for _ in range(requests):
+        if between:
+            between()
+        request = make_request(loop, path, body)
+        start = time.perf_counter()
+        response = await handler(request)
+        total += time.perf_counter() - start
+        assert response.status == 200
+    return total / requests * 1e6
+
+
+async def run(args):
+    loop = asyncio.get_running_loop()
+    emulator = PrinterEmulator(logger=lambda message: None)
+    emulator.config.update(printer_mode=args.mode, print_status='printing', print_progress=42.0)
+    server = FlashForgeHTTPServerAsync(emulator, emulator.file_manager)
+    body = json.dumps({'serialNumber': emulator.config['serial_number'],
+                       'checkCode': emulator.config['check_code']}).encode('utf-8')
+
+    def simulation_tick():
+        # Every /detail poll sees a new state version, the worst case for its cache
+        emulator.config['hotend_temp'] += 0.01
+
+    print(f"{args.requests} requests per endpoint, {args.mode} mode; us per request")
+    print(f"{'backend':<8} {'/detail':>9} {'/detail (cached)':>17} {'/gcodeList':>11}")
+    for name in json_codec.available_backends():
+        json_codec.set_backend(name)
+        detail = await time_handler(loop, server.handle_detail, '/detail', body, args.requests, simulation_tick)
+        cached = await time_handler(loop, server.handle_detail, '/detail', body, args.requests)
+        gcode_list = await time_handler(loop, server.handle_gcode_list, '/gcodeList', body, args.requests)
+        print(f"{name:<8} {detail:>9.1f} {cached:>17.1f} {gcode_list:>11.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the HTTP API's JSON backends")
+    parser.add_argument('--requests', type=int, default=2000, help="Requests per endpoint and backend")
+    parser.add_argument('--mode', default=config.PrinterMode.AD5X,
+                        choices=[config.PrinterMode.STANDARD_5M, config.PrinterMode.PRO_5M, config.PrinterMode.AD5X],
+                        help="Printer mode (changes the /detail and /gcodeList formats)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -38,6 +38,9 @@ HTTP_CONFIG = {
     'enabled': True,
     'printer_mode': 'AD5X',  # Default mode: 5M, 5M_Pro, AD5X
     'check_code': '0e35a229',  # Default check code
+    'json_backend': 'auto',  # auto (fastest installed), orjson, ujson or json (stdlib)
+    'log_level': 'requests',  # off, requests or bodies (see HttpLogLevel)
+    'detail_fast_path': True,  # Answer plain /detail polls without going through aiohttp
     'material_station': {
         'slot_count': 4,
         'default_slots': [
@@ -49,6 +52,88 @@ HTTP_CONFIG = {
     }
 }
 
+# TCP Command Server Configuration
+TCP_CONFIG = {
+    'backend': 'async',  # async (single event loop) or threaded (one thread per client)
+    'client_timeout': 60,  # Seconds of inactivity before a client is disconnected
+    'partial_command_timeout': 0.2,  # Seconds to wait for the newline of an unterminated command
+    'sendfile_threshold': 64 * 1024,  # File-backed payloads at least this large are sent with sendfile
+    'max_scheduled_responses': 64,  # Delayed responses queued per client before reading pauses
+}
+
+# Network Simulation Defaults (edited from the Network tab, stored as network_simulation)
+NETWORK_SIMULATION = {
+    'latency': 0,                    # Base delay in milliseconds
+    'latency_enabled': False,
+    'latency_distribution': 'fixed', # fixed, uniform, normal, pareto
+    'jitter': 0,                     # Spread in milliseconds (uniform +/-, normal stddev, pareto tail scale)
+    'pareto_shape': 2.5,             # Tail shape for the pareto distribution (lower = heavier tail)
+    'failure_rate': 0,               # Percentage chance of failure (0-100)
+    'failures_enabled': False,
+    'failure_type': 'drop',          # 'drop', 'timeout', 'error'
+    'hang_duration': 10,             # Seconds a 'timeout' failure hangs before closing
+    'burst_loss_enabled': False,
+    'burst_start_rate': 2,           # Percentage chance per request of entering a loss burst
+    'burst_end_rate': 30,            # Percentage chance per request of leaving a loss burst
+    'burst_failure_rate': 100,       # Percentage of requests failing while in a burst
+    'bandwidth_enabled': False,
+    'bandwidth_kbps': 256,           # Per-connection bandwidth cap in kilobytes per second
+    'bandwidth_burst': 16384,        # Token bucket size in bytes
+    'write_chunk_size': 1460,        # Bytes per paced write
+}
+
+# Uploaded File Storage (see emulator/blob_store.py)
+UPLOAD_CONFIG = {
+    'spool_dir': None,                      # Parent of the shared upload store directory (None = system temp dir)
+    'max_file_size': 1024 * 1024 * 1024,    # Largest accepted upload in bytes (0 = unlimited)
+    'max_total_size': 4 * 1024 * 1024 * 1024,  # Bytes of distinct uploads the store may hold (0 = unlimited)
+    'chunk_size': 256 * 1024,               # Bytes read from the request per write
+}
+
+# HTTP Request Logging Levels
+class HttpLogLevel:
+    OFF = "off"              # No per-request logging
+    REQUESTS = "requests"    # One line per request: method, path, client and status
+    BODIES = "bodies"        # Also request bodies and error response bodies
+
+# TCP Server Backends
+class TcpServerBackend:
+    ASYNC = "async"
+    THREADED = "threaded"
+
+# Simulation Clock (see emulator/simulation.py)
+SIMULATION_CONFIG = {
+    'tick_rate': 1.0,             # Simulation ticks per second; each tick advances 1/tick_rate seconds
+    'max_catch_up_ticks': 10,     # Missed ticks replayed after a stall before the rest are skipped
+    'time_scale': 1.0,            # Simulated seconds per wall second (10, 100, ...); 0 = as fast as possible
+}
+
+# Simulation time scales offered in the UI (label -> time scale)
+SIMULATION_SPEEDS = {
+    '1x': 1.0,
+    '10x': 10.0,
+    '100x': 100.0,
+    'Max': 0,
+}
+
+# Fleet Mode (many emulated printers in one process, see emulator/fleet.py)
+FLEET_CONFIG = {
+    'count': 10,
+    'bind_mode': 'ports',         # 'ports' or 'aliases' (see FleetBindMode)
+    'host': '127.0.0.1',          # Bind address for every printer in 'ports' mode
+    'base_tcp_port': 20000,       # Printer N listens on base_tcp_port + N ('ports' mode)
+    'base_http_port': 30000,      # Printer N listens on base_http_port + N ('ports' mode)
+    'alias_base': '127.0.1.1',    # First loopback alias in 'aliases' mode (standard ports per alias)
+    'serial_prefix': 'SNFLEET',
+    'name_prefix': 'FlashForge Fleet',
+    'discovery_enabled': False,   # Per-printer UDP discovery (only useful in 'aliases' mode)
+}
+
+# Fleet Bind Modes
+class FleetBindMode:
+    PORTS = "ports"
+    ALIASES = "aliases"
+
 # Protocol Modes
 class ProtocolMode:
     TCP_ONLY = "TCP_Only"
@@ -0,0 +1,231 @@
+"""
+Content-addressed storage for uploaded file payloads.
+Each distinct payload is stored once on disk under its SHA-256 digest and
+reference counted by the file entries that use it, so uploading the same
+G-code under many names, or to many emulated printers, costs one copy.
+"""
+import hashlib
+import itertools
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from typing import Dict, Optional
+import config
+
+
+class UploadQuotaError(Exception):
+    """An upload would exceed the per-file or total storage quota"""
+
+
+class BlobWriter:
+    """A payload being streamed into the store.
+
+    The digest is computed while the data is written to a temporary file,
+    so the payload is never held in memory. commit() files it under its
+    digest (or drops it if that content is already stored); abort()
+    deletes it.
+    """
+
+    def __init__(self, store, path):
+        self.store = store
+        self.path = path
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._file = open(path, 'wb')
+
+    def write(self, chunk):
+        """Append a chunk (raises UploadQuotaError when the store is full)"""
+        self.store._reserve(len(chunk))
+        self._file.write(chunk)
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+    def commit(self) -> str:
+        """Store the payload and return its digest, holding one reference to it"""
+        self._file.close()
+        return self.store._commit(self, self._hash.hexdigest())
+
+    def abort(self):
+        """Discard the payload"""
+        if self._file.closed:
+            return
+        self._file.close()
+        self.store._discard(self)
+
+
+class BlobStore:
+    """Reference-counted, content-addressed blobs in one directory.
+
+    A blob is deleted as soon as its last reference is released. collect()
+    additionally removes files that no reference points to, such as blobs
+    left in a configured spool directory by an earlier run.
+    """
+
+    def __init__(self, parent_dir: Optional[str] = None, max_total_size: Optional[int] = None):
+        self.parent_dir = parent_dir
+        self.max_total_size = max_total_size
+        self.stored_bytes = 0       # Bytes of committed blobs
+        self._reserved_bytes = 0    # Bytes written by uncommitted writers
+        self._refcounts: Dict[str, int] = {}
+        self._sizes: Dict[str, int] = {}
+        self._writers = set()       # Temporary paths of uncommitted writers
+        self._mappings: Dict[str, mmap.mmap] = {}  # digest -> shared read-only map
+        self._temp_ids = itertools.count(1)
+        self._directory = None
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self) -> str:
+        """Directory holding the blobs (created on first use, removed at exit)"""
+        with self._lock:
+            if self._directory is None:
+                parent = self.parent_dir if self.parent_dir is not None else config.UPLOAD_CONFIG['spool_dir']
+                self._directory = tempfile.mkdtemp(prefix='flashforge-uploads-', dir=parent)
+                weakref.finalize(self, shutil.rmtree, self._directory, True)
+            return self._directory
+
+    @property
+    def blob_count(self) -> int:
+        return len(self._refcounts)
+
+    def path(self, digest: str) -> str:
+        """Path of a stored blob"""
+        return os.path.join(self.directory, digest)
+
+    def size(self, digest: str) -> Optional[int]:
+        """Size of a stored blob, or None if it is not stored"""
+        return self._sizes.get(digest)
+
+    def references(self, digest: str) -> int:
+        return self._refcounts.get(digest, 0)
+
+    def view(self, digest: str) -> memoryview:
+        """Read-only view of a stored blob, memory-mapped rather than read into memory.
+
+        Every view of a blob shares one map. Views stay valid after the blob
+        is released; the map is closed once the last of them is gone.
+        """
+        with self._lock:
+            if digest not in self._refcounts:
+                raise KeyError(digest)
+            mapping = self._mappings.get(digest)
+            if mapping is None:
+                if not self._sizes[digest]:
+                    return memoryview(b'')  # Empty files cannot be mapped
+                with open(os.path.join(self._directory, digest), 'rb') as f:
+                    mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._mappings[digest] = mapping
+        return memoryview(mapping)
+
+    def open_writer(self) -> BlobWriter:
+        """Start streaming a new payload into the store"""
+        path = os.path.join(self.directory, f"incoming-{next(self._temp_ids)}.part")
+        with self._lock:
+            self._writers.add(path)
+        return BlobWriter(self, path)
+
+    def put(self, data: bytes) -> str:
+        """Store an in-memory payload and return its digest, holding one reference"""
+        writer = self.open_writer()
+        try:
+            writer.write(data)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.commit()
+
+    def acquire(self, digest: str):
+        """Add a reference to a stored blob"""
+        with self._lock:
+            if digest not in self._refcounts:
+                raise KeyError(digest)
+            self._refcounts[digest] += 1
+
+    def release(self, digest: str):
+        """Drop a reference; the blob is deleted when none remain"""
+        with self._lock:
+            count = self._refcounts.get(digest)
+            if count is None:
+                return
+            if count > 1:
+                self._refcounts[digest] = count - 1
+                return
+            del self._refcounts[digest]
+            self.stored_bytes -= self._sizes.pop(digest)
+            mapping = self._mappings.pop(digest, None)
+            path = os.path.join(self._directory, digest)
+        if mapping is not None:
+            try:
+                mapping.close()
+            except BufferError:
+                pass  # Views are still exported; the map closes when they are released
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def collect(self) -> int:
+        """Delete unreferenced files from the store directory; returns the bytes freed"""
+        directory = self.directory
+        freed = 0
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            # Checked under the lock right before removing, so a blob committed
+            # or a writer opened since the listing is never deleted
+            with self._lock:
+                if name in self._refcounts or path in self._writers:
+                    continue
+                try:
+                    size = os.path.getsize(path)
+                    os.remove(path)
+                except OSError:
+                    continue
+            freed += size
+        return freed
+
+    def _reserve(self, nbytes: int):
+        """Count nbytes of an uncommitted writer against the total quota"""
+        max_total_size = (config.UPLOAD_CONFIG['max_total_size']
+                          if self.max_total_size is None else self.max_total_size)
+        with self._lock:
+            if max_total_size and self.stored_bytes + self._reserved_bytes + nbytes > max_total_size:
+                raise UploadQuotaError(f"Upload storage is full (limit {max_total_size} bytes)")
+            self._reserved_bytes += nbytes
+
+    def _commit(self, writer: BlobWriter, digest: str) -> str:
+        """File a finished writer under its digest, deduplicating against stored blobs"""
+        with self._lock:
+            self._writers.discard(writer.path)
+            self._reserved_bytes -= writer.size
+            if digest in self._refcounts:
+                self._refcounts[digest] += 1
+                duplicate = True
+            else:
+                os.replace(writer.path, os.path.join(self._directory, digest))
+                self._refcounts[digest] = 1
+                self._sizes[digest] = writer.size
+                self.stored_bytes += writer.size
+                duplicate = False
+        if duplicate:
+            try:
+                os.remove(writer.path)
+            except OSError:
+                pass  # Already swept by collect()
+        return digest
+
+    def _discard(self, writer: BlobWriter):
+        """Delete an aborted writer's file and release its reservation"""
+        with self._lock:
+            self._writers.discard(writer.path)
+            self._reserved_bytes -= writer.size
+        try:
+            os.remove(writer.path)
+        except OSError:
+            pass
+
+
+# Shared by every emulator in the process, so identical uploads are stored once
+blob_store = BlobStore()
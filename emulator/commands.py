@@ -12,170 +12,273 @@ from .responses import (
     get_thumbnail_response
 )
 
-def process_command(command, config, thumbnail_path, virtual_files, logger=None):
-    """Process a command and return the appropriate response"""
-    # Handle login/logout
-    if command == "~M601 S1":  # Login
+# Command code (e.g. "M115", "G1") at the start of a "~M115 ..." command
+_CODE_PATTERN = re.compile(r'~?\s*([GMgm])0*(\d+)')
+
+# Every "<letter><number>" parameter (X10, S200, r255, F-1.5 ...) in one pass
+_PARAM_PATTERN = re.compile(r'([A-Za-z])([-+]?[0-9]*\.?[0-9]+)')
+
+
+def parse_command(command):
+    """Split a command into its code and parameters.
+
+    Returns (code, args, params) where code is the upper-case G/M code
+    ("M104") or None, args is the raw text after the code and params maps
+    upper-case parameter letters to floats (first occurrence wins).
+    """
+    match = _CODE_PATTERN.match(command)
+    if not match:
+        return None, command, {}
+
+    code = f"{match.group(1).upper()}{match.group(2)}"
+    args = command[match.end():]
+    params = {}
+    for letter, value in _PARAM_PATTERN.findall(args):
+        letter = letter.upper()
+        if letter not in params:
+            params[letter] = float(value)
+    return code, args, params
+
+
+def _read_view(config):
+    """Consistent read-only view of config for status responses"""
+    snapshot = getattr(config, 'snapshot', None)
+    return snapshot() if snapshot else config
+
+
+def _ack(code):
+    """Plain acknowledgement for a command"""
+    return f"CMD {code} Received.\nok\n"
+
+
+def handle_login(command, args, params, config, thumbnail_path, virtual_files, logger):
+    """M601 - Login"""
+    if params.get('S') == 1:
         return "CMD M601 Received.\nControl Success v2.1.\nok\n"
-    
-    if command == "~M602":  # Logout
-        return "CMD M602 Received.\nControl Release.\nok\n"
-    
+    return default_response(command)
+
+
+def handle_logout(command, args, params, config, thumbnail_path, virtual_files, logger):
+    """M602 - Logout"""
+    return "CMD M602 Received.\nControl Release.\nok\n"
+
+
+def handle_printer_info(command, args, params, config, thumbnail_path, virtual_files, logger):
+    """M115 - Info Status"""
+    return get_printer_info_response(_read_view(config))
+
+
+def handle_temperature(command, args, params, config, thumbnail_path, virtual_files, logger):
+    """M105 - Temperature"""
+    return get_temperature_response(_read_view(config))
+
+
+def handle_endstop(command, args, params, config, thumbnail_path, virtual_files, logger):
+    """M119 - Endstop status"""
+    return get_endstop_response(_read_view(config))
+
+
+def handle_print_status(command, args, params, config, thumbnail_path, virtual_files, logger):
+    """M27 - Print status"""
+    return get_print_status_response(_read_view(config))
+
+
+def handle_position(command, args, params, config, thumbnail_path, virtual_files, logger):
+    """M114 - Position"""
+    return get_position_response(_read_view(config))
+
+
+def handle_led(command, args, params, config, thumbnail_path, virtual_files, logger):
+    """M146 - LED control"""
+    color = (params.get('R'), params.get('G'), params.get('B'))
+    if color == (255, 255, 255):
+        if not config['led_state']:
+            config['led_state'] = True
+            if logger:
+                logger("LED turned ON")
+    elif color == (0, 0, 0):
+        if config['led_state']:
+            config['led_state'] = False
+            if logger:
+                logger("LED turned OFF")
+
+    return _ack("M146")
+
+
+def handle_runout_sensor_on(command, args, params, config, thumbnail_path, virtual_files, logger):
+    """M405 - Runout sensor on"""
+    old_state = config['filament_runout_sensor']
+    config['filament_runout_sensor'] = True
+    if not old_state and logger:
+        logger("Filament sensor enabled")
+    return _ack("M405")
+
+
+def handle_runout_sensor_off(command, args, params, config, thumbnail_path, virtual_files, logger):
+    """M406 - Runout sensor off"""
+    old_state = config['filament_runout_sensor']
+    config['filament_runout_sensor'] = False
+    if old_state and logger:
+        logger("Filament sensor disabled")
+    return _ack("M406")
+
+
+def handle_home(command, args, params, config, thumbnail_path, virtual_files, logger):
+    """G28 - Home axes"""
+    # Reset position
+    config['position'] = {"x": 0.0, "y": 0.0, "z": 0.0}
+    return _ack("G28")
+
+
+def handle_resume(command, args, params, config, thumbnail_path, virtual_files, logger):
+    """M24 - Resume print"""
+    if config['print_status'] == 'paused':
+        config['print_status'] = 'printing'
+        if logger:
+            logger("Print resumed")
+    return _ack("M24")
+
+
+def handle_pause(command, args, params, config, thumbnail_path, virtual_files, logger):
+    """M25 - Pause print"""
+    if config['print_status'] == 'printing':
+        config['print_status'] = 'paused'
+        if logger:
+            logger("Print paused")
+    return _ack("M25")
+
+
+def handle_stop(command, args, params, config, thumbnail_path, virtual_files, logger):
+    """M26 - Stop print"""
+    if config['print_status'] in ['printing', 'paused']:
+        config.update(print_status='ready', print_progress=0)
+        if logger:
+            logger("Print stopped")
+    return _ack("M26")
+
+
+def handle_set_hotend_temp(command, args, params, config, thumbnail_path, virtual_files, logger):
+    """M104 - Set extruder temp"""
+    if 'S' in params:
+        temp = params['S']
+        config['target_hotend'] = temp
+        if logger:
+            logger(f"Hotend target temperature set to {temp}°C")
+    return _ack("M104")
+
+
+def handle_set_bed_temp(command, args, params, config, thumbnail_path, virtual_files, logger):
+    """M140 - Set bed temp"""
+    if 'S' in params:
+        temp = params['S']
+        config['target_bed'] = temp
+        if logger:
+            logger(f"Bed target temperature set to {temp}°C")
+    return _ack("M140")
+
+
+def handle_wait_hotend_temp(command, args, params, config, thumbnail_path, virtual_files, logger):
+    """M109 - Wait for extruder temp"""
+    if 'S' in params:
+        temp = params['S']
+        config['target_hotend'] = temp
+        config['hotend_temp'] = temp  # Immediately set temp for testing
+        if logger:
+            logger(f"Hotend temperature set to {temp}°C (wait)")
+    return _ack("M109")
+
+
+def handle_wait_bed_temp(command, args, params, config, thumbnail_path, virtual_files, logger):
+    """M190 - Wait for bed temp"""
+    if 'S' in params:
+        temp = params['S']
+        config['target_bed'] = temp
+        config['bed_temp'] = temp  # Immediately set temp for testing
+        if logger:
+            logger(f"Bed temperature set to {temp}°C (wait)")
+    return _ack("M190")
+
+
+def handle_file_list(command, args, params, config, thumbnail_path, virtual_files, logger):
+    """M661 - List files"""
+    return get_file_list_response(virtual_files, logger)
+
+
+def handle_thumbnail(command, args, params, config, thumbnail_path, virtual_files, logger):
+    """M662 - Thumbnail for a file path"""
+    # Get everything after ~M662 (excluding the space)
+    file_path = args.strip()
+
+    if logger:
+        logger(f"Processing thumbnail request for: {file_path}")
+    return get_thumbnail_response(thumbnail_path, file_path, virtual_files, logger)
+
+
+def handle_move(command, args, params, config, thumbnail_path, virtual_files, logger):
+    """G1 - Move"""
+    # Update X, Y, Z coordinates if present
+    position = config['position'].copy()
+    for axis in ('X', 'Y', 'Z'):
+        if axis in params:
+            position[axis.lower()] = params[axis]
+    config['position'] = position
+    return _ack("G1")
+
+
+def default_response(command):
+    """Default response for unhandled commands"""
+    return f"CMD {command[1:]} Received.\nok\n"
+
+
+# Command dispatcher, keyed by G/M code
+COMMAND_HANDLERS = {
+    # Login/logout
+    "M601": handle_login,
+    "M602": handle_logout,
     # Status commands
-    if command == "~M115":  # Info Status
-        return get_printer_info_response(config)
-    
-    if command == "~M105":  # Temperature
-        return get_temperature_response(config)
-    
-    if command == "~M119":  # Endstop status
-        return get_endstop_response(config)
-    
-    if command == "~M27":  # Print status
-        return get_print_status_response(config)
-    
-    if command == "~M114":  # Position
-        return get_position_response(config)
-    
+    "M115": handle_printer_info,
+    "M105": handle_temperature,
+    "M119": handle_endstop,
+    "M27": handle_print_status,
+    "M114": handle_position,
     # LED control
-    if command.startswith("~M146"):  # LED control
-        led_state_changed = False
-        if "r255 g255 b255" in command.lower():
-            if not config['led_state']:
-                config['led_state'] = True
-                led_state_changed = True
-                if logger:
-                    logger("LED turned ON")
-        elif "r0 g0 b0" in command.lower():
-            if config['led_state']:
-                config['led_state'] = False
-                led_state_changed = True
-                if logger:
-                    logger("LED turned OFF")
-                    
-        return "CMD M146 Received.\nok\n"
-    
+    "M146": handle_led,
     # Filament runout sensor
-    if command == "~M405":  # Runout sensor on
-        old_state = config['filament_runout_sensor']
-        config['filament_runout_sensor'] = True
-        if not old_state and logger:
-            logger("Filament sensor enabled")
-        return "CMD M405 Received.\nok\n"
-    
-    if command == "~M406":  # Runout sensor off
-        old_state = config['filament_runout_sensor']
-        config['filament_runout_sensor'] = False
-        if old_state and logger:
-            logger("Filament sensor disabled")
-        return "CMD M406 Received.\nok\n"
-    
-    # Home axes
-    if command == "~G28":  # Home axes
-        # Reset position
-        config['position'] = {"x": 0.0, "y": 0.0, "z": 0.0}
-        return "CMD G28 Received.\nok\n"
-    
+    "M405": handle_runout_sensor_on,
+    "M406": handle_runout_sensor_off,
     # Print control
-    if command == "~M24":  # Resume print
-        if config['print_status'] == 'paused':
-            config['print_status'] = 'printing'
-            if logger:
-                logger("Print resumed")
-        return "CMD M24 Received.\nok\n"
-    
-    if command == "~M25":  # Pause print
-        if config['print_status'] == 'printing':
-            config['print_status'] = 'paused'
-            if logger:
-                logger("Print paused")
-        return "CMD M25 Received.\nok\n"
-    
-    if command == "~M26":  # Stop print
-        if config['print_status'] in ['printing', 'paused']:
-            config['print_status'] = 'ready'
-            config['print_progress'] = 0
-            if logger:
-                logger("Print stopped")
-        return "CMD M26 Received.\nok\n"
-    
+    "M24": handle_resume,
+    "M25": handle_pause,
+    "M26": handle_stop,
     # Temperature settings
-    if command.startswith("~M104"):  # Set extruder temp
-        parts = command.split()
-        if len(parts) > 1 and parts[1].startswith("S"):
-            try:
-                temp = float(parts[1][1:])
-                config['target_hotend'] = temp
-                if logger:
-                    logger(f"Hotend target temperature set to {temp}°C")
-            except ValueError:
-                pass
-        return "CMD M104 Received.\nok\n"
-    
-    if command.startswith("~M140"):  # Set bed temp
-        parts = command.split()
-        if len(parts) > 1 and parts[1].startswith("S"):
-            try:
-                temp = float(parts[1][1:])
-                config['target_bed'] = temp
-                if logger:
-                    logger(f"Bed target temperature set to {temp}°C")
-            except ValueError:
-                pass
-        return "CMD M140 Received.\nok\n"
-    
-    if command.startswith("~M109"):  # Wait for extruder temp
-        parts = command.split()
-        if len(parts) > 1 and parts[1].startswith("S"):
-            try:
-                temp = float(parts[1][1:])
-                config['target_hotend'] = temp
-                config['hotend_temp'] = temp  # Immediately set temp for testing
-                if logger:
-                    logger(f"Hotend temperature set to {temp}°C (wait)")
-            except ValueError:
-                pass
-        return "CMD M109 Received.\nok\n"
-    
-    if command.startswith("~M190"):  # Wait for bed temp
-        parts = command.split()
-        if len(parts) > 1 and parts[1].startswith("S"):
-            try:
-                temp = float(parts[1][1:])
-                config['target_bed'] = temp
-                config['bed_temp'] = temp  # Immediately set temp for testing
-                if logger:
-                    logger(f"Bed temperature set to {temp}°C (wait)")
-            except ValueError:
-                pass
-        return "CMD M190 Received.\nok\n"
-    
-    # File listing
-    if command == "~M661":  # List files
-        return get_file_list_response(virtual_files, logger)
-    
-    # Thumbnail
-    if command.startswith("~M662"):
-        # Extract the filename from the command if present
-        file_path = ""
-        if len(command) > 5:
-            # Get everything after ~M662 (excluding the space)
-            file_path = command[6:].strip()
-        
-        if logger:
-            logger(f"Processing thumbnail request for: {file_path}")
-        return get_thumbnail_response(thumbnail_path, file_path, virtual_files, logger)
-    
+    "M104": handle_set_hotend_temp,
+    "M140": handle_set_bed_temp,
+    "M109": handle_wait_hotend_temp,
+    "M190": handle_wait_bed_temp,
+    # Files
+    "M661": handle_file_list,
+    "M662": handle_thumbnail,
     # Movement
-    if command.startswith("~G1"):  # Move
-        # Parse X, Y, Z coordinates if present
-        position = config['position'].copy()
-        for axis in ['X', 'Y', 'Z']:
-            match = re.search(f"{axis}([-+]?[0-9]*\.?[0-9]+)", command)
-            if match:
-                position[axis.lower()] = float(match.group(1))
-        config['position'] = position
-        return "CMD G1 Received.\nok\n"
-    
+    "G1": handle_move,
+    "G28": handle_home,
+}
+
+
+def register_command(code, handler):
+    """Register (or replace) the handler for a G/M code such as "M220".
+
+    Handlers are called as handler(command, args, params, config,
+    thumbnail_path, virtual_files, logger) and return the response.
+    """
+    COMMAND_HANDLERS[code.upper()] = handler
+
+
+def process_command(command, config, thumbnail_path, virtual_files, logger=None):
+    """Process a command and return the appropriate response"""
+    code, args, params = parse_command(command)
+    handler = COMMAND_HANDLERS.get(code)
+    if handler:
+        return handler(command, args, params, config, thumbnail_path, virtual_files, logger)
+
     # Default response for unhandled commands
-    return f"CMD {command[1:]} Received.\nok\n"
+    return default_response(command)
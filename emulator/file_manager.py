@@ -1,24 +1,319 @@
 """
 Enhanced file manager supporting both TCP and HTTP operations
 """
-import os
-import json
-import base64
+import bisect
+import threading
+import time
+import weakref
 from datetime import datetime
 from typing import Dict, List, Optional, Any, Union
+from .responses import M661_HEADER, encode_file_list_entry
+from .thumbnail_cache import thumbnail_cache
+from .gcode_metadata import GcodeMetadataParser, is_gcode_file
+from .threemf import is_3mf_file, threemf_indexes
+from .blob_store import BlobStore, BlobWriter, UploadQuotaError, blob_store as shared_blob_store
+import config
+
+
+class StoredFile:
+    """An uploaded file: a name's reference to a blob in the blob store"""
+
+    __slots__ = ('digest', 'path', 'size')
+
+    def __init__(self, digest, path, size):
+        self.digest = digest
+        self.path = path
+        self.size = size
+
+
+class SpooledUpload:
+    """An upload being streamed into the blob store.
+
+    Chunks go straight to disk and count against the quotas as they arrive,
+    so memory use does not depend on the file size. commit() adds the file
+    to the file manager; abort() discards it and releases its quota.
+    """
+
+    def __init__(self, manager, filename, writer: BlobWriter):
+        self.manager = manager
+        self.filename = filename
+        self.writer = writer
+        # Slicer metadata is read from the same chunks on their way to disk
+        self.parser = GcodeMetadataParser() if is_gcode_file(filename) else None
+
+    @property
+    def size(self) -> int:
+        return self.writer.size
+
+    def write(self, chunk):
+        """Append a chunk (raises UploadQuotaError when over a quota)"""
+        max_file_size = self.manager.upload_settings.get('max_file_size')
+        if max_file_size and self.writer.size + len(chunk) > max_file_size:
+            raise UploadQuotaError(f"File exceeds the upload size limit of {max_file_size} bytes")
+        self.writer.write(chunk)
+        if self.parser:
+            self.parser.feed(chunk)
+
+    def commit(self, metadata: Dict = None) -> StoredFile:
+        """Finish the upload and add the file to the file manager"""
+        file_metadata = self.parser.close() if self.parser else {}
+        digest = self.writer.commit()
+        return self.manager._commit_upload(self.filename, digest, metadata, file_metadata)
+
+    def abort(self):
+        """Discard the upload"""
+        self.writer.abort()
+
+
+def _release_uploaded_files(store: BlobStore, uploaded_files: Dict[str, StoredFile]):
+    """Release the blobs referenced by a file manager's uploads"""
+    for stored in list(uploaded_files.values()):
+        store.release(stored.digest)
+
+
+class VirtualFileList(list):
+    """List of virtual file names that keeps the M661 listing payload up to date.
+
+    Appends and removals patch the encoded payload in place instead of
+    rebuilding it, so listing thousands of files stays linear. Membership
+    tests use a name count instead of a list scan, and ``version`` moves on
+    every change so other indexes can tell when to catch up.
+    """
+
+    JOURNAL_LIMIT = 1024  # Single-name changes kept for changes_since()
+
+    def __init__(self, files=()):
+        super().__init__(files)
+        self.version = 0
+        self._rebuild()
+
+    def _rebuild(self):
+        """Re-encode every entry (used after bulk reorders/replacements)"""
+        self._entries = [encode_file_list_entry(filename) for filename in self]
+        self._payload = bytearray(M661_HEADER)
+        for entry in self._entries:
+            self._payload.extend(entry)
+        self._payload_bytes = None
+        self._counts = {}
+        for filename in self:
+            self._counts[filename] = self._counts.get(filename, 0) + 1
+        self.version += 1
+        self._journal = []  # Bulk changes cannot be replayed
+
+    def _count(self, filename, delta):
+        """Track one added (+1) or removed (-1) name"""
+        count = self._counts.get(filename, 0) + delta
+        if count:
+            self._counts[filename] = count
+        else:
+            del self._counts[filename]
+        self._payload_bytes = None
+        self.version += 1
+        self._journal.append(filename)
+        if len(self._journal) > self.JOURNAL_LIMIT:
+            del self._journal[:len(self._journal) // 2]
+
+    def __contains__(self, filename):
+        return filename in self._counts
+
+    def changes_since(self, version: int) -> Optional[List[str]]:
+        """Names added or removed after version, or None if a bulk change or the journal limit is in between"""
+        journal = self._journal
+        # Every journal entry advanced the version by one, the last one to self.version
+        start = len(journal) - (self.version - version)
+        if start < 0:
+            return None
+        return journal[start:]
+
+    def _offset(self, index):
+        """Byte offset of the entry at index in the payload"""
+        return len(M661_HEADER) + sum(len(entry) for entry in self._entries[:index])
+
+    def get_listing_payload(self) -> bytes:
+        """Get the complete M661 response"""
+        payload = self._payload_bytes
+        if payload is None:
+            payload = self._payload_bytes = bytes(self._payload)
+        return payload
+
+    def append(self, filename):
+        super().append(filename)
+        entry = encode_file_list_entry(filename)
+        self._entries.append(entry)
+        self._payload.extend(entry)
+        self._count(filename, 1)
+
+    def extend(self, filenames):
+        for filename in list(filenames):
+            self.append(filename)
+
+    def __iadd__(self, filenames):
+        self.extend(filenames)
+        return self
+
+    def insert(self, index, filename):
+        index = min(max(index + len(self) if index < 0 else index, 0), len(self))
+        super().insert(index, filename)
+        entry = encode_file_list_entry(filename)
+        offset = self._offset(index)
+        self._entries.insert(index, entry)
+        self._payload[offset:offset] = entry
+        self._count(filename, 1)
+
+    def remove(self, filename):
+        del self[self.index(filename)]
+
+    def pop(self, index=-1):
+        filename = self[index]
+        del self[index]
+        return filename
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            super().__delitem__(index)
+            self._rebuild()
+            return
+        if index < 0:
+            index += len(self)
+        filename = self[index]
+        super().__delitem__(index)
+        offset = self._offset(index)
+        del self._payload[offset:offset + len(self._entries[index])]
+        del self._entries[index]
+        self._count(filename, -1)
+
+    def __setitem__(self, index, value):
+        super().__setitem__(index, value)
+        self._rebuild()
+
+    def clear(self):
+        super().clear()
+        self._rebuild()
+
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self._rebuild()
+
+    def reverse(self):
+        super().reverse()
+        self._rebuild()
+
+
+class FileCatalog:
+    """Every file the HTTP API lists: virtual files plus uploads, newest upload first.
+
+    Names are kept in a list sorted by (newest upload time, name), so the
+    recent-N query is a slice and a new upload is one bisect insertion;
+    membership is a dict lookup. Virtual files are followed through the
+    list's version counter and merged only after it changes. The files
+    present when the catalog is created sort after every upload, by name.
+    """
+
+    def __init__(self, virtual_files: List[str]):
+        self.virtual_files = virtual_files
+        self._times: Dict[str, float] = {}  # name -> upload timestamp
+        self._order: List[tuple] = []       # Sorted (-timestamp, name)
+        self._virtual_names = set()         # Names in virtual_files at the last sync
+        self._uploaded_names = set()
+        self._virtual_version = None
+        self._lock = threading.RLock()
+        self._sync(0.0)
+
+    def _insert(self, filename: str, timestamp: float):
+        previous = self._times.get(filename)
+        if previous is not None:
+            del self._order[bisect.bisect_left(self._order, (-previous, filename))]
+        self._times[filename] = timestamp
+        bisect.insort(self._order, (-timestamp, filename))
+
+    def _drop(self, filename: str):
+        timestamp = self._times.pop(filename, None)
+        if timestamp is not None:
+            del self._order[bisect.bisect_left(self._order, (-timestamp, filename))]
+
+    def _sync(self, timestamp: float = None):
+        """Merge changes to virtual_files; files new to the catalog get timestamp (default now)"""
+        virtual_files = self.virtual_files
+        version = getattr(virtual_files, 'version', None)
+        with self._lock:
+            if version is not None and version == self._virtual_version:
+                return
+            if timestamp is None:
+                timestamp = time.time()
+
+            changed = None
+            present = virtual_files
+            if version is not None and self._virtual_version is not None:
+                changed = virtual_files.changes_since(self._virtual_version)
+            if changed is None:
+                # Full comparison after bulk changes (or for a plain list)
+                present = set(virtual_files)
+                changed = (present - self._virtual_names) | (self._virtual_names - present)
+
+            for filename in set(changed):
+                if filename in present:
+                    self._virtual_names.add(filename)
+                    if filename not in self._times:
+                        self._insert(filename, timestamp)
+                else:
+                    self._virtual_names.discard(filename)
+                    if filename not in self._uploaded_names:
+                        self._drop(filename)
+            self._virtual_version = version
+
+    def add_upload(self, filename: str, timestamp: float):
+        """List an uploaded file (again) as uploaded at timestamp"""
+        with self._lock:
+            self._uploaded_names.add(filename)
+            self._insert(filename, timestamp)
+
+    def remove_upload(self, filename: str):
+        """Forget an uploaded file unless it is also a virtual file"""
+        with self._lock:
+            self._uploaded_names.discard(filename)
+            if filename not in self._virtual_names:
+                self._drop(filename)
+
+    def __contains__(self, filename) -> bool:
+        self._sync()
+        return filename in self._times
+
+    def __len__(self) -> int:
+        self._sync()
+        return len(self._order)
+
+    def names(self) -> List[str]:
+        """All file names, newest upload first"""
+        return self.recent(None)
+
+    def recent(self, count: Optional[int]) -> List[str]:
+        """The count most recently uploaded file names, newest first"""
+        self._sync()
+        with self._lock:
+            return [filename for _, filename in self._order[:count]]
+
 
 class EnhancedFileManager:
     """Enhanced file manager supporting both TCP and HTTP operations"""
 
-    def __init__(self, virtual_files: List[str], thumbnail_path: str = None):
+    def __init__(self, virtual_files: List[str], thumbnail_path: str = None, blob_store: BlobStore = None):
         # TCP compatibility
         self.virtual_files = virtual_files  # Shared with TCP
         self.thumbnail_path = thumbnail_path or "standard_thumbnail.png"
 
         # HTTP specific storage
-        self.uploaded_files = {}  # filename -> file data
+        self.uploaded_files: Dict[str, StoredFile] = {}  # filename -> file spooled to disk
         self.file_metadata = {}   # filename -> metadata dict
         self.file_thumbnails = {}  # filename -> base64 thumbnail data
+        self._unindexed_archives = set()  # Uploaded 3MF files whose slice info is not merged yet
+        self.catalog = FileCatalog(virtual_files)  # HTTP listing and file lookups
+
+        # Upload payloads live in a content-addressed store shared by all emulators
+        self.upload_settings = dict(config.UPLOAD_CONFIG)
+        self.blob_store = blob_store or shared_blob_store
+        self._upload_lock = threading.Lock()
+        # Drop this manager's references when it goes away, so unused blobs are deleted
+        weakref.finalize(self, _release_uploaded_files, self.blob_store, self.uploaded_files)
 
         # Initialize with some default metadata for virtual files
         self._initialize_default_metadata()
@@ -71,46 +366,102 @@ class EnhancedFileManager:
                     })
                 self.file_metadata[filename] = metadata
 
-    def add_uploaded_file(self, filename: str, file_data: bytes, metadata: Dict = None):
-        """Add file from HTTP upload"""
-        self.uploaded_files[filename] = file_data
+    def begin_upload(self, filename: str) -> SpooledUpload:
+        """Start streaming an upload to disk; finish with commit() or abort()"""
+        return SpooledUpload(self, filename, self.blob_store.open_writer())
+
+    def _commit_upload(self, filename: str, digest: str, metadata: Dict = None,
+                       file_metadata: Dict = None) -> StoredFile:
+        """Point filename at a committed blob, replacing an earlier file of the same name"""
+        stored = StoredFile(digest, self.blob_store.path(digest), self.blob_store.size(digest))
+
+        with self._upload_lock:
+            previous = self.uploaded_files.get(filename)
+            self.uploaded_files[filename] = stored
+        if previous:
+            self.blob_store.release(previous.digest)
+
+        self._set_upload_metadata(filename, stored.size, metadata, file_metadata)
+        return stored
 
+    def _set_upload_metadata(self, filename: str, size: int, metadata: Dict = None,
+                             file_metadata: Dict = None):
+        """Record metadata for a new upload and list it for TCP clients.
+
+        Values read from the file itself take precedence over the ones the
+        client sent in headers, which in turn replace the defaults.
+        """
+        upload_time = datetime.now()
         if metadata:
-            self.file_metadata[filename] = metadata
+            metadata = dict(metadata)
+            metadata.setdefault("uploadTime", upload_time.isoformat())
+            metadata.setdefault("fileSize", size)
         else:
             # Create default metadata
-            self.file_metadata[filename] = {
+            metadata = {
                 "printingTime": 3600,
-                "uploadTime": datetime.now().isoformat(),
-                "fileSize": len(file_data),
+                "uploadTime": upload_time.isoformat(),
+                "fileSize": size,
                 "totalFilamentWeight": 25.0,
                 "useMatlStation": False,
                 "gcodeToolCnt": 1,
                 "gcodeToolDatas": []
             }
 
+        file_metadata = dict(file_metadata or {})
+        thumbnail = file_metadata.pop("thumbnail", None)
+        metadata.update(file_metadata)
+        self.file_metadata[filename] = metadata
+
+        # 3MF slice info is read from the archive the first time it is needed
+        if is_3mf_file(filename):
+            self._unindexed_archives.add(filename)
+        else:
+            self._unindexed_archives.discard(filename)
+
+        # Embedded preview, or the default thumbnail for a replaced file
+        if thumbnail:
+            self.file_thumbnails[filename] = thumbnail
+        else:
+            self.file_thumbnails.pop(filename, None)
+
+        # List it as the newest file (or at the upload time the caller gave)
+        try:
+            upload_time = datetime.fromisoformat(metadata["uploadTime"])
+        except (TypeError, ValueError):
+            pass
+        self.catalog.add_upload(filename, upload_time.timestamp())
+
         # Add to virtual_files for TCP compatibility
         if filename not in self.virtual_files:
             self.virtual_files.append(filename)
 
+    def add_uploaded_file(self, filename: str, file_data: bytes, metadata: Dict = None):
+        """Add file from HTTP upload (already in memory; streamed uploads use begin_upload)"""
+        upload = self.begin_upload(filename)
+        try:
+            upload.write(file_data)
+        except BaseException:
+            upload.abort()
+            raise
+        upload.commit(metadata)
+
     def get_file_list(self, api_type: str = "tcp") -> List[str]:
         """Get file list for specific API type"""
         if api_type == "http":
-            # Return combined list for HTTP API
-            all_files = set(self.virtual_files)
-            all_files.update(self.uploaded_files.keys())
-            return sorted(list(all_files))
+            # Virtual and uploaded files combined, newest upload first
+            return self.catalog.names()
         return self.virtual_files
 
     def get_recent_file_list(self, printer_mode: str = "5M") -> Union[List[str], List[Dict]]:
         """Get recent file list with mode-appropriate format"""
-        files = self.get_file_list("http")
+        files = self.catalog.recent(10)
 
         if printer_mode == "AD5X":
             # Return detailed format for AD5X
             detailed_files = []
-            for filename in files[:10]:  # Last 10 files
-                metadata = self.file_metadata.get(filename, {})
+            for filename in files:
+                metadata = self.get_file_metadata(filename)
                 file_entry = {
                     "gcodeFileName": filename,
                     "printingTime": metadata.get("printingTime", 3600)
@@ -130,7 +481,7 @@ class EnhancedFileManager:
             return detailed_files
         else:
             # Return simple string array for 5M/5M Pro
-            return files[:10]
+            return files
 
     def get_file_thumbnail(self, filename: str) -> Optional[str]:
         """Get base64 encoded thumbnail for file"""
@@ -138,12 +489,16 @@ class EnhancedFileManager:
         if filename in self.file_thumbnails:
             return self.file_thumbnails[filename]
 
-        # Try to load default thumbnail
+        # Plate preview of an uploaded 3MF
+        index = self._get_archive_index(filename)
+        if index:
+            thumbnail = index.get_thumbnail()
+            if thumbnail:
+                return thumbnail
+
+        # Try to load default thumbnail (cached until the file changes)
         try:
-            if os.path.exists(self.thumbnail_path):
-                with open(self.thumbnail_path, 'rb') as f:
-                    thumbnail_data = f.read()
-                return base64.b64encode(thumbnail_data).decode('utf-8')
+            return thumbnail_cache.get_base64(self.thumbnail_path)
         except Exception:
             pass
 
@@ -155,8 +510,25 @@ class EnhancedFileManager:
 
     def get_file_metadata(self, filename: str) -> Dict:
         """Get metadata for a specific file"""
+        if filename in self._unindexed_archives:
+            self._merge_archive_metadata(filename)
         return self.file_metadata.get(filename, {})
 
+    def _get_archive_index(self, filename: str):
+        """3MF index of an uploaded archive, or None"""
+        stored = self.uploaded_files.get(filename)
+        if stored is None or not is_3mf_file(filename):
+            return None
+        return threemf_indexes.get(stored.path)
+
+    def _merge_archive_metadata(self, filename: str):
+        """Replace header and default metadata of an uploaded 3MF with its slice info"""
+        self._unindexed_archives.discard(filename)
+        index = self._get_archive_index(filename)
+        archive_metadata = index.get_metadata() if index else {}
+        if archive_metadata and filename in self.file_metadata:
+            self.file_metadata[filename].update(archive_metadata)
+
     def update_file_metadata(self, filename: str, metadata: Dict):
         """Update metadata for a file"""
         if filename in self.file_metadata:
@@ -166,11 +538,19 @@ class EnhancedFileManager:
 
     def file_exists(self, filename: str) -> bool:
         """Check if file exists in either virtual or uploaded files"""
-        return filename in self.virtual_files or filename in self.uploaded_files
+        return filename in self.catalog
+
+    def get_file_path(self, filename: str) -> Optional[str]:
+        """Path of an uploaded file on disk (uploaded files only)"""
+        stored = self.uploaded_files.get(filename)
+        return stored.path if stored else None
 
-    def get_file_data(self, filename: str) -> Optional[bytes]:
-        """Get raw file data (for uploaded files only)"""
-        return self.uploaded_files.get(filename)
+    def get_file_data(self, filename: str) -> Optional[memoryview]:
+        """Get raw file data as a read-only memory-mapped view (for uploaded files only)"""
+        stored = self.uploaded_files.get(filename)
+        if stored is None:
+            return None
+        return self.blob_store.view(stored.digest)
 
     def remove_file(self, filename: str) -> bool:
         """Remove file from all storage"""
@@ -180,8 +560,11 @@ class EnhancedFileManager:
             self.virtual_files.remove(filename)
             removed = True
 
-        if filename in self.uploaded_files:
-            del self.uploaded_files[filename]
+        with self._upload_lock:
+            stored = self.uploaded_files.pop(filename, None)
+        if stored:
+            self.blob_store.release(stored.digest)
+            self.catalog.remove_upload(filename)
             removed = True
 
         if filename in self.file_metadata:
@@ -190,56 +573,9 @@ class EnhancedFileManager:
         if filename in self.file_thumbnails:
             del self.file_thumbnails[filename]
 
+        self._unindexed_archives.discard(filename)
         return removed
 
-    def process_upload_headers(self, headers: Dict[str, str]) -> Dict[str, Any]:
-        """Process HTTP upload headers into metadata"""
-        metadata = {
-            "uploadTime": datetime.now().isoformat(),
-            "printingTime": 3600,  # Default 1 hour
-            "useMatlStation": headers.get('useMatlStation', 'false').lower() == 'true',
-            "gcodeToolCnt": int(headers.get('gcodeToolCnt', '1')),
-            "totalFilamentWeight": 25.0,  # Default
-            "gcodeToolDatas": []
-        }
-
-        # Process file size
-        if 'fileSize' in headers:
-            try:
-                metadata['fileSize'] = int(headers['fileSize'])
-            except (ValueError, TypeError):
-                pass
-
-        # Process material mappings for AD5X
-        if 'materialMappings' in headers and metadata['useMatlStation']:
-            try:
-                # Decode base64 material mappings
-                mappings_json = base64.b64decode(headers['materialMappings']).decode('utf-8')
-                material_mappings = json.loads(mappings_json)
-
-                # Convert to gcodeToolDatas format
-                total_weight = 0
-                tool_datas = []
-                for mapping in material_mappings:
-                    tool_data = {
-                        "toolId": mapping.get("toolId", 0),
-                        "slotId": mapping.get("slotId", 1),
-                        "materialName": mapping.get("materialName", "PLA"),
-                        "materialColor": mapping.get("toolMaterialColor", "#FFFFFF"),
-                        "filamentWeight": 22.5  # Estimated weight per tool
-                    }
-                    tool_datas.append(tool_data)
-                    total_weight += tool_data["filamentWeight"]
-
-                metadata['gcodeToolDatas'] = tool_datas
-                metadata['totalFilamentWeight'] = total_weight
-
-            except Exception as e:
-                # If material mapping parsing fails, fall back to defaults
-                pass
-
-        return metadata
-
     def create_test_ad5x_file(self, filename: str = "test_multicolor.3mf"):
         """Create a test multi-color file for AD5X testing"""
         if filename not in self.virtual_files:
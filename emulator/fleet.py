@@ -0,0 +1,231 @@
+"""
+Fleet mode for FlashForge Emulator.
+Hosts many independent emulated printers in one process. Every printer has
+its own identity, file store and simulation state, and all TCP and HTTP
+servers run on a single shared event loop.
+"""
+import asyncio
+import ipaddress
+import json
+import socket
+import threading
+import zlib
+from typing import Callable, Dict, List, Optional
+from .fleet_simulation import FleetSimulation, numpy_available
+from .printer import PrinterEmulator
+import config
+
+
+class _BroadcastDiscoveryProtocol(asyncio.DatagramProtocol):
+    """Wildcard discovery socket that hands broadcasts to every alias printer.
+
+    A socket bound to a unicast alias never receives broadcast datagrams, so
+    in 'aliases' mode one socket bound to all interfaces picks them up and
+    each printer answers from its own alias socket. Unicast requests still
+    reach the alias sockets directly.
+    """
+
+    def __init__(self, fleet):
+        self.fleet = fleet
+
+    def datagram_received(self, data, addr):
+        for printer in list(self.fleet.printers):
+            transport = printer.server.discovery_server
+            if transport is not None:
+                transport.get_protocol().datagram_received(data, addr)
+
+
+class PrinterFleet:
+    """A set of emulated printers bound to distinct ports or loopback aliases.
+
+    In 'ports' mode every printer listens on the same host with its own TCP
+    and HTTP port (base port + index). In 'aliases' mode every printer gets
+    its own loopback address (alias_base + index) with the standard ports,
+    so clients that assume ports 8899/8898 work unchanged. Loopback aliases
+    beyond 127.0.0.1 work out of the box on Linux; other systems need them
+    added to the loopback interface first. With discovery enabled in 'aliases'
+    mode, broadcast discovery requests are relayed to every printer.
+    """
+
+    def __init__(self, count: Optional[int] = None, logger: Optional[Callable] = None, **settings):
+        self.settings = dict(config.FLEET_CONFIG)
+        self.settings.update(settings)
+        if count is not None:
+            self.settings['count'] = count
+        self.log = logger if logger else print
+
+        self.printers: List[PrinterEmulator] = []
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread: Optional[threading.Thread] = None
+        self.simulation: Optional[FleetSimulation] = None
+        self.discovery_relay = None  # Broadcast discovery socket ('aliases' mode)
+        self.is_running = False
+
+    def get_address(self, index: int):
+        """Return (host, tcp_port, http_port) for printer index"""
+        if self.settings['bind_mode'] == config.FleetBindMode.ALIASES:
+            host = str(ipaddress.IPv4Address(self.settings['alias_base']) + index)
+            return host, config.COMMAND_PORT, config.HTTP_PORT
+        return (self.settings['host'],
+                self.settings['base_tcp_port'] + index,
+                self.settings['base_http_port'] + index)
+
+    def _create_printer(self, index: int, thumbnail_path: Optional[str]) -> PrinterEmulator:
+        """Create printer index with its own identity, bound to its own address"""
+        host, tcp_port, http_port = self.get_address(index)
+        name = f"{self.settings['name_prefix']} {index + 1}"
+        serial = f"{self.settings['serial_prefix']}{index + 1:05d}"
+
+        def log(message, name=name):
+            self.log(f"[{name}] {message}")
+
+        printer = PrinterEmulator(logger=log, bind_host=host, tcp_port=tcp_port,
+                                  http_port=http_port, loop=self.loop)
+        printer.config.update({
+            "printer_name": name,
+            "serial_number": serial,
+            "check_code": f"{zlib.crc32(serial.encode('ascii')):08x}",
+            "ip_address": host,
+            "mac_address": "AA:BB:{:02X}:{:02X}:{:02X}:{:02X}".format(*(index + 1).to_bytes(4, 'big')),
+            "discovery_enabled": self.settings['discovery_enabled'],
+        })
+        if thumbnail_path:
+            printer.set_thumbnail(thumbnail_path)
+        return printer
+
+    def start(self, thumbnail_path: Optional[str] = None) -> int:
+        """Create and start every printer; returns how many started"""
+        if self.is_running:
+            return len(self.printers)
+
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = threading.Thread(target=self._run_event_loop, name="fleet-loop", daemon=True)
+        self.loop_thread.start()
+
+        started = 0
+        for index in range(self.settings['count']):
+            try:
+                printer = self._create_printer(index, thumbnail_path)
+                self.printers.append(printer)
+                if printer.start_server():
+                    started += 1
+            except Exception as e:
+                self.log(f"Error starting fleet printer {index + 1}: {e}")
+
+        if (self.settings['discovery_enabled']
+                and self.settings['bind_mode'] == config.FleetBindMode.ALIASES):
+            try:
+                future = asyncio.run_coroutine_threadsafe(self._start_discovery_relay(), self.loop)
+                self.discovery_relay = future.result(timeout=5)
+            except Exception as e:
+                self.log(f"Broadcast discovery unavailable, only unicast discovery works: {e}")
+
+        # One vectorized step for the whole fleet when NumPy is available
+        if numpy_available():
+            self.simulation = FleetSimulation(self.printers)
+
+        self.is_running = True
+        self.log(f"Fleet started: {started}/{self.settings['count']} printers "
+                 f"({self.settings['bind_mode']} mode)")
+        return started
+
+    def stop(self):
+        """Stop every printer and the shared event loop"""
+        for printer in self.printers:
+            try:
+                if printer.server.is_running:
+                    printer.stop_server()
+            except Exception as e:
+                printer.log(f"Error stopping printer: {e}")
+        if self.discovery_relay is not None:
+            self.loop.call_soon_threadsafe(self.discovery_relay.close)
+            self.discovery_relay = None
+        self.printers = []
+        self.simulation = None
+
+        if self.loop and self.loop.is_running():
+            future = asyncio.run_coroutine_threadsafe(self._cancel_tasks(), self.loop)
+            try:
+                future.result(timeout=5)
+            except Exception:
+                pass
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.loop_thread:
+            self.loop_thread.join(timeout=5)
+            self.loop_thread = None
+        if self.loop and not self.loop.is_running():
+            self.loop.close()
+        self.loop = None
+
+        self.is_running = False
+        self.log("Fleet stopped")
+
+    def _run_event_loop(self):
+        """Run the shared asyncio event loop in a separate thread"""
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    async def _start_discovery_relay(self):
+        """Bind the wildcard broadcast discovery socket (runs in event loop)"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        try:
+            sock.bind(('', config.DISCOVERY_PORT))
+        except OSError:
+            sock.close()
+            raise
+        transport, _ = await self.loop.create_datagram_endpoint(
+            lambda: _BroadcastDiscoveryProtocol(self), sock=sock)
+        return transport
+
+    async def _cancel_tasks(self):
+        """Cancel anything still scheduled on the shared loop (runs in event loop)"""
+        tasks = [task for task in asyncio.all_tasks(self.loop) if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def simulation_tick(self, dt: float = 1.0):
+        """Advance the simulation of every printer by dt seconds"""
+        if self.simulation:
+            self.simulation.tick(dt)
+            return
+        for printer in self.printers:
+            printer.simulation_tick(dt)
+
+    def simulation_configs(self) -> List:
+        """Configs the simulation clock watches for changes"""
+        return [printer.config for printer in self.printers]
+
+    def is_simulation_settled(self) -> bool:
+        """True when no printer is printing or changing temperature"""
+        if self.simulation:
+            return self.simulation.is_settled()
+        return all(printer.is_simulation_settled() for printer in self.printers)
+
+    def manifest(self) -> List[Dict]:
+        """Connection details of every printer, for pointing load-test clients at the fleet"""
+        entries = []
+        for index, printer in enumerate(self.printers):
+            host, tcp_port, http_port = self.get_address(index)
+            entries.append({
+                "name": printer.config['printer_name'],
+                "serial_number": printer.config['serial_number'],
+                "check_code": printer.config['check_code'],
+                "ip_address": host,
+                "tcp_port": tcp_port,
+                "http_port": http_port,
+            })
+        return entries
+
+    def save_manifest(self, filepath: str) -> bool:
+        """Write the fleet manifest to a JSON file"""
+        try:
+            with open(filepath, 'w') as f:
+                json.dump(self.manifest(), f, indent=2)
+            self.log(f"Fleet manifest saved to {filepath}")
+            return True
+        except Exception as e:
+            self.log(f"Error saving fleet manifest: {e}")
+            return False
@@ -0,0 +1,229 @@
+"""
+Vectorized simulation tick for fleet mode.
+Keeps the thermal and print progress state of every printer in NumPy arrays
+and advances the whole fleet in one step, following the same curves as
+PrinterEmulator.simulate_temperatures / simulate_print_progress.
+NumPy is optional; without it the fleet falls back to per-printer ticks.
+It is imported on first use, so importing this module stays cheap.
+"""
+import threading
+from operator import attrgetter
+from typing import List
+from .printer import PROGRESS_EPSILON, SETTLED_TOLERANCE, completed_print_statistics
+
+np = None  # NumPy, once numpy_available() has imported it
+
+
+def numpy_available() -> bool:
+    """Import NumPy on first call; False when it is not installed"""
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:  # pragma: no cover - optional dependency
+            return False
+        np = numpy
+    return True
+
+# Per-second rates matching PrinterEmulator.simulate_temperatures:
+# (heat toward target, cool toward target, cool toward idle, warm toward idle,
+#  jitter while targeting, jitter while idle)
+HOTEND_RATES = (5.0, 2.0, 1.0, 0.5, 0.3, 0.1)
+BED_RATES = (2.0, 1.0, 0.8, 0.3, 0.1, 0.05)
+
+_IDLE_HOTEND = attrgetter('idle_hotend_temp')
+_IDLE_BED = attrgetter('idle_bed_temp')
+
+
+def step_temperatures(temp, target, idle, rates, rng, dt=1.0):
+    """Advance an array of heater temperatures by dt seconds"""
+    heat, cool, idle_cool, idle_warm, jitter_active, jitter_idle = rates
+    heat, cool, idle_cool, idle_warm = heat * dt, cool * dt, idle_cool * dt, idle_warm * dt
+    # Jitter is a random walk, so it scales with sqrt(dt)
+    jitter_active, jitter_idle = jitter_active * dt ** 0.5, jitter_idle * dt ** 0.5
+    active = target > 0
+    goal = np.where(active, target, idle)
+    diff = goal - temp
+
+    # Move toward the goal (capped per tick) unless already within 0.5 degrees
+    up = np.minimum(np.where(active, heat, idle_warm), diff)
+    down = np.minimum(np.where(active, cool, idle_cool), -diff)
+    step = np.where(diff > 0, up, -down)
+    temp = temp + np.where(np.abs(diff) > 0.5, step, 0.0)
+
+    # Temperature jitter for realism (smaller when idling)
+    jitter = np.where(active, jitter_active, jitter_idle)
+    return temp + rng.uniform(-1.0, 1.0, temp.shape) * jitter
+
+
+class FleetSimulation:
+    """Batched simulation state for a list of PrinterEmulator instances.
+
+    The arrays are the authoritative copy of each printer's simulated
+    fields. A tick reloads printers whose config version moved (a command
+    changed a target or the print status), steps the arrays and returns
+    without touching the configs. Each printer's config is updated lazily
+    through its refresh hook, when a server is about to read it; writing
+    thousands of dicts every tick would cost far more than the step itself.
+    """
+
+    def __init__(self, printers: List, seed=None):
+        if not numpy_available():
+            raise ImportError("FleetSimulation requires numpy")
+
+        self.printers = list(printers)
+        self.configs = [printer.config for printer in self.printers]
+        self.rng = np.random.default_rng(seed)
+        count = len(self.printers)
+
+        self.hotend_temp = np.zeros(count)
+        self.bed_temp = np.zeros(count)
+        self.target_hotend = np.zeros(count)
+        self.target_bed = np.zeros(count)
+        self.idle_hotend = np.zeros(count)
+        self.idle_bed = np.zeros(count)
+        self.print_progress = np.zeros(count)
+        self.total_layers = np.zeros(count)
+        self.estimated_time = np.zeros(count)
+        self.print_duration = np.zeros(count)
+        self.current_layer = np.zeros(count, dtype=int)
+        self.remaining_time = np.zeros(count)
+        self.printing = np.zeros(count, dtype=bool)
+        self.progressed = np.zeros(count, dtype=bool)  # Print fields owned by the simulation
+
+        self.generation = 0                 # Ticks simulated so far
+        self._versions = [None] * count     # Config version the arrays match
+        self._published = [0] * count       # Generation last written to each config
+        self._published_values = [None] * count  # Values last written to each config
+        self._lock = threading.Lock()
+
+        for index, cfg in enumerate(self.configs):
+            cfg.refresh_hook = lambda index=index: self.publish(index)
+
+    def detach(self):
+        """Publish every printer and remove the refresh hooks"""
+        for index, cfg in enumerate(self.configs):
+            self.publish(index)
+            cfg.refresh_hook = None
+
+    def _sync(self, index: int):
+        """Merge a config changed outside the simulation into the arrays"""
+        cfg = self.configs[index]
+        version = cfg.version
+
+        # Inputs always come from the config
+        self.target_hotend[index] = cfg['target_hotend']
+        self.target_bed[index] = cfg['target_bed']
+        self.total_layers[index] = cfg.get('total_layers', 100)
+        self.estimated_time[index] = cfg.get('estimated_print_time') or 3600
+        self.printing[index] = cfg.get('print_status') == 'printing'
+
+        # Simulated values only where a command wrote them; the config may
+        # otherwise hold values from an older tick that were never published
+        published = self._published_values[index]
+        for key, array in (('hotend_temp', self.hotend_temp), ('bed_temp', self.bed_temp),
+                           ('print_progress', self.print_progress),
+                           ('print_duration', self.print_duration)):
+            value = cfg.get(key, 0)
+            if published is None or published.get(key) != value:
+                array[index] = value
+                if key == 'print_progress':
+                    self.progressed[index] = False
+        self._versions[index] = version
+
+    def _load(self):
+        """Merge every config changed outside the simulation since the last tick"""
+        versions = self._versions
+        for index, cfg in enumerate(self.configs):
+            if cfg.version != versions[index]:
+                self._sync(index)
+
+        # Idle temperatures are emulator attributes, not versioned config values
+        count = len(self.printers)
+        self.idle_hotend = np.fromiter(map(_IDLE_HOTEND, self.printers), float, count)
+        self.idle_bed = np.fromiter(map(_IDLE_BED, self.printers), float, count)
+
+    def tick(self, dt: float = 1.0):
+        """Advance every printer by dt seconds of simulated time"""
+        with self._lock:
+            self._load()
+
+            self.hotend_temp = step_temperatures(self.hotend_temp, self.target_hotend, self.idle_hotend,
+                                                 HOTEND_RATES, self.rng, dt)
+            self.bed_temp = step_temperatures(self.bed_temp, self.target_bed, self.idle_bed,
+                                              BED_RATES, self.rng, dt)
+
+            # Print progress, as simulate_print_progress (layer and remaining time follow it)
+            printing = self.printing
+            increment = dt * 100.0 / self.estimated_time
+            progress = np.where(printing, self.print_progress + increment, self.print_progress)
+            progress = np.where(progress > 100.0 - PROGRESS_EPSILON, 100.0, progress)
+            self.print_duration = np.where(printing, self.print_duration + dt, self.print_duration)
+            completed = printing & (progress >= 100.0)
+
+            self.current_layer = np.where(printing, (progress / 100.0 * self.total_layers).astype(int),
+                                          self.current_layer)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                remaining = np.maximum(0.0, self.print_duration * 100 / progress - self.print_duration)
+            self.remaining_time = np.where(completed, 0.0, np.where(printing, remaining, self.remaining_time))
+
+            self.printing = printing & ~completed
+            self.print_progress = progress
+            self.progressed |= printing
+            self.generation += 1
+
+            # Completions change the print status, publish them right away
+            completed_indices = np.flatnonzero(completed).tolist()
+
+        for index in completed_indices:
+            self.publish(index, completed=True)
+
+    def is_settled(self) -> bool:
+        """True when no printer is printing and every heater sits at its goal temperature"""
+        with self._lock:
+            # Pick up commands that landed since the last tick (a print start, say)
+            self._load()
+            if self.printing.any():
+                return False
+            for temp, target, idle in ((self.hotend_temp, self.target_hotend, self.idle_hotend),
+                                       (self.bed_temp, self.target_bed, self.idle_bed)):
+                goal = np.where(target > 0, target, idle)
+                if np.any(np.abs(temp - goal) > SETTLED_TOLERANCE):
+                    return False
+            return True
+
+    def publish(self, index: int, completed: bool = False):
+        """Write printer index's simulated values to its config if they are stale"""
+        with self._lock:
+            if self._published[index] == self.generation and not completed:
+                return
+            cfg = self.configs[index]
+            if cfg.version != self._versions[index]:
+                # Changed by a command since it was last synced
+                self._sync(index)
+
+            values = {
+                'hotend_temp': float(self.hotend_temp[index]),
+                'bed_temp': float(self.bed_temp[index]),
+            }
+            if self.progressed[index]:
+                values.update({
+                    'print_progress': float(self.print_progress[index]),
+                    'current_layer': int(self.current_layer[index]),
+                    'print_duration': float(self.print_duration[index]),
+                    'remaining_time': float(self.remaining_time[index]),
+                })
+            if completed:
+                values['print_status'] = 'completed'
+                values.update(completed_print_statistics(cfg, values['print_duration']))
+            # Hold the config's lock so a command cannot write between our update
+            # and the version we record for it (it would be taken for our own write)
+            with cfg._lock:
+                cfg.update(values)
+                # Our own writes are not external changes
+                self._versions[index] = cfg.version
+            self._published_values[index] = values
+            self._published[index] = self.generation
+
+        if completed:
+            self.printers[index].log(f"Print completed: {cfg.get('current_file', 'unknown')}")
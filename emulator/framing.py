@@ -0,0 +1,52 @@
+"""
+Line framing for the TCP command protocol
+"""
+from typing import List
+
+
+class CommandFramer:
+    """Per-connection buffer that splits the TCP byte stream into commands.
+
+    Commands are newline terminated (clients send ``\\r\\n``). Several commands
+    may arrive in one segment and one command may be split across segments,
+    so incomplete data is kept until the rest of the line arrives.
+    """
+
+    def __init__(self, max_line_length: int = 65536):
+        self.buffer = bytearray()
+        self.max_line_length = max_line_length
+
+    @property
+    def pending(self) -> bool:
+        """True if an unterminated partial command is buffered"""
+        return len(self.buffer) > 0
+
+    def feed(self, data: bytes) -> List[str]:
+        """Add received bytes and return every complete command"""
+        self.buffer.extend(data)
+
+        commands = []
+        start = 0
+        while True:
+            end = self.buffer.find(b'\n', start)
+            if end < 0:
+                break
+            command = self.buffer[start:end].decode('ascii', errors='replace').strip()
+            if command:
+                commands.append(command)
+            start = end + 1
+
+        if start:
+            del self.buffer[:start]
+
+        # Never let a client without line terminators grow the buffer forever
+        if len(self.buffer) > self.max_line_length:
+            commands.extend(self.flush())
+
+        return commands
+
+    def flush(self) -> List[str]:
+        """Return the buffered partial command (if any) and clear the buffer"""
+        command = self.buffer.decode('ascii', errors='replace').strip()
+        self.buffer.clear()
+        return [command] if command else []
@@ -0,0 +1,318 @@
+"""
+Streaming metadata extraction for uploaded .gcode and .gx files.
+Reads slicer header and footer comments (OrcaSlicer / Orca-FlashForge,
+PrusaSlicer, Cura, FlashPrint) and the FlashPrint .gx binary header in a
+single pass over upload chunks, without buffering the file.
+"""
+import base64
+import math
+import re
+import struct
+from typing import Dict, List, Optional
+
+GCODE_EXTENSIONS = ('.gcode', '.gx')
+
+# Slicer comments worth reading. Patterns start at the newline before the
+# comment: a literal prefix lets the regex engine skip plain G-code lines
+# at memchr speed, where a ^ anchor would be tried at every byte.
+_FIELD = (rb';[ \t]*(?P<key>model printing time|estimated printing time \(normal mode\)|TIME|estimated_time\(s\)'
+          rb'|total layer number|total layers count|LAYER_COUNT|layer_count'
+          rb'|total filament length \[mm\]|filament used \[mm\]|Filament used'
+          rb'|total filament weight \[g\]|filament used \[g\]'
+          rb'|filament_type|filament_colour|extruder_colour|filament_diameter|filament_density)'
+          rb'[ \t]*[:=][ \t]*(?P<value>[^\r\n]*)')
+_FIELD_PATTERN = re.compile(b'\n' + _FIELD)
+_FIELD_AT_START = re.compile(_FIELD)
+_THUMBNAIL = rb'; thumbnail begin (\d+)x(\d+)'
+_THUMBNAIL_BEGIN = re.compile(b'\n' + _THUMBNAIL)
+_THUMBNAIL_AT_START = re.compile(_THUMBNAIL)
+_THUMBNAIL_END = b'; thumbnail end'
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)\s*([dhms])')
+# Layer change markers (Orca/Prusa, Cura, FlashPrint), counted when no header gives a layer count
+_LAYER_MARKERS = (b'\n;LAYER_CHANGE', b'\n;LAYER:', b'\n;layer:')
+
+# FlashPrint .gx: magic, then offsets and print statistics before an 80x60 BMP preview
+GX_MAGIC = b'xgcode 1.0'
+_GX_HEADER = struct.Struct('<12x4xIIIIII')  # bitmap, gcode, gcode, seconds, right mm, left mm
+
+MAX_THUMBNAIL_SIZE = 1024 * 1024  # Base64 bytes; larger embedded previews are skipped
+MAX_LINE_LENGTH = 64 * 1024       # Longer lines (binary or garbage data) are skipped, not buffered
+DEFAULT_FILAMENT_DIAMETER = 1.75  # mm
+DEFAULT_FILAMENT_DENSITY = 1.24   # g/cm^3 (PLA)
+
+
+def is_gcode_file(filename: str) -> bool:
+    """Whether the file is G-code this module can read"""
+    return filename.lower().endswith(GCODE_EXTENSIONS)
+
+
+def parse_duration(text: str) -> Optional[int]:
+    """Parse '1h 2m 3s', '2d 1h' or a plain number of seconds"""
+    text = text.strip()
+    try:
+        return int(float(text))
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(text)
+    if not parts:
+        return None
+    scale = {'d': 86400, 'h': 3600, 'm': 60, 's': 1}
+    return int(sum(float(amount) * scale[unit] for amount, unit in parts))
+
+
+def _parse_numbers(text: str, scale: float = 1.0) -> List[float]:
+    """Parse a comma or semicolon separated list like '1234.5, 0.0' or '1.2m;0m'"""
+    values = []
+    for item in re.split(r'[,;]', text):
+        item = item.strip().rstrip('m').strip()
+        if not item:
+            continue
+        try:
+            values.append(float(item) * scale)
+        except ValueError:
+            return []
+    return values
+
+
+def _split_list(text: str) -> List[str]:
+    return [item.strip() for item in re.split(r'[;,]', text) if item.strip()]
+
+
+class GcodeMetadataParser:
+    """Incremental parser fed with consecutive chunks of one file.
+
+    Only the bytes after the last complete line of a chunk are carried
+    over to the next one, so memory use is bounded by the chunk size,
+    MAX_LINE_LENGTH and the largest embedded thumbnail.
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, str] = {}
+        self.layer_markers = [0] * len(_LAYER_MARKERS)
+        self.thumbnail = None         # (width, height, base64 bytes) of the largest preview
+        self.gx_header = None         # (seconds, right mm, left mm) from a .gx header
+        self._tail = b''
+        self._skip_line = False       # Dropping the rest of an overlong line
+        self._thumbnail_parts = None  # Base64 lines of the preview being read
+        self._thumbnail_size = (0, 0)
+        self._thumbnail_length = 0
+        self._gx_pending = True       # Still deciding whether this is a .gx file
+        self._gx_skip = 0             # Binary bytes left before the G-code text
+
+    def feed(self, chunk):
+        """Parse the next chunk of the file"""
+        data = self._tail + bytes(chunk) if self._tail else bytes(chunk)
+        if self._gx_pending:
+            data = self._read_gx_header(data)
+            if data is None:
+                return
+        if self._gx_skip:
+            skipped = min(self._gx_skip, len(data))
+            self._gx_skip -= skipped
+            data = data[skipped:]
+        if self._skip_line:
+            newline = data.find(b'\n')
+            if newline < 0:
+                return
+            self._skip_line = False
+            data = data[newline + 1:]
+
+        end = data.rfind(b'\n') + 1
+        tail = data[end:]
+        if len(tail) > MAX_LINE_LENGTH:
+            # Never hold an unterminated line (no metadata is that long) in memory
+            tail = b''
+            self._skip_line = True
+        self._tail = tail
+        if end:
+            self._scan(data, end)
+
+    def close(self) -> Dict:
+        """Finish parsing and return the metadata found"""
+        if self._tail and not self._gx_pending:
+            self._scan(self._tail + b'\n', len(self._tail) + 1)
+        self._tail = b''
+        return self.result()
+
+    def _read_gx_header(self, data: bytes) -> Optional[bytes]:
+        """Consume a .gx binary header; returns the G-code text, or None to wait for more data"""
+        if len(data) < len(GX_MAGIC) and GX_MAGIC.startswith(data):
+            self._tail = data
+            return None
+        if not data.startswith(GX_MAGIC):
+            self._gx_pending = False
+            return data
+        if len(data) < _GX_HEADER.size:
+            self._tail = data
+            return None
+
+        bitmap_offset, gcode_offset, _, seconds, right_mm, left_mm = _GX_HEADER.unpack_from(data)
+        if len(data) < gcode_offset and gcode_offset - bitmap_offset <= MAX_THUMBNAIL_SIZE:
+            self._tail = data  # Wait for the whole preview
+            return None
+
+        self._gx_pending = False
+        self.gx_header = (seconds, right_mm, left_mm)
+        if bitmap_offset < gcode_offset <= len(data):
+            preview = base64.b64encode(data[bitmap_offset:gcode_offset])
+            self.thumbnail = (80, 60, preview)
+        self._gx_skip = max(0, gcode_offset - len(data))
+        return data[gcode_offset:]
+
+    def _scan(self, data: bytes, end: int):
+        """Scan complete lines data[:end] for fields, layer markers and thumbnails"""
+        pos = 0
+        while pos < end:
+            if self._thumbnail_parts is not None:
+                stop = data.find(_THUMBNAIL_END, pos, end)
+                self._add_thumbnail_lines(data[pos:end if stop < 0 else stop])
+                if stop < 0:
+                    return
+                self._finish_thumbnail()
+                pos = data.find(b'\n', stop, end) + 1 or end
+                continue
+
+            # pos is always at a line start; the newline before it is at pos - 1,
+            # or in the previous chunk when pos is 0
+            start = pos - 1 if pos else 0
+            match = (None if pos else _THUMBNAIL_AT_START.match(data, 0, end)) or \
+                _THUMBNAIL_BEGIN.search(data, start, end)
+            stop = match.end(2) if match else end
+
+            fields = list(_FIELD_PATTERN.finditer(data, start, stop))
+            first = None if pos else _FIELD_AT_START.match(data, 0, stop)
+            if first:
+                fields.insert(0, first)
+            for field in fields:
+                key = field.group('key').decode('ascii')
+                # Header and footer may both carry a value; the first one wins
+                self.fields.setdefault(key, field.group('value').decode('utf-8', 'replace').strip())
+
+            for index, marker in enumerate(_LAYER_MARKERS):
+                self.layer_markers[index] += data.count(marker, start, stop)
+                if not pos:
+                    self.layer_markers[index] += data.startswith(marker[1:], 0, stop)
+            if not match:
+                return
+
+            self._thumbnail_parts = []
+            self._thumbnail_size = (int(match.group(1)), int(match.group(2)))
+            self._thumbnail_length = 0
+            pos = data.find(b'\n', match.end(), end) + 1 or end
+
+    def _add_thumbnail_lines(self, lines: bytes):
+        if self._thumbnail_parts is None:
+            return
+        self._thumbnail_length += len(lines)
+        if self._thumbnail_length > MAX_THUMBNAIL_SIZE * 2:
+            self._thumbnail_parts = []  # Too large to keep, still skip to its end
+            return
+        self._thumbnail_parts.append(lines)
+
+    def _finish_thumbnail(self):
+        """Keep the finished preview if it is the largest so far"""
+        encoded = b''.join(b''.join(self._thumbnail_parts).replace(b';', b' ').split())
+        self._thumbnail_parts = None
+        if not encoded or len(encoded) > MAX_THUMBNAIL_SIZE:
+            return
+        width, height = self._thumbnail_size
+        if self.thumbnail is None or width * height > self.thumbnail[0] * self.thumbnail[1]:
+            self.thumbnail = (width, height, encoded)
+
+    def result(self) -> Dict:
+        """Metadata in the file manager's format (only the fields that were found)"""
+        fields = self.fields
+        metadata = {}
+
+        printing_time = None
+        if 'model printing time' in fields and 'total estimated time:' in fields['model printing time']:
+            printing_time = parse_duration(fields['model printing time'].split('total estimated time:')[1])
+        for key in ('estimated printing time (normal mode)', 'TIME', 'estimated_time(s)'):
+            if printing_time is None and key in fields:
+                printing_time = parse_duration(fields[key])
+        if printing_time is None and self.gx_header:
+            printing_time = self.gx_header[0]
+        if printing_time:
+            metadata['printingTime'] = printing_time
+
+        layers = None
+        for key in ('total layer number', 'total layers count', 'LAYER_COUNT', 'layer_count'):
+            if layers is None and key in fields:
+                try:
+                    layers = int(float(fields[key]))
+                except ValueError:
+                    pass
+        if layers is None and max(self.layer_markers):
+            layers = max(self.layer_markers)
+        if layers:
+            metadata['totalLayers'] = layers
+
+        lengths = []
+        for key, scale in (('total filament length [mm]', 1.0), ('filament used [mm]', 1.0),
+                           ('Filament used', 1000.0)):
+            if not lengths and key in fields:
+                lengths = _parse_numbers(fields[key], scale)
+        if not lengths and self.gx_header:
+            lengths = [float(self.gx_header[1]), float(self.gx_header[2])]
+
+        weights = []
+        for key in ('total filament weight [g]', 'filament used [g]'):
+            if not weights and key in fields:
+                weights = _parse_numbers(fields[key])
+        if not weights and lengths:
+            weights = [self._estimate_weight(index, length) for index, length in enumerate(lengths)]
+
+        if lengths or weights:
+            self._add_tool_metadata(metadata, lengths, weights)
+
+        if self.thumbnail:
+            metadata['thumbnail'] = self.thumbnail[2].decode('ascii')
+        return metadata
+
+    def _estimate_weight(self, index: int, length: float) -> float:
+        """Grams of filament for a length in mm, from the slicer's diameter and density when given"""
+        diameter = self._tool_value('filament_diameter', index, DEFAULT_FILAMENT_DIAMETER)
+        density = self._tool_value('filament_density', index, DEFAULT_FILAMENT_DENSITY)
+        return length * math.pi * (diameter / 2) ** 2 * density / 1000.0
+
+    def _tool_value(self, key: str, index: int, default: float) -> float:
+        values = _parse_numbers(self.fields.get(key, ''))
+        if not values:
+            return default
+        return values[min(index, len(values) - 1)] or default
+
+    def _add_tool_metadata(self, metadata: Dict, lengths: List[float], weights: List[float]):
+        """Per-tool filament usage as gcodeToolDatas, plus totals"""
+        types = _split_list(self.fields.get('filament_type', ''))
+        colours = _split_list(self.fields.get('filament_colour', '') or self.fields.get('extruder_colour', ''))
+
+        tool_datas = []
+        for tool_id in range(max(len(lengths), len(weights))):
+            length = lengths[tool_id] if tool_id < len(lengths) else 0.0
+            weight = weights[tool_id] if tool_id < len(weights) else 0.0
+            if not length and not weight:
+                continue
+            colour = colours[tool_id] if tool_id < len(colours) else ''
+            tool_datas.append({
+                "toolId": tool_id,
+                "slotId": tool_id + 1,
+                "materialName": types[tool_id] if tool_id < len(types) else "PLA",
+                "materialColor": colour if colour.startswith('#') else "#FFFFFF",
+                "filamentWeight": round(weight, 2),
+            })
+
+        metadata['totalFilamentLength'] = round(sum(lengths), 2)
+        metadata['totalFilamentWeight'] = round(sum(weights), 2)
+        if tool_datas:
+            metadata['gcodeToolCnt'] = len(tool_datas)
+            metadata['gcodeToolDatas'] = tool_datas
+            metadata['useMatlStation'] = len(tool_datas) > 1
+
+
+def extract_gcode_metadata(data) -> Dict:
+    """Parse a whole file held in memory (or a memoryview of one)"""
+    parser = GcodeMetadataParser()
+    view = memoryview(data)
+    for start in range(0, len(view), 1024 * 1024):
+        parser.feed(view[start:start + 1024 * 1024])
+    return parser.close()
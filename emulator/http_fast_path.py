@@ -0,0 +1,192 @@
+"""
+Fast path for /detail polling in front of the aiohttp HTTP API.
+Clients poll POST /detail every second on a keep-alive connection. Going
+through aiohttp's request machinery costs several times more than building
+the (cached) response, so plain /detail requests are answered straight from
+the connection's protocol. Anything else is handed to aiohttp unchanged.
+"""
+import asyncio
+import time
+from email.utils import formatdate
+from typing import Optional
+from aiohttp.http import SERVER_SOFTWARE
+import config
+from . import json_codec
+from .network_sim import ConnectionImpairment
+
+DETAIL_REQUEST_LINE = b'POST /detail HTTP/1.1'
+MAX_HEADER_SIZE = 8190       # Larger headers go to aiohttp, which rejects them
+MAX_BODY_SIZE = 64 * 1024    # /detail bodies are a serial number and check code
+KEEPALIVE_TIMEOUT = 75.0     # aiohttp's default for idle keep-alive connections
+
+# Headers that need aiohttp's full HTTP handling
+_HAND_OFF_HEADERS = (b'transfer-encoding', b'expect', b'upgrade')
+
+_date_cache = (0, b'')       # (second, Date header value)
+
+
+def _http_date() -> bytes:
+    """Date header value, formatted once per second"""
+    global _date_cache
+    now = int(time.time())
+    if _date_cache[0] != now:
+        _date_cache = (now, formatdate(now, usegmt=True).encode('ascii'))
+    return _date_cache[1]
+
+
+class DetailFastPathProtocol(asyncio.Protocol):
+    """Connection protocol answering plain POST /detail requests itself.
+
+    Requests are parsed only as far as needed: the request line, the
+    Content-Length header and the body. The first request that is not a
+    plain /detail poll (another path, chunked bodies, Connection: close, a
+    failed auth, simulated network impairment, ...) hands the connection,
+    with everything still buffered, to an aiohttp request handler for good.
+    Responses already written stay in order, since they share the transport.
+    """
+
+    def __init__(self, api, aiohttp_server):
+        self.api = api                        # FlashForgeHTTPServerAsync
+        self.aiohttp_server = aiohttp_server  # Low-level aiohttp server (protocol factory)
+        self.transport = None
+        self.client_ip = None
+        self.buffer = bytearray()
+        self.impairment = ConnectionImpairment(
+            lambda: api.printer_emulator.config.get('network_simulation', {}))
+        self._response = (None, None, b'')    # (payload, date, encoded response)
+        self._reading_paused = False
+        self._last_activity = 0.0
+        self._keepalive_handle = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        peername = transport.get_extra_info('peername')
+        self.client_ip = peername[0] if peername else None
+        self.api.fast_path_connections.add(self)
+        self._last_activity = self.api.loop.time()
+        self._keepalive_handle = self.api.loop.call_later(KEEPALIVE_TIMEOUT, self._check_keepalive)
+
+    def connection_lost(self, exc):
+        self._detach()
+
+    def pause_writing(self):
+        # Stop reading requests until the client catches up with the responses
+        self._reading_paused = True
+        self.transport.pause_reading()
+
+    def resume_writing(self):
+        self._reading_paused = False
+        self.transport.resume_reading()
+
+    def data_received(self, data):
+        self.buffer += data
+        self._last_activity = self.api.loop.time()
+        while self.buffer:
+            served = self._serve_next()
+            if served is None:
+                return  # Wait for the rest of the request
+            if not served:
+                self._hand_off()
+                return
+
+    def _serve_next(self) -> Optional[bool]:
+        """Answer the first buffered request; None if incomplete, False to hand off"""
+        buffer = self.buffer
+        end = buffer.find(b'\r\n\r\n')
+        if end < 0:
+            return None if len(buffer) <= MAX_HEADER_SIZE else False
+        if end > MAX_HEADER_SIZE:
+            return False
+
+        lines = bytes(buffer[:end]).split(b'\r\n')
+        if lines[0] != DETAIL_REQUEST_LINE:
+            return False
+        length = None
+        for line in lines[1:]:
+            name, sep, value = line.partition(b':')
+            if not sep:
+                return False
+            name = name.strip().lower()
+            if name == b'content-length':
+                value = value.strip()
+                if length is not None or not value.isdigit():
+                    return False
+                length = int(value)
+            elif name in _HAND_OFF_HEADERS:
+                return False
+            elif name == b'connection' and value.strip().lower() != b'keep-alive':
+                return False
+        if length is None or length > MAX_BODY_SIZE:
+            return False
+        start = end + 4
+        if len(buffer) < start + length:
+            return None
+
+        # Simulated network conditions are applied by the aiohttp middleware
+        if self.impairment.active:
+            return False
+        api = self.api
+        api.printer_emulator.config.refresh()
+        try:
+            data = json_codec.loads(bytes(buffer[start:start + length]))
+        except ValueError:
+            return False
+        if not isinstance(data, dict) or not api._validate_auth(data):
+            return False
+        try:
+            payload = api.render_detail()
+        except Exception:
+            return False  # aiohttp's handler reports the error
+
+        del buffer[:start + length]
+        self.transport.write(self._encode_response(payload))
+        if config.HTTP_CONFIG.get('log_level', config.HttpLogLevel.REQUESTS) != config.HttpLogLevel.OFF:
+            request_body = data if config.HTTP_CONFIG['log_level'] == config.HttpLogLevel.BODIES else None
+            api.log_request('POST', '/detail', self.client_ip, 200, request_body)
+        return True
+
+    def _encode_response(self, payload: bytes) -> bytes:
+        """Full HTTP response for a payload, reused until the payload or the date changes"""
+        date = _http_date()
+        cached_payload, cached_date, response = self._response
+        if cached_payload is payload and cached_date is date:
+            return response
+        response = b''.join((
+            b'HTTP/1.1 200 OK\r\n'
+            b'Content-Type: application/json; charset=utf-8\r\n'
+            b'Content-Length: ', str(len(payload)).encode('ascii'),
+            b'\r\nDate: ', date,
+            b'\r\nServer: ', SERVER_SOFTWARE.encode('ascii'),
+            b'\r\n\r\n', payload))
+        self._response = (payload, date, response)
+        return response
+
+    def _hand_off(self):
+        """Give the connection and its buffered data to an aiohttp request handler"""
+        transport = self.transport
+        data = bytes(self.buffer)
+        self._detach()
+        handler = self.aiohttp_server()
+        transport.set_protocol(handler)
+        handler.connection_made(transport)
+        if self._reading_paused:
+            transport.resume_reading()
+        if data:
+            handler.data_received(data)
+
+    def _check_keepalive(self):
+        """Close the connection once it has been idle for KEEPALIVE_TIMEOUT"""
+        idle = self.api.loop.time() - self._last_activity
+        if idle >= KEEPALIVE_TIMEOUT:
+            self._keepalive_handle = None
+            self.transport.close()
+        else:
+            self._keepalive_handle = self.api.loop.call_later(KEEPALIVE_TIMEOUT - idle, self._check_keepalive)
+
+    def _detach(self):
+        """Stop tracking this connection (closed or handed to aiohttp)"""
+        self.api.fast_path_connections.discard(self)
+        if self._keepalive_handle is not None:
+            self._keepalive_handle.cancel()
+            self._keepalive_handle = None
+        self.buffer.clear()
@@ -3,9 +3,12 @@ HTTP response generators for FlashForge API endpoints
 """
 import json
 import base64
+import math
 from datetime import datetime
+from json.encoder import encode_basestring_ascii
 from typing import Dict, Any, List
-from .printer_modes import ModeFeatures, get_printer_name_for_mode, get_machine_type_for_mode
+from .printer_modes import ModeFeatures, get_mode_features, get_printer_name_for_mode
+from . import json_codec
 import config
 
 def create_error_response(code: int = 1, message: str = "Error") -> Dict[str, Any]:
@@ -33,28 +36,55 @@ def generate_product_response(printer_config: Dict[str, Any], mode_features: Mod
         "product": control_states
     })
 
-def generate_detail_response(printer_config: Dict[str, Any], mode: str, material_station=None) -> Dict[str, Any]:
-    """Generate /detail endpoint response with comprehensive printer status"""
+# /detail fields that change while the printer runs. The rest only change
+# with the printer's identity, mode or material station and are rendered
+# once into a per-config template (see _get_detail_template).
+def _detail_dynamic_fields(printer_config: Dict[str, Any]) -> Dict[str, Any]:
+    """Current values of the dynamic /detail fields"""
+    get = printer_config.get
+    return {
+        "status": get('print_status', 'ready'),
+
+        # Cumulative statistics (CRITICAL for FiveMClient initialization)
+        "cumulativePrintTime": get('cumulative_print_time', 0),  # in minutes
+        "cumulativeFilament": get('cumulative_filament', 0.0),   # in meters
+
+        # Temperatures
+        "rightTemp": get('hotend_temp', 23.0),
+        "rightTargetTemp": get('target_hotend', 0.0),
+        "platTemp": get('bed_temp', 30.0),
+        "platTargetTemp": get('target_bed', 0.0),
+        "chamberTemp": get('chamber_temp', 25.0),
+
+        # Fan speeds
+        "coolingFanSpeed": get('cooling_fan_speed', 0),
+        "chamberFanSpeed": get('chamber_fan_speed', 0),
+
+        # Control states
+        "lightStatus": "open" if get('led_on', False) else "close",
+
+        # Print job info
+        "printFileName": get('current_file', ''),
+        "printProgress": get('print_progress', 0.0),
+        "printLayer": get('current_layer', 0),
+        "targetPrintLayer": get('total_layers', 0),
+        "printDuration": int(get('print_duration', 0)),
+        "estimatedTime": get('remaining_time', 0),
+
+        # File estimates (read from config, updated via UI)
+        # These represent TOTAL job filament, not consumed
+        # DO NOT multiply by progress - return the raw values
+        "estimatedRightLen": get('estimated_right_len', 0.0),
+        "estimatedRightWeight": get('estimated_right_weight', 0.0),
+        "estimatedLeftLen": get('estimated_left_len', 0.0),
+        "estimatedLeftWeight": get('estimated_left_weight', 0.0),
+    }
+
+def _build_detail_template(printer_config: Dict[str, Any], mode: str, material_station=None) -> Dict[str, Any]:
+    """Render the static /detail fields; dynamic fields are placeholders in their final position"""
 
     # Get mode-specific printer info
     printer_name = get_printer_name_for_mode(mode, printer_config.get('printer_name', 'FlashForge Adventurer'))
-    machine_type = get_machine_type_for_mode(mode)
-
-    # Get current temperatures and status
-    hotend_temp = printer_config.get('hotend_temp', 23.0)
-    target_hotend = printer_config.get('target_hotend', 0.0)
-    bed_temp = printer_config.get('bed_temp', 30.0)
-    target_bed = printer_config.get('target_bed', 0.0)
-    chamber_temp = printer_config.get('chamber_temp', 25.0)
-
-    # Get print status
-    print_status = printer_config.get('print_status', 'ready')
-    progress = printer_config.get('print_progress', 0.0)
-    current_file = printer_config.get('current_file', '')
-    print_layer = printer_config.get('current_layer', 0)
-    total_layers = printer_config.get('total_layers', 0)
-    print_duration = printer_config.get('print_duration', 0)
-    remaining_time = printer_config.get('remaining_time', 0)
 
     # Base detail object
     detail = {
@@ -62,37 +92,37 @@ def generate_detail_response(printer_config: Dict[str, Any], mode: str, material
         "firmwareVersion": printer_config.get('firmware_version', '1.0.0'),
         "macAddr": printer_config.get('mac_address', 'AA:BB:CC:DD:EE:FF'),
         "ipAddr": printer_config.get('ip_address', '192.168.1.100'),
-        "status": print_status,
+        "status": None,
 
-        # Cumulative statistics (CRITICAL for FiveMClient initialization)
-        "cumulativePrintTime": printer_config.get('cumulative_print_time', 0),  # in minutes
-        "cumulativeFilament": printer_config.get('cumulative_filament', 0.0),   # in meters
+        # Cumulative statistics
+        "cumulativePrintTime": None,
+        "cumulativeFilament": None,
 
         # Temperatures
-        "rightTemp": hotend_temp,
-        "rightTargetTemp": target_hotend,
-        "platTemp": bed_temp,
-        "platTargetTemp": target_bed,
-        "chamberTemp": chamber_temp,
+        "rightTemp": None,
+        "rightTargetTemp": None,
+        "platTemp": None,
+        "platTargetTemp": None,
+        "chamberTemp": None,
         "chamberTargetTemp": 0.0,
 
         # Fan speeds
-        "coolingFanSpeed": printer_config.get('cooling_fan_speed', 0),
-        "chamberFanSpeed": printer_config.get('chamber_fan_speed', 0),
+        "coolingFanSpeed": None,
+        "chamberFanSpeed": None,
 
         # Control states
-        "lightStatus": "open" if printer_config.get('led_on', False) else "close",
+        "lightStatus": None,
         "doorStatus": "close",  # Always closed for emulation
         "autoShutdown": "close",
         "autoShutdownTime": 0,
 
         # Print job info
-        "printFileName": current_file,
-        "printProgress": progress,
-        "printLayer": print_layer,
-        "targetPrintLayer": total_layers,
-        "printDuration": print_duration,
-        "estimatedTime": remaining_time,
+        "printFileName": None,
+        "printProgress": None,
+        "printLayer": None,
+        "targetPrintLayer": None,
+        "printDuration": None,
+        "estimatedTime": None,
 
         # Filament info
         "rightFilamentType": "PLA",
@@ -113,13 +143,11 @@ def generate_detail_response(printer_config: Dict[str, Any], mode: str, material
         # Storage
         "remainingDiskSpace": 1024,  # MB
 
-        # File estimates (read from config, updated via UI)
-        # These represent TOTAL job filament, not consumed
-        # DO NOT multiply by progress - return the raw values
-        "estimatedRightLen": printer_config.get('estimated_right_len', 0.0),
-        "estimatedRightWeight": printer_config.get('estimated_right_weight', 0.0),
-        "estimatedLeftLen": printer_config.get('estimated_left_len', 0.0),
-        "estimatedLeftWeight": printer_config.get('estimated_left_weight', 0.0),
+        # File estimates
+        "estimatedRightLen": None,
+        "estimatedRightWeight": None,
+        "estimatedLeftLen": None,
+        "estimatedLeftWeight": None,
 
         # Cloud codes
         "flashRegisterCode": "",
@@ -127,7 +155,7 @@ def generate_detail_response(printer_config: Dict[str, Any], mode: str, material
     }
 
     # Add mode-specific fields
-    mode_features = ModeFeatures(mode)
+    mode_features = get_mode_features(mode)
 
     if mode_features.has_filtration:
         detail.update({
@@ -147,11 +175,7 @@ def generate_detail_response(printer_config: Dict[str, Any], mode: str, material
 
         # For single extruder with material station
         if material_station.current_slot > 0:
-            current_slot_info = None
-            for slot in material_station.slots:
-                if slot['slotId'] == material_station.current_slot:
-                    current_slot_info = slot
-                    break
+            current_slot_info = material_station.get_slot(material_station.current_slot)
 
             if current_slot_info and current_slot_info['hasFilament']:
                 detail.update({
@@ -173,8 +197,101 @@ def generate_detail_response(printer_config: Dict[str, Any], mode: str, material
             "coolingFanLeftSpeed": 0
         })
 
+    return detail
+
+def _encode_detail_template(template: Dict[str, Any], dynamic_keys) -> List:
+    """Pre-encode a /detail response around its dynamic fields.
+
+    Returns [text, key, text, key, ..., text]: the JSON text json.dumps
+    would produce, cut where the values of the dynamic keys go.
+    """
+    segments = []
+    text = '{"code": 0, "message": "Success", "detail": {'
+    for index, (key, value) in enumerate(template.items()):
+        text += (', ' if index else '') + encode_basestring_ascii(key) + ': '
+        if key in dynamic_keys:
+            segments.extend((text, key))
+            text = ''
+        else:
+            text += json.dumps(value)
+    segments.append(text + '}}')
+    return segments
+
+def _encode_json_value(value) -> str:
+    """JSON text for one value, as json.dumps renders it"""
+    kind = type(value)
+    if kind is str:
+        return encode_basestring_ascii(value)
+    if kind is int:
+        return int.__repr__(value)
+    if kind is float and math.isfinite(value):
+        return float.__repr__(value)
+    return json.dumps(value)
+
+def _get_detail_template(printer_config: Dict[str, Any], mode: str, material_station=None):
+    """Cached (template, encoded segments) of the static /detail fields.
+
+    Rebuilt when the printer's identity, mode or material station changes.
+    """
+    key = (
+        mode,
+        printer_config.get('printer_name'),
+        printer_config.get('firmware_version'),
+        printer_config.get('mac_address'),
+        printer_config.get('ip_address'),
+        material_station.version if material_station else None,
+    )
+    cache = getattr(printer_config, 'response_cache', None)
+    if cache is not None:
+        entry = cache.get('detail_template')
+        if entry is not None and entry[0] == key:
+            return entry[1], entry[2]
+
+    template = _build_detail_template(printer_config, mode, material_station)
+    segments = _encode_detail_template(template, _detail_dynamic_fields(printer_config).keys())
+    if cache is not None:
+        cache['detail_template'] = (key, template, segments)
+    return template, segments
+
+def generate_detail_response(printer_config: Dict[str, Any], mode: str, material_station=None) -> Dict[str, Any]:
+    """Generate /detail endpoint response with comprehensive printer status"""
+    template, _ = _get_detail_template(printer_config, mode, material_station)
+    detail = template.copy()
+    detail.update(_detail_dynamic_fields(printer_config))
     return create_success_response({"detail": detail})
 
+def generate_detail_payload(printer_config: Dict[str, Any], mode: str, material_station=None) -> bytes:
+    """JSON-encoded /detail response, encoded with the configured JSON backend.
+
+    With the stdlib backend only the dynamic fields are encoded per call,
+    into the pre-encoded template (same bytes as json.dumps). The result is
+    reused until the config version moves: clients poll /detail every
+    second, usually several times between two simulation ticks.
+    """
+    version = getattr(printer_config, 'version', None)
+    cache = getattr(printer_config, 'response_cache', None)
+    key = (mode, material_station.version if material_station else None, json_codec.backend_name)
+    if cache is not None and version is not None:
+        entry = cache.get('detail')
+        if entry is not None and entry[0] == version and entry[1] == key:
+            return entry[2]
+
+    if json_codec.backend_name == json_codec.STDLIB_BACKEND:
+        _, segments = _get_detail_template(printer_config, mode, material_station)
+        values = _detail_dynamic_fields(printer_config)
+        parts = [segments[0]]
+        for index in range(1, len(segments), 2):
+            parts.append(_encode_json_value(values[segments[index]]))
+            parts.append(segments[index + 1])
+        payload = ''.join(parts).encode('ascii')
+    else:
+        # The native encoders beat splicing in Python
+        payload = json_codec.dumps(generate_detail_response(printer_config, mode, material_station))
+
+    if cache is not None and version is not None:
+        cache['detail'] = (version, key, payload)
+    return payload
+
 def generate_gcode_list_response(file_manager, printer_mode: str = "5M") -> Dict[str, Any]:
     """Generate /gcodeList endpoint response"""
     file_list = file_manager.get_recent_file_list(printer_mode)
@@ -257,11 +374,13 @@ def handle_job_control(printer_config: Dict[str, Any], args: Dict[str, Any]) ->
             return True
     elif action == 'cancel':
         if printer_config.get('print_status') in ['printing', 'paused']:
-            printer_config['print_status'] = 'ready'
-            printer_config['print_progress'] = 0.0
-            printer_config['current_file'] = ''
-            printer_config['current_layer'] = 0
-            printer_config['print_duration'] = 0
+            printer_config.update({
+                'print_status': 'ready',
+                'print_progress': 0.0,
+                'current_file': '',
+                'current_layer': 0,
+                'print_duration': 0,
+            })
             return True
 
     return False
@@ -3,14 +3,14 @@ Async HTTP Server implementation using aiohttp for FlashForge API emulation.
 This replaces the slow http.server implementation with instant startup.
 """
 import asyncio
-import json
 import threading
+import weakref
 from typing import Optional, Callable
 from aiohttp import web
 import config
 from .http_responses import (
     generate_product_response,
-    generate_detail_response,
+    generate_detail_payload,
     generate_control_response,
     generate_gcode_list_response,
     generate_thumbnail_response,
@@ -19,13 +19,37 @@ from .http_responses import (
     create_error_response,
     process_control_command
 )
-from .printer_modes import ModeFeatures
+from .http_fast_path import DetailFastPathProtocol
+from .network_sim import ConnectionImpairment
+from .printer_modes import get_mode_features
+from . import json_codec
+from .blob_store import UploadQuotaError
+
+
+def json_response(data, status: int = 200) -> web.Response:
+    """JSON response encoded with the configured JSON backend"""
+    return web.Response(body=json_codec.dumps(data), status=status,
+                        content_type='application/json', charset='utf-8')
+
+
+async def read_json(request: web.Request):
+    """Decode a JSON request body with the configured JSON backend.
+
+    The payload is parsed once and kept on the request, so middleware and
+    handler share it.
+    """
+    try:
+        return request['json_payload']
+    except KeyError:
+        payload = request['json_payload'] = json_codec.loads(await request.read())
+        return payload
 
 
 class FlashForgeHTTPServerAsync:
     """Fast async HTTP server for FlashForge API emulation using aiohttp"""
 
-    def __init__(self, printer_emulator, file_manager, logger: Optional[Callable] = None, http_tab_logger = None):
+    def __init__(self, printer_emulator, file_manager, logger: Optional[Callable] = None, http_tab_logger = None,
+                 host: str = '0.0.0.0', loop: Optional[asyncio.AbstractEventLoop] = None):
         self.printer_emulator = printer_emulator
         self.file_manager = file_manager
         self.logger = logger
@@ -35,8 +59,12 @@ class FlashForgeHTTPServerAsync:
         self.app: Optional[web.Application] = None
         self.runner: Optional[web.AppRunner] = None
         self.site: Optional[web.TCPSite] = None
+        self.listener: Optional[asyncio.AbstractServer] = None  # Listening socket with the /detail fast path
+        self.fast_path_connections = set()  # DetailFastPathProtocol per connection not yet handed to aiohttp
 
-        # Event loop management
+        # Event loop management (a loop passed in is shared and owned by the caller)
+        self.host = host
+        self.shared_loop = loop
         self.loop: Optional[asyncio.AbstractEventLoop] = None
         self.loop_thread: Optional[threading.Thread] = None
 
@@ -45,6 +73,11 @@ class FlashForgeHTTPServerAsync:
         self._state_lock = threading.Lock()
         self._port = None
 
+        # Simulated network impairment state per keep-alive connection
+        self._impairments = weakref.WeakKeyDictionary()
+
+        json_codec.set_backend(config.HTTP_CONFIG.get('json_backend', 'auto'))
+
     def get_state(self) -> str:
         """Get current server state (thread-safe)"""
         with self._state_lock:
@@ -75,52 +108,134 @@ class FlashForgeHTTPServerAsync:
 
     @web.middleware
     async def logging_middleware(self, request: web.Request, handler):
-        """Middleware to log all HTTP requests"""
-        client_ip = request.remote
-        method = request.method
-        path = request.path
-
-        # Read request body for logging (if JSON)
+        """Middleware to log HTTP requests at the level set in HTTP_CONFIG['log_level']"""
+        log_level = config.HTTP_CONFIG.get('log_level', config.HttpLogLevel.REQUESTS)
+        if log_level == config.HttpLogLevel.OFF:
+            return await handler(request)
+        log_bodies = log_level == config.HttpLogLevel.BODIES
+
+        # Only parse the body when it will be logged; read_json keeps the
+        # payload on the request, so the handler does not parse it again
         request_body = None
-        try:
-            if request.content_type == 'application/json':
-                # Clone request body for logging without consuming it
-                body_bytes = await request.read()
-                if body_bytes:
-                    request_body = json.loads(body_bytes.decode('utf-8'))
-                # Re-create request with body for handler
-                request = request.clone(read=lambda: asyncio.coroutine(lambda: body_bytes)())
-        except:
-            pass
+        if log_bodies and request.content_type == 'application/json':
+            try:
+                request_body = await read_json(request)
+            except ValueError:
+                pass  # The handler reports the malformed body
 
         # Process request
         response = await handler(request)
 
+        response_body = None
+        if log_bodies and response.status != 200:
+            # Response body for error logging
+            response_body = getattr(response, 'body', None)
+        self.log_request(request.method, request.path, request.remote, response.status,
+                         request_body, response_body)
+
+        return response
+
+    def log_request(self, method, path, client_ip, status, request_body=None, response_body=None):
+        """Log a handled request to the main logger and the HTTP tab"""
         # Log to main logger (simple)
         if self.logger:
-            self.logger(f"HTTP {method} {path} from {client_ip} -> {response.status}")
+            self.logger(f"HTTP {method} {path} from {client_ip} -> {status}")
 
         # Log to HTTP tab (detailed) if available
         if self.http_tab_logger and hasattr(self.http_tab_logger, 'log_http_request'):
-            response_body = None
-            if response.status != 200:
-                try:
-                    # Try to get response body for error logging
-                    response_body = response.body
-                except:
-                    pass
-
             self.http_tab_logger.log_http_request(
                 method=method,
                 path=path,
                 client_ip=client_ip,
-                status_code=response.status,
+                status_code=status,
                 request_body=request_body,
                 response_body=response_body
             )
 
+    @web.middleware
+    async def state_middleware(self, request: web.Request, handler):
+        """Middleware publishing lazily simulated printer state before a handler reads it"""
+        self.printer_emulator.config.refresh()
+        return await handler(request)
+
+    def _get_impairment(self, request: web.Request) -> ConnectionImpairment:
+        """Get the impairment state for the connection a request arrived on"""
+        transport = request.transport
+        try:
+            impairment = self._impairments.get(transport)
+            if impairment is None:
+                impairment = ConnectionImpairment(
+                    lambda: self.printer_emulator.config.get('network_simulation', {}))
+                self._impairments[transport] = impairment
+            return impairment
+        except TypeError:
+            # Transport unavailable or not weak-referenceable, use fresh state
+            return ConnectionImpairment(lambda: self.printer_emulator.config.get('network_simulation', {}))
+
+    @web.middleware
+    async def impairment_middleware(self, request: web.Request, handler):
+        """Middleware applying simulated latency, failures and bandwidth caps"""
+        impairment = self._get_impairment(request)
+        if not impairment.active:
+            return await handler(request)
+
+        latency = impairment.sample_latency()
+        if latency:
+            await asyncio.sleep(latency)
+
+        failure_type = impairment.sample_failure()
+        if failure_type and self.logger:
+            self.logger(f"Simulating HTTP network failure: {failure_type}")
+
+        if failure_type == 'drop':
+            # Silently close the connection without a response
+            if request.transport:
+                request.transport.close()
+            return web.Response(status=204)  # Never reaches the client
+
+        if failure_type == 'error':
+            return json_response(create_error_response(500, "Simulated failure"), status=500)
+
+        response = await handler(request)
+        body = getattr(response, 'body', None)
+        if not isinstance(body, (bytes, bytearray)):
+            return response
+
+        if failure_type == 'timeout':
+            # Send part of the response, then hang before closing
+            stream = await self._write_paced(request, response, body[:len(body)//3], impairment, len(body))
+            await asyncio.sleep(impairment.hang_duration)
+            if request.transport:
+                request.transport.close()
+            return stream
+
+        if impairment.chunk_size:
+            return await self._write_paced(request, response, body, impairment, len(body))
+
         return response
 
+    async def _write_paced(self, request: web.Request, response: web.Response, body: bytes,
+                           impairment: ConnectionImpairment, content_length: int) -> web.StreamResponse:
+        """Stream a response body in bandwidth-paced chunks"""
+        stream = web.StreamResponse(status=response.status, reason=response.reason)
+        stream.content_type = response.content_type
+        if response.charset:
+            stream.charset = response.charset
+        stream.content_length = content_length
+        await stream.prepare(request)
+
+        chunk_size = impairment.chunk_size or len(body) or 1
+        for start in range(0, len(body), chunk_size):
+            chunk = body[start:start + chunk_size]
+            delay = impairment.write_delay(len(chunk))
+            if delay:
+                await asyncio.sleep(delay)
+            await stream.write(chunk)
+
+        if len(body) == content_length:
+            await stream.write_eof()
+        return stream
+
     # ============================================================================
     # Route Handlers
     # ============================================================================
@@ -128,49 +243,52 @@ class FlashForgeHTTPServerAsync:
     async def handle_product(self, request: web.Request) -> web.Response:
         """Handle /product endpoint"""
         try:
-            data = await request.json()
+            data = await read_json(request)
 
             if not self._validate_auth(data):
-                return web.json_response(create_error_response(1, "Authentication failed"))
+                return json_response(create_error_response(1, "Authentication failed"))
 
             current_mode = self.printer_emulator.config.get('printer_mode', config.PrinterMode.STANDARD_5M)
-            mode_features = ModeFeatures(current_mode)
+            mode_features = get_mode_features(current_mode)
             response = generate_product_response(self.printer_emulator.config, mode_features)
 
-            return web.json_response(response)
+            return json_response(response)
 
         except Exception as e:
             if self.logger:
                 self.logger(f"Error in /product: {e}")
-            return web.json_response(create_error_response(500, str(e)), status=500)
+            return json_response(create_error_response(500, str(e)), status=500)
 
     async def handle_detail(self, request: web.Request) -> web.Response:
         """Handle /detail endpoint"""
         try:
-            data = await request.json()
+            data = await read_json(request)
 
             if not self._validate_auth(data):
-                return web.json_response(create_error_response(1, "Authentication failed"))
-
-            current_mode = self.printer_emulator.config.get('printer_mode', config.PrinterMode.STANDARD_5M)
-            material_station = getattr(self.printer_emulator, 'material_station', None)
-
-            response = generate_detail_response(self.printer_emulator.config, current_mode, material_station)
+                return json_response(create_error_response(1, "Authentication failed"))
 
-            return web.json_response(response)
+            return web.Response(body=self.render_detail(), content_type='application/json', charset='utf-8')
 
         except Exception as e:
             if self.logger:
                 self.logger(f"Error in /detail: {e}")
-            return web.json_response(create_error_response(500, str(e)), status=500)
+            return json_response(create_error_response(500, str(e)), status=500)
+
+    def render_detail(self) -> bytes:
+        """Encoded /detail response body (shared with the fast path)"""
+        # Render from a snapshot so the fields agree with each other
+        snapshot = self.printer_emulator.config.snapshot()
+        current_mode = snapshot.get('printer_mode', config.PrinterMode.STANDARD_5M)
+        material_station = getattr(self.printer_emulator, 'material_station', None)
+        return generate_detail_payload(snapshot, current_mode, material_station)
 
     async def handle_control(self, request: web.Request) -> web.Response:
         """Handle /control endpoint"""
         try:
-            data = await request.json()
+            data = await read_json(request)
 
             if not self._validate_auth(data):
-                return web.json_response(create_error_response(1, "Authentication failed"))
+                return json_response(create_error_response(1, "Authentication failed"))
 
             payload = data.get('payload', {})
             command = payload.get('cmd', '')
@@ -179,54 +297,56 @@ class FlashForgeHTTPServerAsync:
             if self.logger:
                 self.logger(f"Control command: {command} with args: {args}")
 
-            success = process_control_command(self.printer_emulator.config, command, args)
+            # A command's writes land as one state change
+            with self.printer_emulator.config.batch():
+                success = process_control_command(self.printer_emulator.config, command, args)
             response = generate_control_response(success, "" if success else f"Unknown command: {command}")
 
-            return web.json_response(response)
+            return json_response(response)
 
         except Exception as e:
             if self.logger:
                 self.logger(f"Error in /control: {e}")
-            return web.json_response(create_error_response(500, str(e)), status=500)
+            return json_response(create_error_response(500, str(e)), status=500)
 
     async def handle_gcode_list(self, request: web.Request) -> web.Response:
         """Handle /gcodeList endpoint"""
         try:
-            data = await request.json()
+            data = await read_json(request)
 
             if not self._validate_auth(data):
-                return web.json_response(create_error_response(1, "Authentication failed"))
+                return json_response(create_error_response(1, "Authentication failed"))
 
             current_mode = self.printer_emulator.config.get('printer_mode', config.PrinterMode.STANDARD_5M)
             response = generate_gcode_list_response(self.file_manager, current_mode)
 
-            return web.json_response(response)
+            return json_response(response)
 
         except Exception as e:
             if self.logger:
                 self.logger(f"Error in /gcodeList: {e}")
-            return web.json_response(create_error_response(500, str(e)), status=500)
+            return json_response(create_error_response(500, str(e)), status=500)
 
     async def handle_gcode_thumb(self, request: web.Request) -> web.Response:
         """Handle /gcodeThumb endpoint"""
         try:
-            data = await request.json()
+            data = await read_json(request)
 
             if not self._validate_auth(data):
-                return web.json_response(create_error_response(1, "Authentication failed"))
+                return json_response(create_error_response(1, "Authentication failed"))
 
             filename = data.get('fileName', '')
             if not filename:
-                return web.json_response(create_error_response(1, "Filename required"))
+                return json_response(create_error_response(1, "Filename required"))
 
             response = generate_thumbnail_response(self.file_manager, filename)
 
-            return web.json_response(response)
+            return json_response(response)
 
         except Exception as e:
             if self.logger:
                 self.logger(f"Error in /gcodeThumb: {e}")
-            return web.json_response(create_error_response(500, str(e)), status=500)
+            return json_response(create_error_response(500, str(e)), status=500)
 
     async def handle_upload_gcode(self, request: web.Request) -> web.Response:
         """Handle /uploadGcode endpoint with multipart upload"""
@@ -239,60 +359,88 @@ class FlashForgeHTTPServerAsync:
             configured_check_code = self.printer_emulator.config.get('check_code', config.HTTP_CONFIG['check_code'])
 
             if serial_number != configured_serial or check_code != configured_check_code:
-                return web.json_response(create_error_response(1, "Authentication failed"))
+                return json_response(create_error_response(1, "Authentication failed"))
+
+            # Process upload metadata from headers
+            metadata = {
+                'printingTime': int(request.headers.get('printingTime', 0)),
+                'totalLayers': int(request.headers.get('totalLayers', 0)),
+                'gcodeToolCnt': int(request.headers.get('gcodeToolCnt', 1)),
+            }
 
-            # Read multipart data
+            # Stream the file part to disk chunk by chunk
             reader = await request.multipart()
-            file_data = None
-            filename = None
+            upload = None
 
             async for part in reader:
-                if part.name == 'gcodeFile':
-                    filename = part.filename
-                    file_data = await part.read()
+                if part.name == 'gcodeFile' and part.filename:
+                    upload = self.file_manager.begin_upload(part.filename)
+                    try:
+                        await self._spool_upload_part(part, upload)
+                    except UploadQuotaError as e:
+                        upload.abort()
+                        if self.logger:
+                            self.logger(f"Rejected upload {part.filename}: {e}")
+                        return json_response(create_error_response(1, str(e)))
+                    except BaseException:
+                        upload.abort()
+                        raise
                     break
 
-            if not file_data or not filename:
-                return web.json_response(create_error_response(1, "No file data received"))
+            if not upload or not upload.size:
+                if upload:
+                    upload.abort()
+                return json_response(create_error_response(1, "No file data received"))
 
+            filename = upload.filename
             if self.logger:
-                self.logger(f"Uploading file: {filename}, size: {len(file_data)} bytes")
-
-            # Process upload metadata from headers
-            metadata = {
-                'printingTime': int(request.headers.get('printingTime', 0)),
-                'totalLayers': int(request.headers.get('totalLayers', 0)),
-                'gcodeToolCnt': int(request.headers.get('gcodeToolCnt', 1)),
-            }
+                self.logger(f"Uploading file: {filename}, size: {upload.size} bytes")
 
-            # Add file to file manager
-            self.file_manager.add_uploaded_file(filename, file_data, metadata)
+            # Add file to file manager (with metadata read from the file itself)
+            upload.commit(metadata)
 
             # Start print if requested
             print_now = request.headers.get('printNow', 'false').lower() == 'true'
             if print_now:
                 leveling = request.headers.get('levelingBeforePrint', 'false').lower() == 'true'
-                self._start_print_job(filename, leveling, metadata)
+                self._start_print_job(filename, leveling, self.file_manager.get_file_metadata(filename))
 
             response = generate_upload_response(True)
-            return web.json_response(response)
+            return json_response(response)
 
         except Exception as e:
             if self.logger:
                 self.logger(f"Error in /uploadGcode: {e}")
-            return web.json_response(create_error_response(500, str(e)), status=500)
+            return json_response(create_error_response(500, str(e)), status=500)
+
+    async def _spool_upload_part(self, part, upload):
+        """Copy a multipart file part into an upload without buffering it"""
+        chunk_size = self.file_manager.upload_settings['chunk_size']
+        loop = asyncio.get_running_loop()
+        while True:
+            chunk = await part.read_chunk(chunk_size)
+            if not chunk:
+                break
+            # The disk write, hashing and metadata parsing run off the event loop
+            write = loop.run_in_executor(None, upload.write, chunk)
+            try:
+                await asyncio.shield(write)
+            except asyncio.CancelledError:
+                # Let the chunk finish before the caller aborts the upload
+                await asyncio.wait([write])
+                raise
 
     async def handle_print_gcode(self, request: web.Request) -> web.Response:
         """Handle /printGcode endpoint"""
         try:
-            data = await request.json()
+            data = await read_json(request)
 
             if not self._validate_auth(data):
-                return web.json_response(create_error_response(1, "Authentication failed"))
+                return json_response(create_error_response(1, "Authentication failed"))
 
             filename = data.get('fileName', '')
             if not filename or not self.file_manager.file_exists(filename):
-                return web.json_response(create_error_response(1, "File not found"))
+                return json_response(create_error_response(1, "File not found"))
 
             leveling = data.get('levelingBeforePrint', False)
             use_matl_station = data.get('useMatlStation', False)
@@ -308,28 +456,32 @@ class FlashForgeHTTPServerAsync:
             success = self._start_print_job(filename, leveling, metadata)
             response = generate_print_gcode_response(success)
 
-            return web.json_response(response)
+            return json_response(response)
 
         except Exception as e:
             if self.logger:
                 self.logger(f"Error in /printGcode: {e}")
-            return web.json_response(create_error_response(500, str(e)), status=500)
+            return json_response(create_error_response(500, str(e)), status=500)
 
     def _start_print_job(self, filename: str, leveling: bool, metadata: dict = None) -> bool:
         """Start a print job"""
         try:
-            self.printer_emulator.config['current_file'] = filename
-            self.printer_emulator.config['print_status'] = 'printing'
-            self.printer_emulator.config['print_progress'] = 0.0
-            self.printer_emulator.config['current_layer'] = 0
-            self.printer_emulator.config['print_duration'] = 0
-
-            if metadata:
-                self.printer_emulator.config['total_layers'] = metadata.get('totalLayers', 100)
-                self.printer_emulator.config['estimated_print_time'] = metadata.get('printingTime', 3600)
-
-            if hasattr(self.printer_emulator, 'start_print'):
-                self.printer_emulator.start_print(filename)
+            printer_config = self.printer_emulator.config
+            with printer_config.batch():
+                printer_config.update({
+                    'current_file': filename,
+                    'print_status': 'printing',
+                    'print_progress': 0.0,
+                    'current_layer': 0,
+                    'print_duration': 0,
+                })
+
+                if metadata:
+                    printer_config['total_layers'] = metadata.get('totalLayers', 100)
+                    printer_config['estimated_print_time'] = metadata.get('printingTime', 3600)
+
+                if hasattr(self.printer_emulator, 'start_print'):
+                    self.printer_emulator.start_print(filename)
 
             return True
         except Exception as e:
@@ -354,27 +506,37 @@ class FlashForgeHTTPServerAsync:
     async def _start_server_async(self, port: int):
         """Start the HTTP server (async, runs in event loop)"""
         try:
-            # Create application with logging middleware
-            self.app = web.Application(middlewares=[self.logging_middleware])
+            # Create application with logging, network simulation and state middleware
+            self.app = web.Application(middlewares=[self.logging_middleware, self.impairment_middleware,
+                                                    self.state_middleware])
             self._setup_routes()
 
             # Create runner and setup
             self.runner = web.AppRunner(self.app)
             await self.runner.setup()
 
-            # Create site and start (this is FAST with aiohttp)
-            self.site = web.TCPSite(
-                self.runner,
-                '0.0.0.0',
-                port,
-                reuse_address=True
-            )
-            await self.site.start()
+            if config.HTTP_CONFIG.get('detail_fast_path', True):
+                # Plain /detail polls skip aiohttp, everything else is handed to it
+                self.listener = await self.loop.create_server(
+                    lambda: DetailFastPathProtocol(self, self.runner.server),
+                    self.host,
+                    port,
+                    reuse_address=True
+                )
+            else:
+                # Create site and start (this is FAST with aiohttp)
+                self.site = web.TCPSite(
+                    self.runner,
+                    self.host,
+                    port,
+                    reuse_address=True
+                )
+                await self.site.start()
 
             self._set_state("running")
 
             if self.logger:
-                self.logger(f"HTTP API server started on port {port}")
+                self.logger(f"HTTP API server started on port {port} (JSON: {json_codec.backend_name})")
 
         except OSError as e:
             self._set_state("error")
@@ -406,6 +568,13 @@ class FlashForgeHTTPServerAsync:
             # Set state immediately
             self._set_state("starting")
 
+            if self.shared_loop:
+                # Bind on the shared loop and report the outcome directly
+                self.loop = self.shared_loop
+                future = asyncio.run_coroutine_threadsafe(self._start_server_async(port), self.loop)
+                future.result(timeout=5)
+                return self.is_running
+
             # Create new event loop for this thread
             self.loop = asyncio.new_event_loop()
 
@@ -435,7 +604,12 @@ class FlashForgeHTTPServerAsync:
             return True
 
         try:
-            if self.loop and self.loop.is_running():
+            if self.shared_loop:
+                # Only this server's site and runner live on the shared loop
+                if self.loop and self.loop.is_running():
+                    future = asyncio.run_coroutine_threadsafe(self._stop_server_async(), self.loop)
+                    future.result(timeout=5)
+            elif self.loop and self.loop.is_running():
                 # Schedule shutdown in the event loop
                 asyncio.run_coroutine_threadsafe(self._stop_server_async(), self.loop)
 
@@ -461,10 +635,18 @@ class FlashForgeHTTPServerAsync:
 
     async def _stop_server_async(self):
         """Stop the server (async)"""
+        if self.listener:
+            self.listener.close()
+        for connection in list(self.fast_path_connections):
+            connection.transport.close()
+        self.fast_path_connections.clear()
         if self.site:
             await self.site.stop()
         if self.runner:
             await self.runner.cleanup()
+        if self.listener:
+            await self.listener.wait_closed()
+            self.listener = None
 
     def restart(self, port: int = None) -> bool:
         """Restart the HTTP server"""
@@ -0,0 +1,65 @@
+"""
+JSON encoding for the HTTP API.
+Uses orjson or ujson when installed and falls back to the standard library.
+Every HTTP response body and JSON request body goes through dumps/loads
+here, so switching backends switches all of them.
+"""
+import json
+from typing import Any, Callable, Dict, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover - optional dependency
+    ujson = None
+
+# Tried in this order by set_backend('auto')
+BACKEND_PREFERENCE = ('orjson', 'ujson', 'json')
+STDLIB_BACKEND = 'json'
+
+
+def _stdlib_dumps(obj) -> bytes:
+    return json.dumps(obj).encode('utf-8')
+
+
+def _orjson_dumps(obj) -> bytes:
+    # Clients send and expect plain JSON; non-string keys only occur in debug data
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _ujson_dumps(obj) -> bytes:
+    return ujson.dumps(obj, escape_forward_slashes=False).encode('utf-8')
+
+
+# name -> (dumps returning UTF-8 bytes, loads accepting bytes or str)
+BACKENDS: Dict[str, Tuple[Callable[[Any], bytes], Callable[[Any], Any]]] = {
+    STDLIB_BACKEND: (_stdlib_dumps, json.loads),
+}
+if orjson is not None:
+    BACKENDS['orjson'] = (_orjson_dumps, orjson.loads)
+if ujson is not None:
+    BACKENDS['ujson'] = (_ujson_dumps, ujson.loads)
+
+backend_name = STDLIB_BACKEND
+dumps, loads = BACKENDS[STDLIB_BACKEND]
+
+
+def available_backends():
+    """Names of the installed backends, fastest first"""
+    return [name for name in BACKEND_PREFERENCE if name in BACKENDS]
+
+
+def set_backend(name: str = 'auto') -> str:
+    """Select the JSON backend ('auto' picks the fastest installed); returns its name"""
+    global backend_name, dumps, loads
+    if name == 'auto':
+        name = available_backends()[0]
+    elif name not in BACKENDS:
+        raise ValueError(f"JSON backend '{name}' is not installed (available: {', '.join(available_backends())})")
+    backend_name = name
+    dumps, loads = BACKENDS[name]
+    return name
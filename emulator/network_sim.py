@@ -0,0 +1,324 @@
+"""
+Network condition simulation for FlashForge Emulator.
+Impairments (latency distributions, uniform and burst loss, bandwidth caps
+with paced writes) are evaluated per connection from the network_simulation
+settings and shared by the TCP and HTTP servers. Delayed responses,
+partial-response hangs and dropped connections are scheduled as timer
+events on the server event loop, so a delayed connection costs a queue
+entry and a timer handle instead of a thread.
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional
+import config
+
+
+# ============================================================================
+# Latency Distributions
+# ============================================================================
+
+def _fixed_latency(base: float, jitter: float, settings: Dict) -> float:
+    """Constant latency"""
+    return base
+
+def _uniform_latency(base: float, jitter: float, settings: Dict) -> float:
+    """Latency spread evenly over base +/- jitter"""
+    return base + random.uniform(-jitter, jitter)
+
+def _normal_latency(base: float, jitter: float, settings: Dict) -> float:
+    """Latency normally distributed around base with jitter as standard deviation"""
+    return random.gauss(base, jitter)
+
+def _pareto_latency(base: float, jitter: float, settings: Dict) -> float:
+    """Heavy-tailed latency: never below base, occasional long stalls scaled by jitter"""
+    shape = settings.get('pareto_shape', config.NETWORK_SIMULATION['pareto_shape'])
+    return base + jitter * (random.paretovariate(shape) - 1.0)
+
+# Latency samplers by name, called as sampler(base_seconds, jitter_seconds, settings)
+LATENCY_DISTRIBUTIONS = {
+    "fixed": _fixed_latency,
+    "uniform": _uniform_latency,
+    "normal": _normal_latency,
+    "pareto": _pareto_latency
+}
+
+def register_latency_distribution(name: str, sampler: Callable[[float, float, Dict], float]):
+    """Register (or replace) a latency distribution selectable as latency_distribution"""
+    LATENCY_DISTRIBUTIONS[name] = sampler
+
+
+# ============================================================================
+# Per-connection Impairment State
+# ============================================================================
+
+class TokenBucket:
+    """Token bucket bandwidth limiter (bytes per second with a burst allowance)"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = time.monotonic()
+
+    def configure(self, rate: float, capacity: float):
+        """Apply new limits without resetting the current token level"""
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = min(self.tokens, capacity)
+
+    def consume(self, nbytes: int) -> float:
+        """Take nbytes from the bucket and return how long to wait before sending them"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        self.tokens -= nbytes
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+
+class ConnectionImpairment:
+    """Impairment state for one client connection.
+
+    Settings are read on every call, so changes from the Network tab apply to
+    open connections immediately. Burst loss follows a two-state
+    (Gilbert-Elliott) model: each request may enter or leave a loss burst.
+    """
+
+    def __init__(self, get_settings: Callable[[], Dict]):
+        self._get_settings = get_settings
+        self._in_burst = False
+        self._bucket: Optional[TokenBucket] = None
+
+    def _setting(self, settings: Dict, key: str):
+        return settings.get(key, config.NETWORK_SIMULATION[key])
+
+    @property
+    def active(self) -> bool:
+        """True if any impairment is enabled"""
+        settings = self._get_settings()
+        return bool(settings.get('latency_enabled') or settings.get('failures_enabled')
+                    or settings.get('burst_loss_enabled') or settings.get('bandwidth_enabled'))
+
+    def sample_latency(self) -> float:
+        """Draw the delay for the next response in seconds (0 when disabled)"""
+        settings = self._get_settings()
+        if not settings.get('latency_enabled', False):
+            return 0.0
+
+        base = self._setting(settings, 'latency') / 1000.0
+        jitter = self._setting(settings, 'jitter') / 1000.0
+        sampler = LATENCY_DISTRIBUTIONS.get(self._setting(settings, 'latency_distribution'), _fixed_latency)
+        return max(0.0, sampler(base, jitter, settings))
+
+    def sample_failure(self) -> Optional[str]:
+        """Decide whether the next response fails; returns the failure type or None"""
+        settings = self._get_settings()
+        failed = False
+
+        if settings.get('failures_enabled', False):
+            failed = random.randint(1, 100) <= self._setting(settings, 'failure_rate')
+
+        if settings.get('burst_loss_enabled', False):
+            if self._in_burst:
+                if random.uniform(0, 100) < self._setting(settings, 'burst_end_rate'):
+                    self._in_burst = False
+            elif random.uniform(0, 100) < self._setting(settings, 'burst_start_rate'):
+                self._in_burst = True
+            if self._in_burst and random.uniform(0, 100) < self._setting(settings, 'burst_failure_rate'):
+                failed = True
+        else:
+            self._in_burst = False
+
+        return self._setting(settings, 'failure_type') if failed else None
+
+    @property
+    def hang_duration(self) -> float:
+        """Seconds a 'timeout' failure hangs before the connection is closed"""
+        return self._setting(self._get_settings(), 'hang_duration')
+
+    @property
+    def chunk_size(self) -> Optional[int]:
+        """Paced write size in bytes, or None when bandwidth is not limited"""
+        settings = self._get_settings()
+        if not settings.get('bandwidth_enabled', False):
+            return None
+        return max(1, int(self._setting(settings, 'write_chunk_size')))
+
+    def write_delay(self, nbytes: int) -> float:
+        """Consume bandwidth for nbytes and return the wait before writing them"""
+        settings = self._get_settings()
+        rate = max(1.0, self._setting(settings, 'bandwidth_kbps') * 1024.0)
+        capacity = max(1.0, float(self._setting(settings, 'bandwidth_burst')))
+        if self._bucket is None:
+            self._bucket = TokenBucket(rate, capacity)
+        else:
+            self._bucket.configure(rate, capacity)
+        return self._bucket.consume(nbytes)
+
+
+def iter_response_chunks(response, chunk_size: int):
+    """Split an encoded response (bytes or FileResponse) into chunk_size pieces"""
+    if hasattr(response, 'iter_chunks'):
+        yield from response.iter_chunks(chunk_size)
+        return
+    view = memoryview(response)
+    for start in range(0, len(view), chunk_size):
+        yield view[start:start + chunk_size]
+
+
+async def paced_write(writer: asyncio.StreamWriter, response, impairment: ConnectionImpairment):
+    """Write a response in small chunks at the connection's bandwidth cap"""
+    chunk_size = impairment.chunk_size or len(response) or 1
+    for chunk in iter_response_chunks(response, chunk_size):
+        delay = impairment.write_delay(len(chunk))
+        if delay:
+            await asyncio.sleep(delay)
+        writer.write(chunk)
+        await writer.drain()
+
+
+def paced_sendall(sock, response, impairment: ConnectionImpairment):
+    """Blocking variant of paced_write for the threaded server"""
+    chunk_size = impairment.chunk_size or len(response) or 1
+    for chunk in iter_response_chunks(response, chunk_size):
+        delay = impairment.write_delay(len(chunk))
+        if delay:
+            time.sleep(delay)
+        sock.sendall(chunk)
+
+
+class ResponseScheduler:
+    """Delivers one connection's responses on event loop timers, in order.
+
+    Each scheduled entry is released no earlier than its delay and never
+    before the entries scheduled ahead of it. The connection keeps reading
+    and processing commands while responses are in flight.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, writer: asyncio.StreamWriter,
+                 send_chunks: Callable[[asyncio.StreamWriter, List], Awaitable],
+                 on_close: Optional[Callable[[], None]] = None):
+        self.loop = loop
+        self.writer = writer
+        self._send_chunks = send_chunks
+        self._on_close = on_close
+
+        self._queue = deque()  # (when, chunks, close_after)
+        self._ready_at = 0.0
+        self._timer = None         # call_at handle for the head of the queue
+        self._task = None          # Delivery task (asyncio keeps only weak references)
+        self._close_handle = None  # call_later handle for a delayed close
+        self._delivering = False
+        self._closed = False
+        self._drained = asyncio.Event()
+
+    @property
+    def idle(self) -> bool:
+        """True if no responses are waiting to be delivered"""
+        return not self._queue and not self._delivering
+
+    @property
+    def backlog(self) -> int:
+        """Number of scheduled entries not yet delivered"""
+        return len(self._queue)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def schedule(self, delay: float, chunks: List, close_after: Optional[float] = None):
+        """Deliver chunks after delay seconds.
+
+        If close_after is set, the connection is closed that many seconds
+        after the chunks are sent and nothing scheduled later is delivered.
+        """
+        if self._closed:
+            return
+        when = max(self.loop.time() + delay, self._ready_at)
+        self._ready_at = when
+        self._queue.append((when, chunks, close_after))
+        if self._timer is None and not self._delivering:
+            self._arm()
+
+    def close(self, delay: float = 0):
+        """Close the connection once everything scheduled so far is delivered"""
+        self.schedule(delay, [], close_after=0)
+
+    async def wait_for_capacity(self, limit: int):
+        """Wait until fewer than limit entries are queued (backpressure for fast clients)"""
+        while len(self._queue) >= limit and not self._closed:
+            self._drained.clear()
+            await self._drained.wait()
+
+    def _arm(self):
+        """Start a timer for the head of the queue"""
+        self._timer = self.loop.call_at(self._queue[0][0], self._run)
+
+    def cancel(self) -> Optional[asyncio.Task]:
+        """Drop everything still scheduled and close the connection now.
+
+        Returns the delivery task if one was in flight, so the caller can
+        wait for it to finish cancelling.
+        """
+        task = self._task
+        if self._close_handle is not None:
+            self._close_handle.cancel()
+            self._close_handle = None
+        if task is not None and not task.done():
+            task.cancel()
+        else:
+            task = None
+        self._close()
+        return task
+
+    def _run(self):
+        self._timer = None
+        self._delivering = True
+        self._task = self.loop.create_task(self._deliver())
+
+    async def _deliver(self):
+        """Send every entry that is due, in scheduling order"""
+        try:
+            while self._queue and self._queue[0][0] <= self.loop.time():
+                _, chunks, close_after = self._queue.popleft()
+                try:
+                    if chunks and not self.writer.is_closing():
+                        await self._send_chunks(self.writer, chunks)
+                except Exception:
+                    close_after = 0
+
+                if close_after is not None:
+                    self._queue.clear()
+                    if close_after > 0:
+                        # Leave the connection hanging for a while before closing it
+                        self._closed = True
+                        self._close_handle = self.loop.call_later(close_after, self._close)
+                    else:
+                        self._close()
+                    return
+        finally:
+            self._delivering = False
+            self._task = None
+            if self._queue and not self._closed:
+                self._arm()
+            self._drained.set()
+
+    def _close(self):
+        """Close the connection and notify the owner"""
+        self._closed = True
+        self._close_handle = None
+        self._queue.clear()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+        self._drained.set()
+        if self._on_close:
+            callback, self._on_close = self._on_close, None
+            callback()
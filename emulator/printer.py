@@ -1,19 +1,55 @@
+import math
 import random
 import time
 import os
 import json
 from .server import EmulatorServer
-from .file_manager import EnhancedFileManager
+from .server_async import AsyncEmulatorServer
+from .file_manager import EnhancedFileManager, VirtualFileList
 from .printer_modes import MaterialStationEmulator
+from .simulation import SimulationClock
+from .state import PrinterConfig
 import config
 from utils.network import get_network_interfaces, get_primary_ip
 
+# Progress this close to 100% counts as complete
+PROGRESS_EPSILON = 1e-6
+# Heaters this close to their target (or idle) temperature are settled
+SETTLED_TOLERANCE = 1.0
+
+
+def completed_print_statistics(printer_config, print_duration):
+    """Cumulative statistics after a print of print_duration seconds completes"""
+    # The left estimate mirrors the right one on single-extruder printers
+    filament = printer_config.get('estimated_right_len', 0.0)
+    return {
+        'cumulative_print_time': printer_config.get('cumulative_print_time', 0) + int(round(print_duration / 60)),
+        'cumulative_filament': round(printer_config.get('cumulative_filament', 0.0) + filament, 2),
+    }
+
+
+def _approach(value, goal, up_step, down_step):
+    """Move value toward goal by at most up_step / down_step (stops within 0.5)"""
+    if abs(value - goal) <= 0.5:
+        return value
+    if value < goal:
+        return value + min(up_step, goal - value)
+    return value - min(down_step, value - goal)
+
+
 class PrinterEmulator:
     """Core printer emulator class"""
     
-    def __init__(self, logger=None):
+    def __init__(self, logger=None, bind_host='0.0.0.0', tcp_port=None, http_port=None, loop=None):
         self._logger = logger if logger else print
         
+        # Where the servers listen (ports default to config.py); a shared event
+        # loop lets many emulators run in one process (see emulator/fleet.py)
+        self.bind_host = bind_host
+        self.tcp_port = tcp_port
+        self.http_port = http_port
+        self.loop = loop
+        
         # Track idle temperature settings
         self.idle_hotend_temp = config.DEFAULT_IDLE_HOTEND_TEMP
         self.idle_bed_temp = config.DEFAULT_IDLE_BED_TEMP
@@ -23,12 +59,12 @@ class PrinterEmulator:
         primary_ip = get_primary_ip(self.network_interfaces)
         
         # Initialize virtual files and enhanced file manager
-        self.virtual_files = config.DEFAULT_VIRTUAL_FILES.copy()
+        self.virtual_files = VirtualFileList(config.DEFAULT_VIRTUAL_FILES)
         self.thumbnail_path = None
         self.file_manager = EnhancedFileManager(self.virtual_files, self.thumbnail_path)
         
-        # Printer configuration
-        self.config = {
+        # Printer configuration (versioned so derived responses can be cached)
+        self.config = PrinterConfig({
             "printer_name": config.DEFAULT_PRINTER_NAME,
             "serial_number": config.DEFAULT_SERIAL_NUMBER,
             "machine_type": config.DEFAULT_MACHINE_TYPE,
@@ -76,7 +112,7 @@ class PrinterEmulator:
             "estimated_right_weight": 0.0,  # Grams of filament for this print (right extruder)
             "estimated_left_len": 0.0,  # Meters of filament for this print (left extruder)
             "estimated_left_weight": 0.0   # Grams of filament for this print (left extruder)
-        }
+        })
 
         # Initialize Material Station for AD5X mode
         self.material_station = None
@@ -84,9 +120,19 @@ class PrinterEmulator:
             self.material_station = MaterialStationEmulator(config.HTTP_CONFIG['material_station']['default_slots'])
 
         # Initialize servers
-        self.server = EmulatorServer(self.config, self.virtual_files, self.thumbnail_path, self.log)
+        self.server = self._create_tcp_server()
         self.http_server = None  # Will be created when start_http_server() is called
+        self.simulation_clock = None  # Created by start_simulation()
     
+    def _create_tcp_server(self):
+        """Create the TCP command server for the configured backend"""
+        backend = config.TCP_CONFIG.get('backend', config.TcpServerBackend.ASYNC)
+        if backend == config.TcpServerBackend.THREADED and self.loop is None:
+            return EmulatorServer(self.config, self.virtual_files, self.thumbnail_path, self.log,
+                                  self.bind_host, self.tcp_port)
+        return AsyncEmulatorServer(self.config, self.virtual_files, self.thumbnail_path, self.log,
+                                   self.bind_host, self.tcp_port, self.loop)
+
     @property
     def log(self):
         return self._logger
@@ -169,10 +215,9 @@ class PrinterEmulator:
                 self.idle_bed_temp = config_data["idle_bed_temp"]
                 self.config["bed_temp"] = self.idle_bed_temp
 
-            # Update virtual files
+            # Update virtual files (in place, the list is shared with the servers)
             if "virtual_files" in config_data:
-                self.virtual_files = config_data["virtual_files"]
-                self.file_manager.virtual_files = self.virtual_files
+                self.virtual_files[:] = config_data["virtual_files"]
 
             # Update thumbnail path
             if "thumbnail_path" in config_data and config_data["thumbnail_path"]:
@@ -296,64 +341,90 @@ class PrinterEmulator:
     
     def restore_default_files(self):
         """Restore the default list of virtual files"""
-        self.virtual_files = config.DEFAULT_VIRTUAL_FILES.copy()
+        self.virtual_files[:] = config.DEFAULT_VIRTUAL_FILES
         self.log(f"Restored {len(self.virtual_files)} default virtual files")
         return True
     
-    def simulate_temperatures(self):
-        """Simulate temperature changes based on targets"""
+    def simulate_temperatures(self, dt=1.0):
+        """Simulate temperature changes based on targets.
+
+        Rates are per second of simulated time; dt is the timestep in seconds.
+        Jitter scales with sqrt(dt) so the random drift per second does not
+        depend on the tick rate.
+        """
+        jitter_scale = math.sqrt(dt)
+
         # Hotend temperature simulation
+        hotend = self.config['hotend_temp']
         if self.config['target_hotend'] > 0:
-            # Active heating/cooling toward target
-            if abs(self.config['hotend_temp'] - self.config['target_hotend']) > 0.5:
-                if self.config['hotend_temp'] < self.config['target_hotend']:
-                    # Heating up (faster)
-                    self.config['hotend_temp'] += min(5.0, self.config['target_hotend'] - self.config['hotend_temp'])
-                else:
-                    # Cooling down (slower)
-                    self.config['hotend_temp'] -= min(2.0, self.config['hotend_temp'] - self.config['target_hotend'])
-            
+            # Active heating (faster) / cooling (slower) toward target
+            hotend = _approach(hotend, self.config['target_hotend'], 5.0 * dt, 2.0 * dt)
             # Add some temperature jitter for realism
-            self.config['hotend_temp'] += random.uniform(-0.3, 0.3)
+            hotend += random.uniform(-0.3, 0.3) * jitter_scale
         else:
             # No target set, move gradually toward idle temperature
-            if abs(self.config['hotend_temp'] - self.idle_hotend_temp) > 0.5:
-                if self.config['hotend_temp'] > self.idle_hotend_temp:
-                    # Cooling down to idle
-                    self.config['hotend_temp'] -= min(1.0, self.config['hotend_temp'] - self.idle_hotend_temp)
-                else:
-                    # Warming to idle
-                    self.config['hotend_temp'] += min(0.5, self.idle_hotend_temp - self.config['hotend_temp'])
-            
+            hotend = _approach(hotend, self.idle_hotend_temp, 0.5 * dt, 1.0 * dt)
             # Smaller jitter when idling
-            self.config['hotend_temp'] += random.uniform(-0.1, 0.1)
-        
+            hotend += random.uniform(-0.1, 0.1) * jitter_scale
+
         # Bed temperature simulation (slower changes)
+        bed = self.config['bed_temp']
         if self.config['target_bed'] > 0:
-            # Active heating/cooling toward target
-            if abs(self.config['bed_temp'] - self.config['target_bed']) > 0.5:
-                if self.config['bed_temp'] < self.config['target_bed']:
-                    # Heating up (slower)
-                    self.config['bed_temp'] += min(2.0, self.config['target_bed'] - self.config['bed_temp'])
-                else:
-                    # Cooling down (much slower)
-                    self.config['bed_temp'] -= min(1.0, self.config['bed_temp'] - self.config['target_bed'])
-            
+            # Active heating (slower) / cooling (much slower) toward target
+            bed = _approach(bed, self.config['target_bed'], 2.0 * dt, 1.0 * dt)
             # Add some temperature jitter for realism
-            self.config['bed_temp'] += random.uniform(-0.1, 0.1)
+            bed += random.uniform(-0.1, 0.1) * jitter_scale
         else:
             # No target set, move gradually toward idle temperature
-            if abs(self.config['bed_temp'] - self.idle_bed_temp) > 0.5:
-                if self.config['bed_temp'] > self.idle_bed_temp:
-                    # Cooling down to idle
-                    self.config['bed_temp'] -= min(0.8, self.config['bed_temp'] - self.idle_bed_temp)
-                else:
-                    # Warming to idle
-                    self.config['bed_temp'] += min(0.3, self.idle_bed_temp - self.config['bed_temp'])
-            
+            bed = _approach(bed, self.idle_bed_temp, 0.3 * dt, 0.8 * dt)
             # Smaller jitter when idling
-            self.config['bed_temp'] += random.uniform(-0.05, 0.05)
-    
+            bed += random.uniform(-0.05, 0.05) * jitter_scale
+
+        # Publish both readings in one write
+        self.config.update(hotend_temp=hotend, bed_temp=bed)
+
+    def simulation_tick(self, dt=1.0):
+        """Advance the simulation by dt seconds (temperatures and print progress)"""
+        # Read-modify-write as one state change, so a command landing mid-tick
+        # (M26 resetting progress, say) is never overwritten by stale values
+        with self.config.batch():
+            self.simulate_temperatures(dt)
+            self.simulate_print_progress(dt)
+
+    def simulation_configs(self):
+        """Configs the simulation clock watches for changes"""
+        return [self.config]
+
+    def is_simulation_settled(self):
+        """True when nothing is printing and both heaters sit at their goal temperature"""
+        if self.config.get('print_status') == 'printing':
+            return False
+        for temp, target, idle in ((self.config['hotend_temp'], self.config['target_hotend'], self.idle_hotend_temp),
+                                   (self.config['bed_temp'], self.config['target_bed'], self.idle_bed_temp)):
+            goal = target if target > 0 else idle
+            if abs(temp - goal) > SETTLED_TOLERANCE:
+                return False
+        return True
+
+    def start_simulation(self, tick_rate=None, time_scale=None):
+        """Start advancing the simulation on its own clock thread"""
+        if self.simulation_clock is None:
+            self.simulation_clock = SimulationClock(self, tick_rate, time_scale=time_scale)
+        self.simulation_clock.start()
+
+    def set_time_scale(self, time_scale):
+        """Run the simulation time_scale times faster than real time (0 = as fast as possible)"""
+        if self.simulation_clock is None:
+            self.simulation_clock = SimulationClock(self, time_scale=time_scale)
+        else:
+            self.simulation_clock.set_time_scale(time_scale)
+        self.log(f"Simulation speed: {'max' if not time_scale else f'{time_scale:g}x'}")
+
+    def stop_simulation(self):
+        """Stop the simulation clock"""
+        if self.simulation_clock:
+            self.simulation_clock.stop()
+
     def update_progress(self):
         """Update print progress if in printing state"""
         if self.config['print_status'].lower() == 'printing':
@@ -427,9 +498,10 @@ class PrinterEmulator:
             from .http_server_async import FlashForgeHTTPServerAsync
             # Pass http_logger if provided, otherwise use main logger
             logger = http_logger if http_logger else self.log
-            self.http_server = FlashForgeHTTPServerAsync(self, self.file_manager, logger, http_logger)
+            self.http_server = FlashForgeHTTPServerAsync(self, self.file_manager, logger, http_logger,
+                                                         self.bind_host, self.loop)
 
-            success = self.http_server.start(port)
+            success = self.http_server.start(port or self.http_port)
             if not success:
                 self.log("Failed to start HTTP API server")
             return success
@@ -461,18 +533,28 @@ class PrinterEmulator:
             self.log(f"Cannot start print: file '{filename}' not found")
             return False
 
-        # Update print status
-        self.config['current_file'] = filename
-        self.config['print_status'] = 'printing'
-        self.config['print_progress'] = 0.0
-        self.config['current_layer'] = 0
-        self.config['print_duration'] = 0
-
         # Get file metadata for print simulation
         metadata = self.file_manager.get_file_metadata(filename)
+
+        # Update print status in one state change
+        values = {
+            'current_file': filename,
+            'print_status': 'printing',
+            'print_progress': 0.0,
+            'current_layer': 0,
+            'print_duration': 0,
+        }
         if metadata:
-            self.config['total_layers'] = metadata.get('totalLayers', 100)
-            self.config['remaining_time'] = metadata.get('printingTime', 3600)
+            values['total_layers'] = metadata.get('totalLayers', 100)
+            values['estimated_print_time'] = metadata.get('printingTime', 3600)
+            values['remaining_time'] = metadata.get('printingTime', 3600)
+            if 'totalFilamentLength' in metadata:
+                # Read from the uploaded file; both extruders mirror it as in the UI
+                length = metadata['totalFilamentLength'] / 1000.0
+                weight = metadata.get('totalFilamentWeight', 0.0)
+                values.update(estimated_right_len=length, estimated_left_len=length,
+                              estimated_right_weight=weight, estimated_left_weight=weight)
+        self.config.update(values)
 
         self.log(f"Started printing: {filename}")
         return True
@@ -496,43 +578,52 @@ class PrinterEmulator:
     def cancel_print(self):
         """Cancel current print"""
         if self.config.get('print_status') in ['printing', 'paused']:
-            self.config['print_status'] = 'ready'
-            self.config['print_progress'] = 0.0
-            self.config['current_file'] = ''
-            self.config['current_layer'] = 0
-            self.config['print_duration'] = 0
-            self.config['remaining_time'] = 0
+            self.config.update({
+                'print_status': 'ready',
+                'print_progress': 0.0,
+                'current_file': '',
+                'current_layer': 0,
+                'print_duration': 0,
+                'remaining_time': 0,
+            })
             self.log("Print cancelled")
             return True
         return False
 
-    def simulate_print_progress(self):
-        """Simulate print progress during active printing"""
+    def simulate_print_progress(self, dt=1.0):
+        """Simulate print progress during active printing (dt seconds of print time)"""
         if self.config.get('print_status') != 'printing':
             return
 
-        # Simulate progress increment (very slow for realism)
-        progress_increment = random.uniform(0.01, 0.05)  # 0.01% to 0.05% per call
-        new_progress = min(100.0, self.config['print_progress'] + progress_increment)
-        self.config['print_progress'] = new_progress
-
-        # Update layer count proportionally
-        total_layers = self.config.get('total_layers', 100)
-        new_layer = int((new_progress / 100.0) * total_layers)
-        self.config['current_layer'] = new_layer
-
-        # Update print duration
-        self.config['print_duration'] += 1  # 1 second per simulation tick
+        # Progress at the rate implied by the job's estimated print time
+        estimated_time = self.config.get('estimated_print_time') or 3600
+        new_progress = self.config['print_progress'] + dt * 100.0 / estimated_time
+        if new_progress > 100.0 - PROGRESS_EPSILON:
+            # Accumulated float error must not add an extra tick at the end
+            new_progress = 100.0
+        print_duration = self.config['print_duration'] + dt
+
+        values = {
+            'print_progress': new_progress,
+            # Update layer count proportionally
+            'current_layer': int((new_progress / 100.0) * self.config.get('total_layers', 100)),
+            'print_duration': print_duration,
+        }
 
         # Update remaining time (simple linear estimation)
         if new_progress > 0:
-            estimated_total_time = (self.config['print_duration'] * 100) / new_progress
-            self.config['remaining_time'] = max(0, estimated_total_time - self.config['print_duration'])
+            estimated_total_time = (print_duration * 100) / new_progress
+            values['remaining_time'] = max(0, estimated_total_time - print_duration)
 
         # Complete print when reaching 100%
         if new_progress >= 100.0:
-            self.config['print_status'] = 'completed'
-            self.config['remaining_time'] = 0
+            values['print_status'] = 'completed'
+            values['remaining_time'] = 0
+            values.update(completed_print_statistics(self.config, print_duration))
+
+        # Publish the whole step in one write so readers never see half of it
+        self.config.update(values)
+        if new_progress >= 100.0:
             self.log(f"Print completed: {self.config.get('current_file', 'unknown')}")
 
     def update_printer_mode(self, mode):
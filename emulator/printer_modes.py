@@ -1,8 +1,12 @@
 """
 Printer mode definitions and feature management
 """
+import itertools
 import config
 
+# Shared across all material stations so a version number is never reused
+_station_versions = itertools.count(1)
+
 class ModeFeatures:
     """Feature flags for different printer modes"""
 
@@ -24,19 +28,32 @@ class ModeFeatures:
             "platformTempCtrlState": 1  # All modes have bed temp control
         }
 
+_MODE_FEATURES = {}
+
+def get_mode_features(mode):
+    """Shared (read-only) ModeFeatures for a mode"""
+    features = _MODE_FEATURES.get(mode)
+    if features is None:
+        features = _MODE_FEATURES[mode] = ModeFeatures(mode)
+    return features
+
 class MaterialStationEmulator:
     """Emulate AD5X Material Station (IFS) functionality"""
 
     def __init__(self, config_slots=None):
+        # Copy the slot dicts too: update_slot edits them in place
         if config_slots:
-            self.slots = config_slots.copy()
+            self.slots = [dict(slot) for slot in config_slots]
         else:
-            self.slots = config.HTTP_CONFIG['material_station']['default_slots'].copy()
+            self.slots = [dict(slot) for slot in config.HTTP_CONFIG['material_station']['default_slots']]
 
         self.current_slot = 1
         self.current_load_slot = 0
         self.state_action = 0
         self.state_step = 0
+        self.version = next(_station_versions)  # Bumped on every change, for response caching
+        self._slot_index = {}  # slotId -> slot, rebuilt when the version moves
+        self._slot_index_version = None
 
     def get_status(self):
         """Get current material station status for HTTP API"""
@@ -51,25 +68,34 @@ class MaterialStationEmulator:
 
     def update_slot(self, slot_id, has_filament=None, material_name=None, material_color=None):
         """Update material station slot"""
-        for slot in self.slots:
-            if slot['slotId'] == slot_id:
-                if has_filament is not None:
-                    slot['hasFilament'] = has_filament
-                if material_name is not None:
-                    slot['materialName'] = material_name
-                if material_color is not None:
-                    slot['materialColor'] = material_color
-                break
+        slot = self.get_slot(slot_id)
+        if slot is not None:
+            if has_filament is not None:
+                slot['hasFilament'] = has_filament
+            if material_name is not None:
+                slot['materialName'] = material_name
+            if material_color is not None:
+                slot['materialColor'] = material_color
+            self.version = next(_station_versions)
 
     def set_current_slot(self, slot_id):
         """Set the currently active slot"""
         if 1 <= slot_id <= len(self.slots):
             self.current_slot = slot_id
+            self.version = next(_station_versions)
 
     def set_loading_slot(self, slot_id):
         """Set the slot currently being loaded"""
         if 0 <= slot_id <= len(self.slots):
             self.current_load_slot = slot_id
+            self.version = next(_station_versions)
+
+    def get_slot(self, slot_id):
+        """Slot info for slot_id, or None"""
+        if self._slot_index_version != self.version:
+            self._slot_index = {slot['slotId']: slot for slot in self.slots}
+            self._slot_index_version = self.version
+        return self._slot_index.get(slot_id)
 
 def get_printer_name_for_mode(mode, base_name="FlashForge Adventurer"):
     """Get appropriate printer name for the mode"""
@@ -1,133 +1,230 @@
 """
 Response generators for G-Code commands
 """
-import binascii
 import os
+from .thumbnail_cache import thumbnail_cache
+import config
+
+class FileResponse:
+    """Binary TCP response made of a header followed by a file's contents.
+
+    The servers stream the file with sendfile after writing the header, so
+    large payloads are never copied into user-space buffers.
+    """
+
+    def __init__(self, header, path, size=None):
+        self.header = header
+        self.path = path
+        self.size = os.path.getsize(path) if size is None else size
+
+    def __len__(self):
+        return len(self.header) + self.size
+
+    def read(self, length=None):
+        """Read the first length bytes of the response (whole response by default)"""
+        if length is None:
+            length = len(self)
+        if length <= len(self.header):
+            return self.header[:length]
+        with open(self.path, 'rb') as f:
+            return self.header + f.read(min(length - len(self.header), self.size))
+
+    def iter_chunks(self, chunk_size):
+        """Yield the response in chunk_size pieces (used for bandwidth-paced writes)"""
+        for start in range(0, len(self.header), chunk_size):
+            yield self.header[start:start + chunk_size]
+        with open(self.path, 'rb') as f:
+            remaining = self.size
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    def send(self, sock):
+        """Send the response on a blocking socket"""
+        sock.sendall(self.header)
+        with open(self.path, 'rb') as f:
+            sock.sendfile(f, 0, self.size)
+
+    async def send_async(self, loop, writer):
+        """Send the response on an asyncio stream"""
+        writer.write(self.header)
+        await writer.drain()
+        with open(self.path, 'rb') as f:
+            await loop.sendfile(writer.transport, f, 0, self.size)
+
+def _cached_response(config, name, key, render):
+    """Return the ASCII-encoded response, rendering it only when its inputs changed.
+
+    Responses are cached per config as pre-encoded bytes. The cache entry is
+    reused while the config version is unchanged; if the version moved, the
+    response is still reused when the fields it depends on (key) are equal.
+    """
+    cache = getattr(config, 'response_cache', None)
+    if cache is None:
+        return render().encode('ascii')
+
+    version = config.version
+    entry = cache.get(name)
+    if entry is not None and entry[0] == version:
+        return entry[2]
+
+    # Types are part of the key since 100 and 100.0 compare equal but render differently
+    values = key()
+    dependencies = (values, tuple(map(type, values)))
+    if entry is not None and entry[1] == dependencies:
+        cache[name] = (version, dependencies, entry[2])
+        return entry[2]
+
+    payload = render().encode('ascii')
+    cache[name] = (version, dependencies, payload)
+    return payload
 
 def get_printer_info_response(config):
     """Generate printer info response (M115)"""
-    firmware = config['firmware_version']
-    machine_type = config['machine_type']
-    
     # Get dimensions from config or use defaults
-    x_dimension = config.get('x_dimension', 200)
-    y_dimension = config.get('y_dimension', 200)
-    z_dimension = config.get('z_dimension', 200)
-    tool_count = config.get('tool_count', 1)
-    
-    response = (
-        f"CMD M115 Received.\n"
-        f"Machine Type: {machine_type}\n"
-        f"Machine Name: {config['printer_name']}\n"
-        f"Firmware: {firmware}\n"
-        f"SN: {config['serial_number']}\n"
-        f"X: {x_dimension} Y: {y_dimension} Z: {z_dimension}\n"
-        f"Tool Count: {tool_count}\n"
-        f"ok\n"
-    )
-    return response
+    def key():
+        return (
+            config['firmware_version'],
+            config['machine_type'],
+            config['printer_name'],
+            config['serial_number'],
+            config.get('x_dimension', 200),
+            config.get('y_dimension', 200),
+            config.get('z_dimension', 200),
+            config.get('tool_count', 1)
+        )
+
+    def render():
+        firmware, machine_type, printer_name, serial_number, x_dimension, y_dimension, z_dimension, tool_count = key()
+        return (
+            f"CMD M115 Received.\n"
+            f"Machine Type: {machine_type}\n"
+            f"Machine Name: {printer_name}\n"
+            f"Firmware: {firmware}\n"
+            f"SN: {serial_number}\n"
+            f"X: {x_dimension} Y: {y_dimension} Z: {z_dimension}\n"
+            f"Tool Count: {tool_count}\n"
+            f"ok\n"
+        )
+
+    return _cached_response(config, "M115", key, render)
 
 def get_temperature_response(config):
     """Generate temperature response (M105)"""
-    hotend_temp = config['hotend_temp']
-    hotend_target = config['target_hotend']
-    bed_temp = config['bed_temp']
-    bed_target = config['target_bed']
-    
-    response = (
-        f"CMD M105 Received.\n"
-        f"T0:{hotend_temp:.1f}/{hotend_target:.1f} T1:0.0/0.0 B:{bed_temp:.1f}/{bed_target:.1f}\n"
-        f"ok\n"
-    )
-    return response
+    def key():
+        return (config['hotend_temp'], config['target_hotend'], config['bed_temp'], config['target_bed'])
+
+    def render():
+        hotend_temp, hotend_target, bed_temp, bed_target = key()
+        return (
+            f"CMD M105 Received.\n"
+            f"T0:{hotend_temp:.1f}/{hotend_target:.1f} T1:0.0/0.0 B:{bed_temp:.1f}/{bed_target:.1f}\n"
+            f"ok\n"
+        )
+
+    return _cached_response(config, "M105", key, render)
 
 def get_endstop_response(config):
     """Generate endstop status response (M119)"""
-    
-    # Set machine status based on print state
-    machine_status = "READY"
-    move_mode = "READY"
-    status_map = {
-        "printing": ("BUILDING_FROM_SD", "MOVING"),
-        "paused": ("PAUSED", "PAUSED"),
-        "completed": ("BUILDING_COMPLETED", "READY"),
-        "failed": ("READY", "READY"), # todo this should be an actual error state
-        "idle": ("READY", "READY")
-    }
-    
-    if config['print_status'].lower() in status_map:
-        machine_status, move_mode = status_map[config['print_status'].lower()]
-    
-    # Current file - only include if printing/paused/completed
-    current_file = ""
-    if config['print_status'].lower() in ["printing", "paused", "completed"]:
-        current_file = config['current_file']
-    
-    response = (
-        f"CMD M119 Received.\n"
-        f"Endstop: X-min: 0 Y-min: 0 Z-min: 0\n"
-        f"MachineStatus: {machine_status}\n"
-        f"MoveMode: {move_mode}\n"
-        f"Status: S:0 L:0 J:0 F:0\n"
-        f"LED: {1 if config['led_state'] else 0}\n"
-        f"CurrentFile: {current_file}\n"
-        f"ok\n"
-    )
-    return response
+    def key():
+        return (config['print_status'], config['current_file'], config['led_state'])
+
+    def render():
+        print_status, current_file, led_state = key()
+
+        # Set machine status based on print state
+        machine_status = "READY"
+        move_mode = "READY"
+        status_map = {
+            "printing": ("BUILDING_FROM_SD", "MOVING"),
+            "paused": ("PAUSED", "PAUSED"),
+            "completed": ("BUILDING_COMPLETED", "READY"),
+            "failed": ("READY", "READY"), # todo this should be an actual error state
+            "idle": ("READY", "READY")
+        }
+
+        if print_status.lower() in status_map:
+            machine_status, move_mode = status_map[print_status.lower()]
+
+        # Current file - only include if printing/paused/completed
+        if print_status.lower() not in ["printing", "paused", "completed"]:
+            current_file = ""
+
+        return (
+            f"CMD M119 Received.\n"
+            f"Endstop: X-min: 0 Y-min: 0 Z-min: 0\n"
+            f"MachineStatus: {machine_status}\n"
+            f"MoveMode: {move_mode}\n"
+            f"Status: S:0 L:0 J:0 F:0\n"
+            f"LED: {1 if led_state else 0}\n"
+            f"CurrentFile: {current_file}\n"
+            f"ok\n"
+        )
+
+    return _cached_response(config, "M119", key, render)
 
 def get_print_status_response(config):
     """Generate print status response (M27)"""
-    status_code = {"idle": 0, "printing": 1, "paused": 2, "completed": 3, "failed": 4}
-    status = status_code.get(config['print_status'].lower(), 0)
-    progress = config['print_progress']
-    
-    # Calculate layer information based on progress
-    # When progress is 0, make sure we report layer 0
-    total_layers = 100
-    if progress == 0:
-        current_layer = 0
-    else:
-        current_layer = max(1, int(progress * total_layers / 100))
-    
-    response = (
-        f"CMD M27 Received.\n"
-        f"SD printing byte {progress}/100\n"
-        f"Layer: {current_layer}/{total_layers}\n"
-        f"Status: S:{status} L:0 J:0 F:0\n"
-        f"ok\n"
-    )
-    return response
+    def key():
+        return (config['print_status'], config['print_progress'])
+
+    def render():
+        print_status, progress = key()
+        status_code = {"idle": 0, "printing": 1, "paused": 2, "completed": 3, "failed": 4}
+        status = status_code.get(print_status.lower(), 0)
+
+        # Calculate layer information based on progress
+        # When progress is 0, make sure we report layer 0
+        total_layers = 100
+        if progress == 0:
+            current_layer = 0
+        else:
+            current_layer = max(1, int(progress * total_layers / 100))
+
+        return (
+            f"CMD M27 Received.\n"
+            f"SD printing byte {progress}/100\n"
+            f"Layer: {current_layer}/{total_layers}\n"
+            f"Status: S:{status} L:0 J:0 F:0\n"
+            f"ok\n"
+        )
+
+    return _cached_response(config, "M27", key, render)
 
 def get_position_response(config):
     """Generate position response (M114)"""
-    x = config['position']['x']
-    y = config['position']['y']
-    z = config['position']['z']
-    
-    response = (
-        f"CMD M114 Received.\n"
-        f"X:{x} Y:{y} Z:{z} A:0 B:0\n"
-        f"ok\n"
-    )
-    return response
+    def key():
+        position = config['position']
+        return (position['x'], position['y'], position['z'])
+
+    def render():
+        x, y, z = key()
+        return (
+            f"CMD M114 Received.\n"
+            f"X:{x} Y:{y} Z:{z} A:0 B:0\n"
+            f"ok\n"
+        )
+
+    return _cached_response(config, "M114", key, render)
+
+# M661 header: text part, then "D" and the specific sequence seen in the real printer response
+M661_HEADER = "CMD M661 Received.\nok\n".encode('ascii') + b'D\xcc\xd1D\xcc'
+
+def encode_file_list_entry(filename):
+    """Encode one file entry of the M661 response"""
+    return f"::\xcc\xd1/data/{filename}::".encode('utf-8', errors='replace')
 
 def get_file_list_response(virtual_files, logger=None):
     """Generate file list response for M661 matching actual response format"""
+    # Virtual file lists maintained by the file manager keep a prebuilt payload
+    get_payload = getattr(virtual_files, 'get_listing_payload', None)
+    if get_payload:
+        return get_payload()
 
-    header = "CMD M661 Received.\nok\n" # First, create the text header in ASCII
-    response = header.encode('ascii') # Convert the header to bytes
-    response += b'D\xcc\xd1D\xcc' # Start with "D" and then the specific sequence seen in the real printer response
-    
-    for filename in virtual_files: # Add files from the virtual files list
-        file_entry = f"::\xcc\xd1/data/{filename}::"
-        response += file_entry.encode('utf-8', errors='replace')
-    
-    #if logger:
-    #    hex_dump = binascii.hexlify(response[:50]).decode('ascii')
-    #    logger(f"M661 response hex dump (first 50 bytes): {hex_dump}")
-    #    logger(f"M661 response includes {len(virtual_files)} files")
-    
-    return response
+    return M661_HEADER + b''.join(encode_file_list_entry(filename) for filename in virtual_files)
 
 def get_thumbnail_response(thumbnail_path, file_path, virtual_files, logger=None):
     """Generate thumbnail response (M662) - binary response"""
@@ -159,17 +256,19 @@ def get_thumbnail_response(thumbnail_path, file_path, virtual_files, logger=None
             logger(f"Warning: Requested file {requested_filename} not in virtual files list")
             # Still return the thumbnail even if file not found for compatibility
         
-        # Read the thumbnail file
-        with open(thumbnail_path, 'rb') as f:
-            png_data = f.read()
-        
         # Response format: text header + PNG data
         header = f"CMD M662 Received.\nok\n".encode('ascii')
-        
-        # Combine header and PNG data
-        response = bytearray()
-        response.extend(header)
-        response.extend(png_data)
+
+        # Stream large thumbnails straight from disk, serve small ones from memory
+        size = os.path.getsize(thumbnail_path)
+        if size >= config.TCP_CONFIG.get('sendfile_threshold', 64 * 1024):
+            response = FileResponse(header, thumbnail_path, size)
+        else:
+            # Get the thumbnail file contents (cached until the file changes)
+            png_data = thumbnail_cache.get_bytes(thumbnail_path)
+            if png_data is None:
+                raise FileNotFoundError(thumbnail_path)
+            response = header + png_data
         
         if logger:
             logger(f"Sending thumbnail response ({len(response)} bytes)")
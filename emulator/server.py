@@ -5,25 +5,37 @@ import socket
 import threading
 import binascii
 import time
-import random
 from .commands import process_command
+from .framing import CommandFramer
+from .network_sim import ConnectionImpairment, paced_sendall
+from .responses import FileResponse
 import config
 
 class EmulatorServer:
     """Server implementation for FlashForge Emulator"""
     
-    def __init__(self, printer_config, virtual_files, thumbnail_path, logger=None):
+    def __init__(self, printer_config, virtual_files, thumbnail_path, logger=None,
+                 host='0.0.0.0', port=None):
         self.config = printer_config
         self.virtual_files = virtual_files
         self.thumbnail_path = thumbnail_path
         self.log = logger if logger else print
         
+        # Bind address (port defaults to config.COMMAND_PORT when the server starts)
+        self.host = host
+        self.port = port
+        
         # Server state
         self.discovery_server = None
         self.tcp_server = None
         self.tcp_clients = []
         self.is_running = False
     
+    @property
+    def command_port(self):
+        """TCP command port this server listens on"""
+        return self.port or config.COMMAND_PORT
+
     def start(self):
         """Start the discovery and TCP command servers"""
         try:
@@ -31,7 +43,7 @@ class EmulatorServer:
             if self.config.get('discovery_enabled', True):
                 self.discovery_server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
                 self.discovery_server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-                self.discovery_server.bind(('0.0.0.0', config.DISCOVERY_PORT))
+                self.discovery_server.bind((self.host, config.DISCOVERY_PORT))
                 threading.Thread(target=self.handle_discovery, daemon=True).start()
     
             else:
@@ -41,7 +53,7 @@ class EmulatorServer:
             # Start TCP command server
             self.tcp_server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.tcp_server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.tcp_server.bind(('0.0.0.0', config.COMMAND_PORT))
+            self.tcp_server.bind((self.host, self.command_port))
             self.tcp_server.listen(5)
             threading.Thread(target=self.handle_tcp_connections, daemon=True).start()
             
@@ -52,7 +64,7 @@ class EmulatorServer:
             if self.config.get('discovery_enabled', True):
                 self.log(f"Discovery service running on UDP port {config.DISCOVERY_PORT}")
             
-            self.log(f"TCP API service running on port {config.COMMAND_PORT}")
+            self.log(f"TCP API service running on port {self.command_port}")
             
             return True
         except Exception as e:
@@ -110,33 +122,11 @@ class EmulatorServer:
                     discovery_hex = binascii.hexlify(data).decode('ascii')
                     self.log(f"Discovery request from {addr[0]}:{addr[1]} - Data: {discovery_hex}")
                     
-                    # Only respond from the primary network interface
-                    # Determine the local IP we would use to reach this address
-                    local_ip = None
-                    try:
-                        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-                        s.connect((addr[0], 1))
-                        local_ip = s.getsockname()[0]
-                        s.close()
-                    except:
-                        pass
-                    
-                    # If we're responding with an IP different from our configured one, skip it
-                    if local_ip and local_ip != emulator_ip:
+                    response = self.build_discovery_response(addr, emulator_ip)
+                    if response is None:
                         # Skip without logging
                         continue
                     
-                    # Create the discovery response packet
-                    response = bytearray(0xC4)  # Response length 196 bytes
-                    
-                    # Set printer name at offset 0x00 (32 bytes)
-                    name_bytes = self.config['printer_name'].encode('ascii')
-                    response[0:len(name_bytes)] = name_bytes
-                    
-                    # Set serial number at offset 0x92 (32 bytes)
-                    serial_bytes = self.config['serial_number'].encode('ascii')
-                    response[0x92:0x92+len(serial_bytes)] = serial_bytes
-                    
                     # Send the response back
                     self.discovery_server.sendto(response, addr)
                     # Only log this message in debug mode or when explicitly asked for detail
@@ -151,7 +141,59 @@ class EmulatorServer:
             self.log(f"Discovery service error: {str(e)}")
         
         self.log("Discovery service stopped")
-    
+
+    def build_discovery_response(self, addr, emulator_ip):
+        """Build the discovery reply for a client, or None if it should be ignored"""
+        # Only respond from the primary network interface
+        # Determine the local IP we would use to reach this address
+        local_ip = None
+        try:
+            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            s.connect((addr[0], 1))
+            local_ip = s.getsockname()[0]
+            s.close()
+        except:
+            pass
+
+        # If we're responding with an IP different from our configured one, skip it
+        # (a server bound to one address, like a fleet alias, always answers as that address)
+        if local_ip and local_ip != emulator_ip and self.host in ('', '0.0.0.0'):
+            return None
+
+        # Create the discovery response packet
+        response = bytearray(0xC4)  # Response length 196 bytes
+
+        # Set printer name at offset 0x00 (32 bytes)
+        name_bytes = self.config['printer_name'].encode('ascii')
+        response[0:len(name_bytes)] = name_bytes
+
+        # Set serial number at offset 0x92 (32 bytes)
+        serial_bytes = self.config['serial_number'].encode('ascii')
+        response[0x92:0x92+len(serial_bytes)] = serial_bytes
+
+        return response
+
+    def log_response(self, response):
+        """Log a sent response, truncating extremely long text responses"""
+        if isinstance(response, bytes):
+            try:
+                # Pre-encoded text response (bytes.isascii() needs Python 3.7)
+                response = response.decode('ascii')
+            except UnicodeDecodeError:
+                pass  # Binary data
+        if isinstance(response, str):
+            # Only truncate extremely long responses
+            log_response = response
+            if len(log_response) > 500:  # Increased from 100 to 500
+                # Try to find a line break near the truncation point
+                truncate_pos = log_response[:500].rfind('\n')
+                if truncate_pos < 0:
+                    truncate_pos = 500
+                log_response = f"{log_response[:truncate_pos]}\n... (truncated, {len(response)} bytes total)"
+            self.log(f"Sent response: \n{log_response}")
+        else:
+            self.log(f"Sent binary response: {len(response)} bytes")
+
     def handle_tcp_connections(self):
         """Accept and handle TCP connections for printer commands"""
         self.log("TCP server started")
@@ -161,7 +203,7 @@ class EmulatorServer:
                 try:
                     # Accept a new connection
                     client_socket, addr = self.tcp_server.accept()
-                    client_socket.settimeout(60)  # 60 second timeout
+                    client_socket.settimeout(config.TCP_CONFIG.get('client_timeout', 60))
                     self.tcp_clients.append(client_socket)
                     
                     # Start a new thread to handle this client
@@ -182,85 +224,134 @@ class EmulatorServer:
         
         self.log("TCP server stopped")
     
+    def create_impairment(self):
+        """Create the simulated network impairment state for a new connection"""
+        return ConnectionImpairment(lambda: self.config.get('network_simulation', {}))
+
+    def process_batch(self, commands, addr, impairment):
+        """Run pipelined commands back-to-back and collect their encoded responses.
+
+        Returns (chunks, failure) where failure is None, 'drop' or 'timeout'
+        when a simulated network failure should end the connection.
+        """
+        # Publish any lazily simulated state before commands read it
+        self.config.refresh()
+
+        chunks = []
+        for command in commands:
+            self.log(f"Received command from {addr[0]}: {command}")
+
+            # Process command and get response (its writes land as one state change)
+            with self.config.batch():
+                response = process_command(command, self.config, self.thumbnail_path,
+                                           self.virtual_files, self.log)
+            if isinstance(response, str):
+                payload = response.encode('ascii')
+            elif isinstance(response, FileResponse):
+                payload = response
+            else:
+                payload = bytes(response)
+
+            # Determine if we should simulate a failure (random or burst loss)
+            failure_type = impairment.sample_failure()
+
+            # Handle connection failures if enabled and triggered
+            if failure_type:
+                self.log(f"Simulating network failure: {failure_type}")
+
+                if failure_type == 'drop':
+                    # Silently close the connection
+                    return chunks, 'drop'
+
+                elif failure_type == 'timeout':
+                    # Send part of the response and then hang
+                    if isinstance(payload, FileResponse):
+                        chunks.append(payload.read(len(payload)//3))
+                    else:
+                        chunks.append(payload[:len(payload)//3])
+                    return chunks, 'timeout'
+
+                elif failure_type == 'error':
+                    # Send an error response instead
+                    chunks.append(b"CMD ERROR Received.\nError: Simulated failure\nok\n")
+                    continue
+
+            chunks.append(payload)
+            self.log_response(response)
+
+        return chunks, None
+
+    def send_chunks(self, client_socket, chunks, impairment=None):
+        """Send batched responses, coalescing in-memory payloads into single writes"""
+        if impairment is not None and impairment.chunk_size:
+            # Bandwidth cap: write small paced chunks instead
+            for chunk in chunks:
+                paced_sendall(client_socket, chunk, impairment)
+            return
+
+        pending = []
+        for chunk in chunks:
+            if isinstance(chunk, FileResponse):
+                if pending:
+                    client_socket.sendall(b''.join(pending))
+                    pending = []
+                chunk.send(client_socket)
+            else:
+                pending.append(chunk)
+        if pending:
+            client_socket.sendall(b''.join(pending))
+
+    def get_simulated_latency(self, impairment):
+        """Sample the simulated response latency in seconds (0 when disabled)"""
+        latency = impairment.sample_latency()
+        if latency > 0:
+            self.log(f"Simulating network latency: {latency * 1000:.0f} ms")
+        return latency
+
     def handle_client_commands(self, client_socket, addr):
         """Handle commands from a specific client"""
+        framer = CommandFramer()
+        impairment = self.create_impairment()
+        client_timeout = config.TCP_CONFIG.get('client_timeout', 60)
+        partial_timeout = config.TCP_CONFIG.get('partial_command_timeout', 0.2)
         try:
             while True:
-                # Receive command
-                data = client_socket.recv(1024)
-                if not data:
-                    break
-                
-                # Parse command
-                command = data.decode('ascii', errors='replace').strip()
-                self.log(f"Received command from {addr[0]}: {command}")
-                
-                # Process command and get response
-                response = process_command(command, self.config, self.thumbnail_path, 
-                                         self.virtual_files, self.log)
-                
-                # Get network simulation settings
-                network_sim = self.config.get('network_simulation', {})
-                latency_enabled = network_sim.get('latency_enabled', False)
-                latency = network_sim.get('latency', 0)
-                failures_enabled = network_sim.get('failures_enabled', False)
-                failure_rate = network_sim.get('failure_rate', 0)
-                failure_type = network_sim.get('failure_type', 'drop')
-                
-                # Determine if we should simulate a failure
-                should_fail = failures_enabled and random.randint(1, 100) <= failure_rate
-                
-                # Apply simulated latency if enabled
-                if latency_enabled and latency > 0:
-                    self.log(f"Simulating network latency: {latency} ms")
-                    time.sleep(latency / 1000.0)  # Convert ms to seconds
-                
-                # Handle connection failures if enabled and triggered
-                if should_fail:
-                    self.log(f"Simulating network failure: {failure_type}")
-                    
-                    if failure_type == 'drop':
-                        # Silently close the connection
-                        break
-                    
-                    elif failure_type == 'timeout':
-                        # Send part of the response and then hang
-                        if isinstance(response, str):
-                            partial_response = response[:len(response)//3]
-                            client_socket.sendall(partial_response.encode('ascii'))
-                        elif isinstance(response, bytes):
-                            partial_response = response[:len(response)//3]
-                            client_socket.sendall(partial_response)
-                        # Now simulate hanging by sleeping for a while
-                        time.sleep(10)  # Sleep for 10 seconds
-                        break
-                    
-                    elif failure_type == 'error':
-                        # Send an error response instead
-                        error_msg = "CMD ERROR Received.\nError: Simulated failure\nok\n"
-                        client_socket.sendall(error_msg.encode('ascii'))
-                        continue
-                
-                # If no failure or delay, send the normal response
-                if isinstance(response, str):
-                    client_socket.sendall(response.encode('ascii'))
-                elif isinstance(response, bytes):
-                    client_socket.sendall(response)
-                else:
-                    client_socket.sendall(response)
-                
-                if isinstance(response, str):
-                    # Only truncate extremely long responses
-                    log_response = response
-                    if len(log_response) > 500:  # Increased from 100 to 500
-                        # Try to find a line break near the truncation point
-                        truncate_pos = log_response[:500].rfind('\n')
-                        if truncate_pos < 0:
-                            truncate_pos = 500
-                        log_response = f"{log_response[:truncate_pos]}\n... (truncated, {len(response)} bytes total)"
-                    self.log(f"Sent response: \n{log_response}")
+                # Receive data, giving an unterminated command a short grace period
+                client_socket.settimeout(partial_timeout if framer.pending else client_timeout)
+                try:
+                    data = client_socket.recv(4096)
+                except socket.timeout:
+                    if not framer.pending:
+                        raise
+                    # Client did not terminate its command, treat the buffer as complete
+                    commands = framer.flush()
                 else:
-                    self.log(f"Sent binary response: {len(response)} bytes")
+                    if not data:
+                        break
+                    # Split the stream into complete, possibly pipelined commands
+                    commands = framer.feed(data)
+
+                if not commands:
+                    continue
+
+                chunks, failure = self.process_batch(commands, addr, impairment)
+
+                # Apply simulated latency if enabled
+                latency = self.get_simulated_latency(impairment)
+                if latency:
+                    time.sleep(latency)
+
+                if failure == 'drop':
+                    break
+
+                # Send every response of the batch in one write
+                if chunks:
+                    self.send_chunks(client_socket, chunks, impairment)
+
+                if failure == 'timeout':
+                    # Now simulate hanging by sleeping for a while
+                    time.sleep(impairment.hang_duration)
+                    break
         except Exception as e:
             self.log(f"Error handling client {addr[0]}: {str(e)}")
         finally:
@@ -0,0 +1,303 @@
+"""
+Asyncio network server implementation for FlashForge Emulator.
+Serves every TCP client and the discovery service from a single event loop
+instead of spawning one thread per connection.
+"""
+import asyncio
+import binascii
+import functools
+import socket
+import threading
+from typing import Optional
+from .framing import CommandFramer
+from .network_sim import ResponseScheduler, paced_write
+from .responses import FileResponse
+from .server import EmulatorServer
+import config
+
+
+class _DiscoveryProtocol(asyncio.DatagramProtocol):
+    """UDP discovery endpoint running on the server event loop"""
+
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        # Check if this is the expected discovery packet format
+        if not data.startswith(b'www.usr'):
+            return
+
+        try:
+            # Log the discovery request
+            discovery_hex = binascii.hexlify(data).decode('ascii')
+            self.server.log(f"Discovery request from {addr[0]}:{addr[1]} - Data: {discovery_hex}")
+
+            response = self.server.build_discovery_response(addr, self.server.config['ip_address'])
+            if response is not None:
+                self.transport.sendto(bytes(response), addr)
+        except Exception as e:
+            self.server.log(f"Discovery error: {str(e)}")
+
+
+class AsyncEmulatorServer(EmulatorServer):
+    """Event loop based server for FlashForge Emulator"""
+
+    def __init__(self, printer_config, virtual_files, thumbnail_path, logger=None,
+                 host='0.0.0.0', port=None, loop: Optional[asyncio.AbstractEventLoop] = None):
+        super().__init__(printer_config, virtual_files, thumbnail_path, logger, host, port)
+
+        # Event loop management (a loop passed in is shared and owned by the caller)
+        self.shared_loop = loop
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread: Optional[threading.Thread] = None
+        self.tcp_clients = set()  # asyncio.StreamWriter per connected client
+        self.client_tasks = set()  # handle_client task per connected client
+        self.schedulers = set()  # ResponseScheduler per connection with deliveries pending
+
+    def start(self):
+        """Start the discovery and TCP command servers on a background event loop"""
+        try:
+            if self.shared_loop:
+                self.loop = self.shared_loop
+            else:
+                self.loop = asyncio.new_event_loop()
+                self.loop_thread = threading.Thread(target=self._run_event_loop, daemon=True)
+                self.loop_thread.start()
+
+            # Wait for the sockets to be bound so bind errors are reported to the caller
+            future = asyncio.run_coroutine_threadsafe(self._start_async(), self.loop)
+            future.result(timeout=5)
+
+            self.is_running = True
+            discovery_status = "with discovery service" if self.config.get('discovery_enabled', True) else "without discovery service"
+            self.log(f"Emulator services started on {self.config['ip_address']} {discovery_status}")
+            # Only log the discovery port if it's enabled
+            if self.config.get('discovery_enabled', True):
+                self.log(f"Discovery service running on UDP port {config.DISCOVERY_PORT}")
+
+            self.log(f"TCP API service running on port {self.command_port} (async)")
+
+            return True
+        except Exception as e:
+            self.log(f"Error starting servers: {str(e)}")
+            self.stop()
+            return False
+
+    def stop(self):
+        """Stop all servers and the event loop"""
+        try:
+            if self.loop and self.loop.is_running():
+                future = asyncio.run_coroutine_threadsafe(self._stop_async(), self.loop)
+                try:
+                    future.result(timeout=5)
+                except Exception:
+                    pass
+                if not self.shared_loop:
+                    self.loop.call_soon_threadsafe(self.loop.stop)
+
+            if self.loop_thread:
+                self.loop_thread.join(timeout=5)
+                self.loop_thread = None
+
+            if self.loop and not self.shared_loop and not self.loop.is_running():
+                self.loop.close()
+            self.loop = None
+
+            self.is_running = False
+            self.log("Emulator services stopped")
+            return True
+        except Exception as e:
+            self.log(f"Error stopping servers: {str(e)}")
+            return False
+
+    def _run_event_loop(self):
+        """Run the asyncio event loop in a separate thread"""
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    async def _start_async(self):
+        """Bind the discovery endpoint and TCP listener (runs in event loop)"""
+        # Start discovery server (UDP) if enabled
+        if self.config.get('discovery_enabled', True):
+            # SO_REUSEADDR lets fleet printers bound to their own aliases share the
+            # port with a wildcard socket receiving broadcasts (see PrinterFleet)
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            try:
+                sock.bind((self.host, config.DISCOVERY_PORT))
+            except OSError:
+                sock.close()
+                raise
+            transport, _ = await self.loop.create_datagram_endpoint(
+                lambda: _DiscoveryProtocol(self),
+                sock=sock
+            )
+            self.discovery_server = transport
+            self.log("Discovery service started")
+        else:
+            self.discovery_server = None
+            self.log("Discovery service disabled")
+
+        # Start TCP command server
+        self.tcp_server = await asyncio.start_server(
+            self._accept_client,
+            self.host,
+            self.command_port,
+            reuse_address=True,
+            backlog=1024
+        )
+        self.log("TCP server started")
+
+    async def _stop_async(self):
+        """Close the listener, discovery endpoint and all clients (runs in event loop)"""
+        if self.discovery_server:
+            self.discovery_server.close()
+            self.discovery_server = None
+            self.log("Discovery service stopped")
+
+        if self.tcp_server:
+            self.tcp_server.close()
+
+        # Close all client connections
+        for writer in list(self.tcp_clients):
+            try:
+                writer.close()
+            except Exception:
+                pass
+        self.tcp_clients.clear()
+
+        # Cancel client handlers and any scheduled deliveries, timers and delayed
+        # closes still in flight (on a shared loop only this server's are ours to cancel)
+        if self.shared_loop:
+            tasks = list(self.client_tasks)
+        else:
+            tasks = [task for task in asyncio.all_tasks(self.loop) if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        for scheduler in list(self.schedulers):
+            delivery = scheduler.cancel()
+            if delivery is not None:
+                tasks.append(delivery)
+        self.schedulers.clear()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        if self.tcp_server:
+            await self.tcp_server.wait_closed()
+            self.tcp_server = None
+            self.log("TCP server stopped")
+
+    async def send_chunks_async(self, writer: asyncio.StreamWriter, chunks, impairment=None):
+        """Send batched responses, coalescing in-memory payloads into single writes"""
+        if impairment is not None and impairment.chunk_size:
+            # Bandwidth cap: write small paced chunks instead
+            for chunk in chunks:
+                await paced_write(writer, chunk, impairment)
+            return
+
+        pending = []
+        for chunk in chunks:
+            if isinstance(chunk, FileResponse):
+                if pending:
+                    writer.write(b''.join(pending))
+                    pending = []
+                await chunk.send_async(self.loop, writer)
+            else:
+                pending.append(chunk)
+        if pending:
+            writer.write(b''.join(pending))
+        await writer.drain()
+
+    def _accept_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Run handle_client in a task of our own.
+
+        When the callback returns a coroutine, Python 3.11's stream server
+        calls exception() on its task, which raises for a handler that was
+        cancelled at shutdown and gets logged as an error.
+        """
+        self.loop.create_task(self.handle_client(reader, writer))
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Handle commands from a specific client"""
+        addr = writer.get_extra_info('peername') or ('unknown', 0)
+        task = asyncio.current_task()
+        self.tcp_clients.add(writer)
+        self.client_tasks.add(task)
+        self.log(f"New client connected: {addr[0]}:{addr[1]}")
+
+        def on_close():
+            # Clean up
+            self.tcp_clients.discard(writer)
+            self.schedulers.discard(scheduler)
+            self.log(f"Client disconnected: {addr[0]}:{addr[1]}")
+
+        # Simulated latency and failures are delivered by timers, not by this coroutine
+        impairment = self.create_impairment()
+        send_chunks = functools.partial(self.send_chunks_async, impairment=impairment)
+        scheduler = ResponseScheduler(self.loop, writer, send_chunks, on_close)
+        self.schedulers.add(scheduler)
+        framer = CommandFramer()
+        client_timeout = config.TCP_CONFIG.get('client_timeout', 60)
+        partial_timeout = config.TCP_CONFIG.get('partial_command_timeout', 0.2)
+        max_backlog = config.TCP_CONFIG.get('max_scheduled_responses', 64)
+        cancelled = False
+        try:
+            while not scheduler.closed:
+                # Receive data, giving an unterminated command a short grace period
+                try:
+                    data = await asyncio.wait_for(reader.read(4096),
+                                                  partial_timeout if framer.pending else client_timeout)
+                except asyncio.TimeoutError:
+                    if not framer.pending:
+                        raise
+                    # Client did not terminate its command, treat the buffer as complete
+                    commands = framer.flush()
+                else:
+                    if not data:
+                        break
+                    # Split the stream into complete, possibly pipelined commands
+                    commands = framer.feed(data)
+
+                if not commands:
+                    continue
+
+                chunks, failure = self.process_batch(commands, addr, impairment)
+                latency = self.get_simulated_latency(impairment)
+
+                if failure == 'drop':
+                    # Silently close the connection once the latency has elapsed
+                    scheduler.close(latency)
+                    break
+
+                if failure == 'timeout':
+                    # Send part of the response, then hang before closing
+                    scheduler.schedule(latency, chunks, close_after=impairment.hang_duration)
+                    break
+
+                if not latency and scheduler.idle:
+                    # Send every response of the batch in one write
+                    if chunks:
+                        await send_chunks(writer, chunks)
+                    continue
+
+                scheduler.schedule(latency, chunks)
+                await scheduler.wait_for_capacity(max_backlog)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # Server is stopping: drop scheduled responses along with the handler
+            cancelled = True
+            raise
+        except Exception as e:
+            self.log(f"Error handling client {addr[0]}: {str(e)}")
+        finally:
+            self.client_tasks.discard(task)
+            if cancelled:
+                scheduler.cancel()
+            else:
+                # Close after any responses that are still scheduled
+                scheduler.close()
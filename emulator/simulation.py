@@ -0,0 +1,148 @@
+"""
+Simulation clock for FlashForge Emulator.
+Advances temperatures and print progress on a background thread with a
+fixed timestep, independent of any UI event loop. The UI and the servers
+only read the state each tick publishes.
+"""
+import threading
+import time
+from typing import Callable, Optional
+import config
+
+
+class SimulationClock:
+    """Calls the emulator's simulation tick at a fixed rate on a daemon thread.
+
+    Ticks are scheduled against monotonic deadlines, so a slow tick does not
+    push every later tick back. After a stall (a suspended process, a long
+    GC pause) up to ``max_catch_up_ticks`` missed ticks are replayed back to
+    back and the rest are skipped, so simulated time never runs away trying
+    to catch up. Each tick advances the simulation by 1 / tick_rate seconds.
+
+    ``time_scale`` runs the same ticks faster: at 100 the clock ticks 100
+    times as often, so a print finishes 100 times sooner with exactly the
+    same per-tick steps. A time scale of 0 ticks back to back as fast as the
+    simulation allows while anything is printing or changing temperature.
+    While the simulation is settled it ticks at real-time pace, and any
+    config change (a print start, a new target temperature) wakes it to
+    run flat out again.
+    """
+
+    def __init__(self, emulator, tick_rate: Optional[float] = None,
+                 on_tick: Optional[Callable[[], None]] = None,
+                 max_catch_up_ticks: Optional[int] = None,
+                 time_scale: Optional[float] = None):
+        settings = config.SIMULATION_CONFIG
+        self.emulator = emulator
+        self.tick_rate = tick_rate or settings['tick_rate']
+        self.max_catch_up_ticks = (settings['max_catch_up_ticks']
+                                   if max_catch_up_ticks is None else max_catch_up_ticks)
+        self.time_scale = settings['time_scale'] if time_scale is None else time_scale
+        self.on_tick = on_tick
+
+        self.ticks = 0                # Ticks run since start
+        self.skipped_ticks = 0        # Ticks dropped after stalls
+        self.simulated_time = 0.0     # Seconds of simulated time advanced
+
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()  # Set on config changes and stop()
+        self._configs = []
+
+    @property
+    def timestep(self) -> float:
+        """Simulated seconds advanced by each tick"""
+        return 1.0 / self.tick_rate
+
+    @property
+    def interval(self) -> float:
+        """Wall seconds between ticks (0 at maximum speed)"""
+        if not self.time_scale:
+            return 0.0
+        return self.timestep / self.time_scale
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def set_time_scale(self, time_scale: float):
+        """Change the time scale; a running clock picks it up on its next tick"""
+        self.time_scale = time_scale
+        self._wake_event.set()
+
+    def start(self):
+        """Start ticking (no-op if already running)"""
+        if self.is_running:
+            return
+        self._stop_event.clear()
+        self._configs = list(self.emulator.simulation_configs())
+        for cfg in self._configs:
+            cfg.change_hook = self._wake_event.set
+        self._thread = threading.Thread(target=self._run, name="simulation-clock", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop ticking and wait for the current tick to finish"""
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        for cfg in self._configs:
+            cfg.change_hook = None
+        self._configs = []
+
+    def _tick(self, dt: float):
+        """Run one simulation step"""
+        try:
+            self.emulator.simulation_tick(dt)
+            if self.on_tick:
+                self.on_tick()
+        except Exception as e:
+            self.emulator.log(f"Simulation error: {e}")
+        self.ticks += 1
+        self.simulated_time += dt
+
+    def _run(self):
+        """Tick until stopped, re-pacing whenever the time scale changes"""
+        while not self._stop_event.is_set():
+            time_scale = self.time_scale
+            if time_scale:
+                self._run_paced(time_scale)
+            else:
+                self._run_max_speed()
+
+    def _run_paced(self, time_scale: float):
+        """Tick on wall-clock deadlines; waiting on the event lets stop() interrupt the sleep"""
+        dt = self.timestep
+        interval = dt / time_scale
+        next_tick = time.monotonic() + interval
+
+        while self.time_scale == time_scale and not self._stop_event.wait(max(0.0, next_tick - time.monotonic())):
+            # Run every tick that is due, up to the catch-up limit
+            due = int((time.monotonic() - next_tick) // interval) + 1
+            run = min(due, 1 + self.max_catch_up_ticks)
+            for _ in range(run):
+                self._tick(dt)
+                if self._stop_event.is_set():
+                    return
+
+            next_tick += due * interval
+            if due > run:
+                self.skipped_ticks += due - run
+                self.emulator.log(f"Simulation fell behind, skipped {due - run} ticks")
+
+    def _run_max_speed(self):
+        """Tick back to back until stopped or the time scale changes"""
+        dt = self.timestep
+        while not self.time_scale and not self._stop_event.is_set():
+            self._tick(dt)
+            # The tick's own writes must not wake the clock
+            self._wake_event.clear()
+            if self.emulator.is_simulation_settled():
+                # Nothing to fast-forward: tick at real-time pace instead of
+                # spinning, until a config change shows up
+                self._wake_event.wait(dt)
+            else:
+                # Give the server threads a chance at the GIL between ticks
+                time.sleep(0)
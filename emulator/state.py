@@ -0,0 +1,150 @@
+"""
+Versioned printer state for FlashForge Emulator
+"""
+import itertools
+import threading
+from contextlib import contextmanager
+
+# Shared across all configs so a version number is never reused
+_version_counter = itertools.count(1)
+
+# Value types compared on write; anything else always counts as a change
+_SCALAR_TYPES = (bool, int, float, str, type(None))
+
+
+class StateSnapshot(dict):
+    """Read-only copy of a PrinterConfig at one version.
+
+    Shares the config's response cache, so responses rendered from a
+    snapshot are cached exactly as if they were rendered from the config.
+    """
+
+    def __init__(self, values, version, response_cache):
+        super().__init__(values)
+        self.version = version
+        self.response_cache = response_cache
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("state snapshots are read-only")
+
+    __setitem__ = __delitem__ = update = setdefault = pop = popitem = clear = _read_only
+
+
+class PrinterConfig(dict):
+    """Printer configuration dict that tracks a state version.
+
+    Every write that changes a value bumps ``version``, so consumers can
+    cache anything derived from the config and reuse it until the version
+    moves. Nested values (such as ``position``) must be replaced rather than
+    mutated in place for the change to be seen.
+
+    The config is written from the UI thread, TCP client threads, the HTTP
+    event loop and the simulation clock. Writers serialize on a lock, and
+    writes that belong together go through ``update`` or a ``batch`` block
+    so they land as one version. Readers that need several fields to agree
+    (status with progress, say) take a ``snapshot``: a copy-on-write view
+    that is only rebuilt after the version moves, so reading it is lock-free.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version = next(_version_counter)
+        self.response_cache = {}  # name -> (version, key, payload)
+        self.refresh_hook = None  # Publishes lazily simulated values (see refresh)
+        self.change_hook = None   # Called after every version bump (wakes an idle simulation clock)
+        self._lock = threading.RLock()
+        self._batch_depth = 0     # Nesting of open batch() blocks
+        self._batch_dirty = False  # A write inside the batch is waiting to bump the version
+        self._snapshot = None
+
+    def refresh(self):
+        """Bring lazily simulated values up to date before reading the config.
+
+        The servers call this before handling a request. Fleet simulation
+        steps its printers in arrays and only writes a printer's values here
+        when somebody is about to read them.
+        """
+        if self.refresh_hook is not None:
+            self.refresh_hook()
+
+    def touch(self):
+        """Bump the state version (deferred to the end of an open batch)"""
+        if self._batch_depth:
+            self._batch_dirty = True
+            return
+        self.version = next(_version_counter)
+        if self.change_hook is not None:
+            self.change_hook()
+
+    @contextmanager
+    def batch(self):
+        """Group writes into one atomic change with a single version bump.
+
+        Snapshots taken while the batch is open show the state from before
+        it, never half of it. Batches nest; the version moves when the
+        outermost one exits.
+        """
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if not self._batch_depth and self._batch_dirty:
+                    self._batch_dirty = False
+                    self.touch()
+
+    def snapshot(self) -> StateSnapshot:
+        """Consistent read-only view of the current state"""
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == self.version:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.version != self.version:
+                snapshot = StateSnapshot(self, self.version, self.response_cache)
+                self._snapshot = snapshot
+            return snapshot
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            if key in self:
+                old_value = dict.__getitem__(self, key)
+                if old_value is value or (type(old_value) is type(value)
+                                          and type(value) in _SCALAR_TYPES and old_value == value):
+                    return
+            dict.__setitem__(self, key, value)
+            self.touch()
+
+    def __delitem__(self, key):
+        with self._lock:
+            dict.__delitem__(self, key)
+            self.touch()
+
+    def update(self, *args, **kwargs):
+        with self._lock:
+            dict.update(self, *args, **kwargs)
+            self.touch()
+
+    def setdefault(self, key, default=None):
+        with self._lock:
+            if key not in self:
+                self[key] = default
+            return dict.__getitem__(self, key)
+
+    def pop(self, key, *args):
+        with self._lock:
+            value = dict.pop(self, key, *args)
+            self.touch()
+            return value
+
+    def popitem(self):
+        with self._lock:
+            item = dict.popitem(self)
+            self.touch()
+            return item
+
+    def clear(self):
+        with self._lock:
+            dict.clear(self)
+            self.touch()
@@ -0,0 +1,160 @@
+"""
+Index of uploaded 3MF print files (OrcaSlicer / Orca-FlashForge / Bambu layout).
+Opening an archive reads only its ZIP central directory; plate thumbnails
+and the slice info are decompressed on first access and kept with the index.
+"""
+import base64
+import re
+import threading
+import zipfile
+import xml.etree.ElementTree as ElementTree
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+SLICE_INFO = 'Metadata/slice_info.config'
+_PLATE_MEMBER = re.compile(r'^Metadata/plate_(\d+)\.(?:png|gcode)$')
+# Preview candidates for a plate, best first ({plate} is its index)
+THUMBNAIL_MEMBERS = ('Metadata/plate_{plate}.png', 'Metadata/plate_{plate}_small.png',
+                     'Metadata/thumbnail.png', 'Auxiliaries/.thumbnails/thumbnail_middle.png')
+MAX_MEMBER_SIZE = 16 * 1024 * 1024  # Larger previews or slice info are ignored
+
+
+def is_3mf_file(filename: str) -> bool:
+    return filename.lower().endswith('.3mf')
+
+
+def _to_float(value, default=0.0) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class ThreeMFIndex:
+    """Members of one 3MF archive, with lazily extracted plate data"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with zipfile.ZipFile(path) as archive:
+            self.members = {info.filename: info.file_size for info in archive.infolist()}
+        self._thumbnails: Dict[int, Optional[str]] = {}  # plate -> base64 PNG
+        self._plates = None
+        self._lock = threading.Lock()
+
+    @property
+    def plate_numbers(self) -> List[int]:
+        """Plates with a preview or sliced G-code in the archive"""
+        numbers = {int(match.group(1)) for match in map(_PLATE_MEMBER.match, self.members) if match}
+        return sorted(numbers) or [1]
+
+    def read(self, name: str) -> Optional[bytes]:
+        """Decompress a single member, or None if it is missing or unreadable"""
+        if not 0 < self.members.get(name, 0) <= MAX_MEMBER_SIZE:
+            return None
+        try:
+            with zipfile.ZipFile(self.path) as archive:
+                return archive.read(name)
+        except (OSError, zipfile.BadZipFile, RuntimeError):  # RuntimeError: encrypted member
+            return None
+
+    def get_thumbnail(self, plate: int = None) -> Optional[str]:
+        """Base64 preview of a plate (the first plate by default)"""
+        plate = plate or self.plate_numbers[0]
+        with self._lock:
+            if plate in self._thumbnails:
+                return self._thumbnails[plate]
+        thumbnail = None
+        for template in THUMBNAIL_MEMBERS:
+            data = self.read(template.format(plate=plate))
+            if data:
+                thumbnail = base64.b64encode(data).decode('ascii')
+                break
+        with self._lock:
+            self._thumbnails[plate] = thumbnail
+        return thumbnail
+
+    def get_plates(self) -> List[Dict]:
+        """Per-plate slice info: time, weight and the filaments each plate uses"""
+        with self._lock:
+            if self._plates is not None:
+                return self._plates
+        plates = []
+        data = self.read(SLICE_INFO)
+        if data:
+            try:
+                root = ElementTree.fromstring(data)
+            except ElementTree.ParseError:
+                root = None
+            for plate in (root.iter('plate') if root is not None else ()):
+                values = {item.get('key'): item.get('value') for item in plate.findall('metadata')}
+                plates.append({
+                    'index': int(_to_float(values.get('index'), len(plates) + 1)),
+                    'prediction': int(_to_float(values.get('prediction'))),
+                    'weight': _to_float(values.get('weight')),
+                    'filaments': [dict(filament.attrib) for filament in plate.findall('filament')],
+                })
+        with self._lock:
+            self._plates = plates
+        return plates
+
+    def get_metadata(self, plate: int = None) -> Dict:
+        """File manager metadata for a plate (the first plate by default)"""
+        plates = self.get_plates()
+        if not plates:
+            return {}
+        info = next((p for p in plates if p['index'] == plate), plates[0]) if plate else plates[0]
+
+        tool_datas = []
+        total_length = 0.0
+        for filament in info['filaments']:
+            tool_id = int(_to_float(filament.get('id'), 1)) - 1
+            total_length += _to_float(filament.get('used_m')) * 1000.0
+            tool_datas.append({
+                "toolId": tool_id,
+                "slotId": tool_id + 1,
+                "materialName": filament.get('type', 'PLA'),
+                "materialColor": filament.get('color', '#FFFFFF'),
+                "filamentWeight": round(_to_float(filament.get('used_g')), 2),
+            })
+
+        metadata = {
+            "totalFilamentWeight": round(info['weight'] or sum(t['filamentWeight'] for t in tool_datas), 2),
+            "totalFilamentLength": round(total_length, 2),
+            "useMatlStation": len(tool_datas) > 1,
+            "gcodeToolCnt": max(1, len(tool_datas)),
+            "gcodeToolDatas": tool_datas,
+        }
+        if info['prediction']:
+            metadata["printingTime"] = info['prediction']
+        return metadata
+
+
+class ThreeMFIndexCache:
+    """Indexes keyed by path; uploads are stored by content digest, so a path never changes content"""
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # path -> ThreeMFIndex, or None for an unreadable archive
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> Optional[ThreeMFIndex]:
+        """Index for the archive at path, or None if it is not a readable ZIP"""
+        with self._lock:
+            if path in self._entries:
+                self._entries.move_to_end(path)
+                return self._entries[path]
+        try:
+            index = ThreeMFIndex(path)
+        except OSError:
+            return None  # Missing file, not worth remembering
+        except zipfile.BadZipFile:
+            index = None
+        with self._lock:
+            self._entries[path] = index
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+
+# Shared by every emulator, like the blob store the archives live in
+threemf_indexes = ThreeMFIndexCache()
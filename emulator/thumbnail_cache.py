@@ -0,0 +1,86 @@
+"""
+Shared in-memory cache for thumbnail images served over TCP (M662) and HTTP (/gcodeThumb)
+"""
+import base64
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+
+class _ThumbnailEntry:
+    """Cached thumbnail contents for one file version"""
+
+    __slots__ = ('mtime_ns', 'size', 'data', 'base64')
+
+    def __init__(self, mtime_ns, size, data):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.data = data
+        self.base64 = None
+
+
+class ThumbnailCache:
+    """Thumbnail cache keyed by path and validated against the file's mtime and size.
+
+    A replaced or edited file is picked up on the next request without a
+    restart; unchanged files are served from memory without a disk read or
+    a base64 encode.
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # path -> _ThumbnailEntry
+        self._lock = threading.Lock()
+
+    def _get_entry(self, path: str) -> Optional[_ThumbnailEntry]:
+        """Get the cached entry for path, (re)loading it if the file changed"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            with self._lock:
+                self._entries.pop(path, None)
+            return None
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+                self._entries.move_to_end(path)
+                return entry
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        entry = _ThumbnailEntry(stat.st_mtime_ns, stat.st_size, data)
+
+        with self._lock:
+            self._entries[path] = entry
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def get_bytes(self, path: str) -> Optional[bytes]:
+        """Get the raw image bytes, or None if the file does not exist"""
+        entry = self._get_entry(path)
+        return entry.data if entry else None
+
+    def get_base64(self, path: str) -> Optional[str]:
+        """Get the base64 encoded image, or None if the file does not exist"""
+        entry = self._get_entry(path)
+        if entry is None:
+            return None
+        if entry.base64 is None:
+            entry.base64 = base64.b64encode(entry.data).decode('utf-8')
+        return entry.base64
+
+    def invalidate(self, path: str = None):
+        """Drop one cached path, or everything when no path is given"""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
+
+
+# Shared by the TCP and HTTP servers
+thumbnail_cache = ThumbnailCache()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Headless entry point for the FlashForge Emulator.
+Runs the printer emulator, TCP/HTTP servers and simulation clock without
+importing any UI modules (tkinter, ttkbootstrap, PIL), for CI containers
+and running several instances per host.
+"""
+import argparse
+import os
+import signal
+import sys
+import threading
+from datetime import datetime
+
+# Add the current directory to path so we can import our modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import config
+from emulator.printer import PrinterEmulator
+from emulator.simulation import SimulationClock
+
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Run the FlashForge Emulator without a UI")
+    parser.add_argument('--config', default=None,
+                        help=f"Configuration file to load (default: {config.CONFIG_FILE})")
+    parser.add_argument('--ip', default=None, help="IP address reported to clients")
+    parser.add_argument('--tcp-port', type=int, default=config.COMMAND_PORT, help="TCP command port")
+    parser.add_argument('--http-port', type=int, default=config.HTTP_PORT, help="HTTP API port")
+    parser.add_argument('--no-http', action='store_true', help="Do not start the HTTP API server")
+    parser.add_argument('--no-discovery', action='store_true', help="Do not answer UDP discovery")
+    parser.add_argument('--backend', choices=[config.TcpServerBackend.ASYNC, config.TcpServerBackend.THREADED],
+                        default=config.TCP_CONFIG.get('backend'), help="TCP server backend")
+    parser.add_argument('--tick-rate', type=float, default=config.SIMULATION_CONFIG['tick_rate'],
+                        help="Simulation ticks per second")
+    parser.add_argument('--time-scale', type=parse_time_scale, default=config.SIMULATION_CONFIG['time_scale'],
+                        help="Run the simulation this many times faster than real time (e.g. 10, 100 or 'max')")
+    parser.add_argument('--save-on-exit', action='store_true', help="Save the configuration on shutdown")
+    parser.add_argument('--fleet', type=int, default=0, metavar='N',
+                        help="Run N independent printers in this process instead of one")
+    parser.add_argument('--fleet-bind', choices=[config.FleetBindMode.PORTS, config.FleetBindMode.ALIASES],
+                        default=config.FLEET_CONFIG['bind_mode'],
+                        help="Give fleet printers their own ports or their own loopback aliases")
+    parser.add_argument('--fleet-manifest', default=None,
+                        help="Write the fleet's addresses, serial numbers and check codes to this JSON file")
+    parser.add_argument('--quiet', action='store_true', help="Only log errors and lifecycle messages")
+    return parser.parse_args(argv)
+
+
+def parse_time_scale(value):
+    """Parse a --time-scale value ('max' means as fast as possible)"""
+    text = value.strip().lower()
+    if text == 'max':
+        return 0
+    try:
+        time_scale = float(text[:-1] if text.endswith('x') else text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid time scale: {value!r}")
+    if time_scale <= 0:
+        raise argparse.ArgumentTypeError("time scale must be positive (use 'max' for maximum speed)")
+    return time_scale
+
+
+def make_logger(quiet=False):
+    """Create a timestamped stdout logger"""
+    def log(message):
+        if quiet and not _is_lifecycle_message(message):
+            return
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        print(f"[{timestamp}] {message}", flush=True)
+    return log
+
+
+def _is_lifecycle_message(message):
+    """Messages still shown in quiet mode"""
+    text = str(message).lower()
+    return 'error' in text or 'started' in text or 'stopped' in text or 'running on' in text
+
+
+def wait_for_shutdown(log):
+    """Block until SIGINT or SIGTERM"""
+    shutdown = threading.Event()
+    signal.signal(signal.SIGINT, lambda signum, frame: shutdown.set())
+    signal.signal(signal.SIGTERM, lambda signum, frame: shutdown.set())
+    log("Headless emulator running (Ctrl+C to stop)")
+    while not shutdown.wait(1):
+        pass
+    log("Shutting down emulator...")
+
+
+def run_fleet(args, log, thumbnail_path):
+    """Run a fleet of printers on one shared event loop"""
+    # Imported here so single-printer startup never loads fleet mode or NumPy
+    from emulator.fleet import PrinterFleet
+
+    fleet = PrinterFleet(args.fleet, log, bind_mode=args.fleet_bind,
+                         discovery_enabled=not args.no_discovery and config.FLEET_CONFIG['discovery_enabled'])
+    if not fleet.start(thumbnail_path):
+        fleet.stop()
+        return 1
+    if args.fleet_manifest:
+        fleet.save_manifest(args.fleet_manifest)
+
+    clock = SimulationClock(fleet, args.tick_rate, time_scale=args.time_scale)
+    clock.start()
+
+    wait_for_shutdown(log)
+    clock.stop()
+    fleet.stop()
+    return 0
+
+
+def main(argv=None):
+    """Headless application entry point"""
+    args = parse_args(argv)
+    log = make_logger(args.quiet)
+
+    # Servers read these when they start
+    config.COMMAND_PORT = args.tcp_port
+    config.HTTP_PORT = args.http_port
+    config.TCP_CONFIG['backend'] = args.backend
+    config.HTTP_CONFIG['enabled'] = not args.no_http
+
+    # Use the bundled thumbnail if present (generating one would need PIL)
+    thumbnail_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "standard_thumbnail.png")
+    if not os.path.exists(thumbnail_path):
+        thumbnail_path = None
+
+    if args.fleet:
+        return run_fleet(args, log, thumbnail_path)
+
+    emulator = PrinterEmulator(logger=log)
+    emulator.load_config_from_json(args.config)
+
+    if args.ip:
+        emulator.config['ip_address'] = args.ip
+    if args.no_discovery:
+        emulator.config['discovery_enabled'] = False
+
+    if thumbnail_path:
+        emulator.set_thumbnail(thumbnail_path)
+
+    if not emulator.start_server():
+        return 1
+
+    emulator.start_simulation(args.tick_rate, args.time_scale)
+
+    wait_for_shutdown(log)
+    emulator.stop_simulation()
+    if args.save_on_exit:
+        emulator.save_config_to_json(args.config)
+    emulator.stop_server()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -101,6 +101,11 @@ class HttpTab:
         self.clear_stats_btn = ttk.Button(stats_frame, text="Clear Stats", command=self.clear_statistics)
         self.clear_stats_btn.pack(side="right")
 
+        # Request/response bodies are only logged on request
+        self.log_bodies = tk.BooleanVar(value=config.HTTP_CONFIG.get('log_level') == config.HttpLogLevel.BODIES)
+        ttk.Checkbutton(stats_frame, text="Log Bodies", variable=self.log_bodies,
+                        command=self.update_log_level).pack(side="right", padx=(0, 10))
+
         # Log area
         self.log_area = scrolledtext.ScrolledText(self.monitor_frame, height=10, wrap=tk.WORD)
         self.log_area.pack(fill="both", expand=True)
@@ -442,6 +447,11 @@ class HttpTab:
             self.log_message(f"✗ File upload exception: {str(e)}")
             self._update_statistics()
 
+    def update_log_level(self):
+        """Log request and error response bodies only while the checkbox is set"""
+        config.HTTP_CONFIG['log_level'] = (config.HttpLogLevel.BODIES if self.log_bodies.get()
+                                           else config.HttpLogLevel.REQUESTS)
+
     def clear_statistics(self):
         """Clear request statistics"""
         self.request_count = 0
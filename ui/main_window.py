@@ -33,6 +33,9 @@ class MainWindow:
         self.http_tab = None
         self.setup_ui()
         
+        # The simulation runs on its own clock; the UI only displays its state
+        self.emulator.start_simulation()
+
         # Setup periodic updates
         self.update_ui()
         
@@ -82,16 +85,6 @@ class MainWindow:
     
     def update_ui(self):
         """Periodically update the UI from emulator state"""
-        # Update temperature and status displays
-        self.emulator.simulate_temperatures()
-
-        # Simulate print progress
-        self.emulator.simulate_print_progress()
-
-        # Update progress if printing
-        if hasattr(self.emulator, 'update_progress') and self.emulator.update_progress():
-            pass  # Progress was updated
-        
         # Update UI in each tab
         if self.main_tab:
             self.main_tab.update_ui()
@@ -115,6 +108,9 @@ class MainWindow:
     
     def on_close(self):
         """Handle window close event"""
+        # Stop the simulation so the saved state is a consistent snapshot
+        self.emulator.stop_simulation()
+
         # Save configuration before closing
         self.emulator.save_config_to_json()
 
@@ -5,6 +5,7 @@ import tkinter as tk
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 import random
+import config
 
 class NetworkTab:
     """Network tab UI component with latency and failure simulation settings"""
@@ -16,13 +17,11 @@ class NetworkTab:
         
         # Initialize network simulation settings if not present
         if 'network_simulation' not in self.emulator.config:
-            self.emulator.config['network_simulation'] = {
-                'latency': 0,           # Delay in milliseconds
-                'latency_enabled': False,
-                'failure_rate': 0,      # Percentage chance of failure (0-100)
-                'failures_enabled': False,
-                'failure_type': 'drop'  # 'drop', 'timeout', 'error'
-            }
+            self.emulator.config['network_simulation'] = dict(config.NETWORK_SIMULATION)
+        else:
+            # Fill in settings missing from older saved configurations
+            for key, value in config.NETWORK_SIMULATION.items():
+                self.emulator.config['network_simulation'].setdefault(key, value)
         
         # Create the UI elements
         self.setup_ui()
@@ -115,6 +114,68 @@ class NetworkTab:
         ttk.Button(failures_frame, text="Apply Failure Settings", 
                   command=self.update_failure_settings).pack(side=tk.RIGHT, padx=10, pady=10)
         
+        # Advanced Impairments Frame
+        advanced_frame = ttk.LabelFrame(self.parent, text="Advanced Impairments")
+        advanced_frame.pack(fill=tk.X, expand=False, padx=10, pady=5)
+        sim_config = self.emulator.config['network_simulation']
+        
+        # Latency distribution and jitter
+        distribution_frame = ttk.Frame(advanced_frame)
+        distribution_frame.pack(fill=tk.X, padx=10, pady=5)
+        
+        ttk.Label(distribution_frame, text="Latency Distribution:").pack(side=tk.LEFT, padx=(0, 10))
+        self.distribution_var = tk.StringVar(value=sim_config['latency_distribution'])
+        distribution_combo = ttk.Combobox(distribution_frame, textvariable=self.distribution_var, width=10)
+        distribution_combo['values'] = ('fixed', 'uniform', 'normal', 'pareto')
+        distribution_combo.pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(distribution_frame, text="Jitter (ms):").pack(side=tk.LEFT, padx=(10, 5))
+        self.jitter_var = tk.IntVar(value=sim_config['jitter'])
+        ttk.Spinbox(distribution_frame, from_=0, to=5000, textvariable=self.jitter_var, width=7).pack(side=tk.LEFT)
+        
+        # Bandwidth cap
+        bandwidth_frame = ttk.Frame(advanced_frame)
+        bandwidth_frame.pack(fill=tk.X, padx=10, pady=5)
+        
+        self.bandwidth_enabled_var = tk.BooleanVar(value=sim_config['bandwidth_enabled'])
+        ttk.Checkbutton(bandwidth_frame, text="Limit Bandwidth",
+                       variable=self.bandwidth_enabled_var).pack(side=tk.LEFT)
+        
+        ttk.Label(bandwidth_frame, text="KB/s:").pack(side=tk.LEFT, padx=(10, 5))
+        self.bandwidth_var = tk.IntVar(value=sim_config['bandwidth_kbps'])
+        ttk.Spinbox(bandwidth_frame, from_=1, to=100000, textvariable=self.bandwidth_var, width=7).pack(side=tk.LEFT)
+        
+        ttk.Label(bandwidth_frame, text="Write Size (bytes):").pack(side=tk.LEFT, padx=(10, 5))
+        self.chunk_size_var = tk.IntVar(value=sim_config['write_chunk_size'])
+        ttk.Spinbox(bandwidth_frame, from_=1, to=65536, textvariable=self.chunk_size_var, width=7).pack(side=tk.LEFT)
+        
+        # Burst loss
+        burst_frame = ttk.Frame(advanced_frame)
+        burst_frame.pack(fill=tk.X, padx=10, pady=5)
+        
+        self.burst_enabled_var = tk.BooleanVar(value=sim_config['burst_loss_enabled'])
+        ttk.Checkbutton(burst_frame, text="Burst Loss",
+                       variable=self.burst_enabled_var).pack(side=tk.LEFT)
+        
+        ttk.Label(burst_frame, text="Start %:").pack(side=tk.LEFT, padx=(10, 5))
+        self.burst_start_var = tk.IntVar(value=sim_config['burst_start_rate'])
+        ttk.Spinbox(burst_frame, from_=0, to=100, textvariable=self.burst_start_var, width=5).pack(side=tk.LEFT)
+        
+        ttk.Label(burst_frame, text="End %:").pack(side=tk.LEFT, padx=(10, 5))
+        self.burst_end_var = tk.IntVar(value=sim_config['burst_end_rate'])
+        ttk.Spinbox(burst_frame, from_=0, to=100, textvariable=self.burst_end_var, width=5).pack(side=tk.LEFT)
+        
+        advanced_desc = (
+            "Jitter spreads latency (uniform: +/- jitter, normal: std. deviation, pareto: tail scale).\n"
+            "Bandwidth is capped per connection and responses are written in small paced chunks.\n"
+            "Burst loss fails consecutive requests using the selected failure type."
+        )
+        ttk.Label(advanced_frame, text=advanced_desc, justify=tk.LEFT).pack(anchor=tk.W, padx=10, pady=5)
+        
+        # Apply button for advanced impairments
+        ttk.Button(advanced_frame, text="Apply Advanced Settings", 
+                  command=self.update_advanced_settings).pack(side=tk.RIGHT, padx=10, pady=10)
+        
         # Network Simulation Status
         status_frame = ttk.LabelFrame(self.parent, text="Simulation Status")
         status_frame.pack(fill=tk.X, expand=False, padx=10, pady=5)
@@ -160,6 +221,17 @@ class NetworkTab:
         self.failure_rate_var.set(self.emulator.config['network_simulation']['failure_rate'])
         self.update_failure_label()
         
+        # Update advanced impairment controls
+        sim_config = self.emulator.config['network_simulation']
+        self.distribution_var.set(sim_config['latency_distribution'])
+        self.jitter_var.set(sim_config['jitter'])
+        self.bandwidth_enabled_var.set(sim_config['bandwidth_enabled'])
+        self.bandwidth_var.set(sim_config['bandwidth_kbps'])
+        self.chunk_size_var.set(sim_config['write_chunk_size'])
+        self.burst_enabled_var.set(sim_config['burst_loss_enabled'])
+        self.burst_start_var.set(sim_config['burst_start_rate'])
+        self.burst_end_var.set(sim_config['burst_end_rate'])
+        
         # Update simulation status text
         self.status_var.set(self.get_simulation_status())
     
@@ -225,12 +297,38 @@ class NetworkTab:
             else:
                 self.on_update_callback("Connection failures simulation disabled")
     
+    def update_advanced_settings(self):
+        """Apply the jitter, bandwidth and burst loss settings"""
+        sim_config = self.emulator.config['network_simulation']
+        try:
+            sim_config['latency_distribution'] = self.distribution_var.get()
+            sim_config['jitter'] = max(0, self.jitter_var.get())
+            sim_config['bandwidth_enabled'] = self.bandwidth_enabled_var.get()
+            sim_config['bandwidth_kbps'] = max(1, self.bandwidth_var.get())
+            sim_config['write_chunk_size'] = max(1, self.chunk_size_var.get())
+            sim_config['burst_loss_enabled'] = self.burst_enabled_var.get()
+            sim_config['burst_start_rate'] = min(100, max(0, self.burst_start_var.get()))
+            sim_config['burst_end_rate'] = min(100, max(0, self.burst_end_var.get()))
+        except tk.TclError:
+            if self.on_update_callback:
+                self.on_update_callback("Invalid advanced network simulation value")
+            return
+        
+        # Update status
+        self.status_var.set(self.get_simulation_status())
+        
+        if self.on_update_callback:
+            self.on_update_callback(f"Advanced network simulation updated - {self.get_simulation_status()}")
+    
     def disable_all_simulations(self):
         """Disable all network simulations"""
         self.latency_enabled_var.set(False)
         self.failures_enabled_var.set(False)
+        self.bandwidth_enabled_var.set(False)
+        self.burst_enabled_var.set(False)
         self.update_latency_settings()
         self.update_failure_settings()
+        self.update_advanced_settings()
         
         if self.on_update_callback:
             self.on_update_callback("All network simulations disabled")
@@ -241,11 +339,21 @@ class NetworkTab:
         status_parts = []
         
         if sim_config['latency_enabled']:
-            status_parts.append(f"Latency: {sim_config['latency']} ms")
+            if sim_config.get('jitter') and sim_config.get('latency_distribution', 'fixed') != 'fixed':
+                status_parts.append(f"Latency: {sim_config['latency']} ms "
+                                    f"({sim_config['latency_distribution']}, {sim_config['jitter']} ms jitter)")
+            else:
+                status_parts.append(f"Latency: {sim_config['latency']} ms")
         
         if sim_config['failures_enabled']:
             status_parts.append(f"Failures: {sim_config['failure_type']} at {sim_config['failure_rate']}%")
         
+        if sim_config.get('burst_loss_enabled'):
+            status_parts.append(f"Burst loss: {sim_config['burst_start_rate']}%/{sim_config['burst_end_rate']}%")
+        
+        if sim_config.get('bandwidth_enabled'):
+            status_parts.append(f"Bandwidth: {sim_config['bandwidth_kbps']} KB/s")
+        
         if not status_parts:
             return "No simulations active"
         
@@ -6,6 +6,7 @@ import tkinter as tk
 from tkinter import filedialog, messagebox
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
+import config
 
 class PrinterStateTab:
     """Printer State tab UI component"""
@@ -136,6 +137,14 @@ class PrinterStateTab:
         ttk.Label(thumbnail_frame, textvariable=self.thumbnail_path_var).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 10))
         ttk.Button(thumbnail_frame, text="Browse...", style="info.TButton", command=self.browse_thumbnail).pack(side=tk.RIGHT)
         
+        # Row 6: Simulation speed
+        ttk.Label(status_grid, text="Simulation Speed:").grid(row=6, column=0, sticky=tk.W, padx=5, pady=5)
+        self.speed_var = tk.StringVar(value=self._speed_label(config.SIMULATION_CONFIG['time_scale']))
+        speed_combo = ttk.Combobox(status_grid, textvariable=self.speed_var, width=15, state="readonly")
+        speed_combo['values'] = tuple(config.SIMULATION_SPEEDS)
+        speed_combo.grid(row=6, column=1, sticky=tk.W, padx=5, pady=5)
+        speed_combo.bind('<<ComboboxSelected>>', lambda e: self.update_simulation_speed())
+
         # Configure status grid
         status_grid.columnconfigure(1, weight=1)
         
@@ -277,6 +286,18 @@ class PrinterStateTab:
         if self.on_update_callback:
             self.on_update_callback("Printer state updated from UI")
     
+    @staticmethod
+    def _speed_label(time_scale):
+        """UI label for a time scale"""
+        for label, value in config.SIMULATION_SPEEDS.items():
+            if value == time_scale:
+                return label
+        return f"{time_scale:g}x"
+
+    def update_simulation_speed(self):
+        """Apply the selected simulation speed"""
+        self.emulator.set_time_scale(config.SIMULATION_SPEEDS[self.speed_var.get()])
+
     def update_idle_temps(self):
         """Update idle temperature settings from UI"""
         if self.emulator.update_idle_temps(self.idle_hotend_var.get(), self.idle_bed_var.get()):
@@ -1,50 +1,125 @@
 """
 Network-related utilities for FlashForge Emulator
 """
+import ctypes
 import socket
+import sys
+import threading
+
+# Interface list cached for the lifetime of the process (see get_network_interfaces)
+_interfaces_cache = None
+_interfaces_lock = threading.Lock()
+
+_IFF_UP = 0x1
+
+
+class _IfAddrs(ctypes.Structure):
+    """struct ifaddrs from <ifaddrs.h> (fields after ifa_netmask are unused)"""
+
+
+_IfAddrs._fields_ = [
+    ('ifa_next', ctypes.POINTER(_IfAddrs)),
+    ('ifa_name', ctypes.c_char_p),
+    ('ifa_flags', ctypes.c_uint),
+    ('ifa_addr', ctypes.c_void_p),
+    ('ifa_netmask', ctypes.c_void_p),
+]
+
+
+def _sockaddr_ipv4(address):
+    """Return the dotted IPv4 address of a struct sockaddr pointer, or None"""
+    raw = ctypes.string_at(address, 8)
+    if sys.platform.startswith('linux'):
+        family = int.from_bytes(raw[0:2], sys.byteorder)
+    else:
+        # BSD layout: sa_len (1 byte) followed by sa_family (1 byte)
+        family = raw[1]
+    if family != socket.AF_INET:
+        return None
+    return socket.inet_ntoa(raw[4:8])
+
+
+def _getifaddrs_interfaces():
+    """Enumerate IPv4 addresses of interfaces that are up using getifaddrs(3)"""
+    if sys.platform.startswith('win'):
+        return None
+    # Symbols already loaded into the process; avoids find_library's subprocess lookups
+    libc = ctypes.CDLL(None, use_errno=True)
+    if not hasattr(libc, 'getifaddrs'):
+        return None
+
+    head = ctypes.POINTER(_IfAddrs)()
+    if libc.getifaddrs(ctypes.byref(head)) != 0:
+        return None
 
-def get_network_interfaces():
-    """Get all network interfaces with their IP addresses"""
     interfaces = []
     try:
-        # Get all network interfaces using socket.if_nameindex()
-        for iface_name in socket.if_nameindex():
-            try:
-                ip = socket.gethostbyname(socket.gethostname())
-                interfaces.append((iface_name[1], ip))
-            except:
-                pass
-    except:
-        # Alternative method for Windows
-        try:
-            # Try to get all IP addresses
-            ips = socket.getaddrinfo(socket.gethostname(), None)
-            for ip_info in ips:
-                if ip_info[0] == socket.AF_INET:  # IPv4 only
-                    ip = ip_info[4][0]
-                    if not ip.startswith('127.'):  # Skip loopback
-                        interfaces.append(("eth", ip))
-        except:
-            # Fallback: just use the primary IP
-            interfaces.append(("eth0", socket.gethostbyname(socket.gethostname())))
-    
-    # Also explicitly try common IP patterns
-    for ip_prefix in ['192.168.', '10.', '172.']:
-        for i in range(254):
-            try:
-                s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-                # This doesn't send any packets but allows us to see what IP would be used
-                s.connect((f"{ip_prefix}1.1", 1))
-                local_ip = s.getsockname()[0]
-                s.close()
-                if local_ip.startswith(ip_prefix) and local_ip not in [i[1] for i in interfaces]:
-                    interfaces.append(("eth", local_ip))
-                break
-            except:
-                pass
-    
+        node = head
+        while node:
+            entry = node.contents
+            if entry.ifa_addr and entry.ifa_flags & _IFF_UP:
+                ip = _sockaddr_ipv4(entry.ifa_addr)
+                if ip:
+                    interfaces.append((entry.ifa_name.decode('utf-8', errors='replace'), ip))
+            node = entry.ifa_next
+    finally:
+        libc.freeifaddrs(head)
+    return interfaces
+
+
+def _hostname_interfaces():
+    """Fallback for platforms without getifaddrs (Windows): addresses of the host name"""
+    interfaces = []
+    try:
+        for ip_info in socket.getaddrinfo(socket.gethostname(), None, socket.AF_INET):
+            ip = ip_info[4][0]
+            if ip not in [i[1] for i in interfaces]:
+                interfaces.append(("eth", ip))
+    except OSError:
+        pass
     return interfaces
 
+
+def _default_route_ip():
+    """Local address used for the default route (no packets are sent), or None"""
+    try:
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            s.connect(("192.168.1.1", 1))
+            return s.getsockname()[0]
+        finally:
+            s.close()
+    except OSError:
+        return None
+
+
+def get_network_interfaces(refresh=False):
+    """Get all network interfaces with their IP addresses as (name, ip) tuples.
+
+    Addresses are enumerated once per process and cached; pass refresh=True
+    to enumerate them again (e.g. after the host's network changed).
+    """
+    global _interfaces_cache
+    with _interfaces_lock:
+        if _interfaces_cache is not None and not refresh:
+            return list(_interfaces_cache)
+
+        interfaces = None
+        try:
+            interfaces = _getifaddrs_interfaces()
+        except (OSError, AttributeError, ValueError):
+            pass
+        if interfaces is None:
+            interfaces = _hostname_interfaces()
+
+        # Make sure the address we would actually reach the LAN from is listed
+        route_ip = _default_route_ip()
+        if route_ip and route_ip not in [ip for _, ip in interfaces]:
+            interfaces.append(("eth", route_ip))
+
+        _interfaces_cache = interfaces
+        return list(interfaces)
+
 def get_primary_ip(network_interfaces):
     """Get the primary IP address (non-loopback)"""
     # Try common network ranges first